@@ -0,0 +1,124 @@
+"""
+Benchmark of the latency of ExternalEngine frame detection.
+
+Compares the classic sleep-polling loop with the event-driven watchers
+(inotify, and select on a FIFO). The test engine of the OPS tests
+(openpathsampling/tests/external_engine/engine.c; run ``make`` there
+first) writes a frame every ``engine_sleep`` ms, so any time beyond
+``n_frames * engine_sleep`` is latency added by OPS. CPU time is the time
+the OPS process itself spent, which shows the cost of polling.
+
+Usage:
+    python external_engine_latency_benchmark.py [engine_sleep_ms] [n_frames]
+"""
+from __future__ import print_function
+import os
+import sys
+import time
+
+import numpy as np
+import psutil
+
+import openpathsampling as paths
+import openpathsampling.engines as peng
+from openpathsampling.engines import file_watch
+
+ENGINE_DIRECTORY = os.path.join(os.path.dirname(paths.__file__),
+                                "tests", "external_engine")
+
+
+class BenchmarkEngine(peng.ExternalEngine):
+    def parse_frame(self, data):
+        end = data.find(b"\n")
+        if end < 0:
+            return None, 0
+        (coords, vels) = map(float, data[:end].split())
+        snap = peng.toy.Snapshot(coordinates=np.array([[coords]]),
+                                 velocities=np.array([[vels]]))
+        return snap, end + 1
+
+    def write_frame_to_file(self, filename, snapshot, mode='a'):
+        with open(filename, mode) as f:
+            f.write("{pos} {vel}\n".format(pos=snapshot.xyz[0][0],
+                                           vel=snapshot.velocities[0][0]))
+
+    def set_filenames(self, number):
+        self.input_file = self.name_prefix + str(number) + ".inp"
+        self.output_file = self.name_prefix + str(number) + ".out"
+
+    def engine_command(self):
+        engine_path = os.path.join(self.engine_directory, "engine")
+        return (engine_path + " " + str(self.engine_sleep)
+                + " " + str(self.output_file) + " " + str(self.input_file))
+
+    def cleanup(self):
+        for filename in [self.input_file, self.output_file]:
+            if os.path.exists(filename):
+                os.remove(filename)
+
+
+class BenchmarkFIFOEngine(BenchmarkEngine):
+    def prepare(self):
+        os.mkfifo(self.output_file)
+
+
+class PollingBenchmarkEngine(BenchmarkEngine):
+    # reads through read_frame_from_file, reopening the file each time
+    parse_frame = peng.ExternalEngine.parse_frame
+
+    def read_frame_from_file(self, filename, frame_num):
+        with open(filename) as f:
+            lines = f.readlines()
+        if len(lines) <= frame_num:
+            return None
+        line = lines[frame_num]
+        if not line.endswith("\n"):
+            return "partial"
+        (coords, vels) = map(float, line.split())
+        return peng.toy.Snapshot(coordinates=np.array([[coords]]),
+                                 velocities=np.array([[vels]]))
+
+
+def run(engine_class, watcher, engine_sleep, n_frames):
+    template = peng.toy.Snapshot(coordinates=np.array([[0.0]]),
+                                 velocities=np.array([[1.0]]))
+    descriptor = peng.SnapshotDescriptor.construct(
+        snapshot_class=peng.toy.Snapshot,
+        snapshot_dimensions={'n_atoms': 1, 'n_spatial': 1}
+    )
+    options = {
+        'n_frames_max': n_frames + 10,
+        'engine_sleep': engine_sleep,
+        'name_prefix': "benchmark",
+        'engine_directory': ENGINE_DIRECTORY,
+        'frame_watcher': watcher
+    }
+    engine = engine_class(options, descriptor, template)
+    ensemble = paths.LengthEnsemble(n_frames + 1)
+    proc = psutil.Process()
+    cpu_start = sum(proc.cpu_times()[:2])
+    wall_start = time.time()
+    engine.generate(template, ensemble.can_append)
+    wall = time.time() - wall_start
+    cpu = sum(proc.cpu_times()[:2]) - cpu_start
+    latency = (wall - n_frames * engine_sleep / 1000.0) / n_frames
+    return latency * 1000.0, cpu
+
+
+def main(engine_sleep=10, n_frames=200):
+    runs = [("sleep (reopen file)", PollingBenchmarkEngine, 'sleep'),
+            ("sleep (incremental)", BenchmarkEngine, 'sleep')]
+    if file_watch.inotify_available():
+        runs.append(("inotify", BenchmarkEngine, 'inotify'))
+    runs.append(("select on FIFO", BenchmarkFIFOEngine, 'select'))
+
+    print("{} frames, one every {} ms".format(n_frames, engine_sleep))
+    print("{:<22} {:>18} {:>12}".format("watcher", "latency/frame (ms)",
+                                        "CPU time (s)"))
+    for (label, engine_class, watcher) in runs:
+        latency, cpu = run(engine_class, watcher, engine_sleep, n_frames)
+        print("{:<22} {:>18.3f} {:>12.3f}".format(label, latency, cpu))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
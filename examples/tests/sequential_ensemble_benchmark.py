@@ -0,0 +1,93 @@
+"""
+Benchmark of the per-frame cost of SequentialEnsemble.can_append.
+
+This mimics the stopping condition of a TIS path: the trajectory leaves
+state A, crosses the interface, and then stays between the states for a
+long time, while ``can_append`` is called after every new frame (as the
+engine does). The time per frame is reported for windows of frames at
+increasing trajectory lengths; with the streaming evaluation it should not
+depend on the length of the trajectory.
+
+Usage: python sequential_ensemble_benchmark.py [max_frames] [max_generic]
+
+``max_generic`` limits the trajectory length for the old (non-streaming)
+algorithm, which gets slower as the trajectory grows.
+"""
+from __future__ import print_function
+import sys
+import time
+
+import numpy as np
+
+import openpathsampling as paths
+from openpathsampling.engines import toy
+
+
+def make_ensemble():
+    cv = paths.FunctionCV("x", lambda snap: snap.xyz[0][0])
+    state_A = paths.CVDefinedVolume(cv, float("-inf"), 0.0)
+    state_B = paths.CVDefinedVolume(cv, 1.0, float("inf"))
+    interface = paths.CVDefinedVolume(cv, float("-inf"), 0.2)
+    return paths.SequentialEnsemble([
+        paths.AllInXEnsemble(state_A) & paths.LengthEnsemble(1),
+        (paths.AllOutXEnsemble(state_A | state_B)
+         & paths.PartOutXEnsemble(interface)),
+        paths.AllInXEnsemble(state_A | state_B) & paths.LengthEnsemble(1)
+    ])
+
+
+def make_snapshots(n_frames):
+    # start in A, then wander in [0.1, 0.9]: never ends the path
+    values = 0.5 + 0.4 * np.sin(np.arange(n_frames) * 0.01)
+    values[0] = -0.1
+    return [toy.Snapshot(coordinates=np.array([[x]]),
+                         velocities=np.array([[0.0]]))
+            for x in values]
+
+
+def run(ensemble, snapshots, checkpoints, window=1000):
+    """Time per frame (in microseconds) for the frames before checkpoints
+    """
+    trajectory = paths.Trajectory([])
+    timings = {}
+    start = None
+    for (i, snap) in enumerate(snapshots):
+        n_frames = i + 1
+        if n_frames + window in checkpoints:
+            start = time.time()
+        trajectory.append(snap)
+        assert ensemble.can_append(trajectory, trusted=True)
+        if n_frames in checkpoints:
+            timings[n_frames] = (time.time() - start) / window * 1e6
+    return timings
+
+
+def main(max_frames=100000, max_generic=10000):
+    checkpoints = [n for n in [2000, 10000, 30000, 100000, 300000, 1000000]
+                   if n <= max_frames]
+    snapshots = make_snapshots(max(checkpoints))
+
+    streaming = make_ensemble()
+    results = {'streaming': run(streaming, snapshots, checkpoints)}
+
+    generic = make_ensemble()
+    generic._use_streaming = False
+    generic_checkpoints = [n for n in checkpoints if n <= max_generic]
+    results['generic'] = run(generic,
+                             snapshots[:max(generic_checkpoints)],
+                             generic_checkpoints)
+
+    print("time per frame (us), averaged over the 1000 frames before "
+          "each length")
+    print("{:>10} {:>12} {:>12}".format("frames", "streaming", "generic"))
+    for n_frames in checkpoints:
+        generic_time = results['generic'].get(n_frames)
+        generic_str = ("{:12.1f}".format(generic_time)
+                       if generic_time is not None else "{:>12}".format("-"))
+        print("{:>10} {:12.1f} {}".format(n_frames,
+                                          results['streaming'][n_frames],
+                                          generic_str))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,84 @@
+"""
+Benchmark of the time to open a storage.
+
+A file with trajectories of toy snapshots is created (once, it is reused if
+it exists) and then opened in different ways. Opening a file restores all
+stores, which reads the UUIDs of all stored objects; this grows with the
+size of the file. Opened with ``lazy=True`` a store only reads the UUIDs
+when they are first used, and with index files they are not read at all.
+
+For each way of opening the file the time to open it is reported as well
+as the time to then load the last trajectory, which reads the UUIDs of
+trajectories and snapshots.
+
+Usage: python storage_open_benchmark.py [filename] [size_mb] [n_atoms]
+
+The default creates a file of about 2 GB.
+"""
+from __future__ import print_function
+import os
+import sys
+import time
+
+import numpy as np
+
+import openpathsampling as paths
+from openpathsampling.engines import toy
+
+
+def make_storage(filename, size_mb, n_atoms, n_frames=100):
+    topology = toy.Topology(n_spatial=3, masses=[1.0] * n_atoms, pes=None,
+                            n_atoms=n_atoms)
+    engine = toy.Engine({}, topology)
+
+    # coordinates and velocities are stored as float32
+    frame_bytes = 2 * 3 * 4 * n_atoms
+    n_trajectories = max(1, size_mb * 1024 ** 2 // (frame_bytes * n_frames))
+
+    storage = paths.Storage(filename, 'w', index_files=True)
+    for _ in range(n_trajectories):
+        trajectory = paths.Trajectory([
+            toy.Snapshot(coordinates=np.random.random((n_atoms, 3)),
+                         velocities=np.random.random((n_atoms, 3)),
+                         engine=engine)
+            for _ in range(n_frames)
+        ])
+        storage.save(trajectory)
+
+    storage.close()
+
+
+def time_open(filename, **kwargs):
+    start = time.time()
+    storage = paths.Storage(filename, 'r', **kwargs)
+    opened = time.time()
+    trajectory = storage.trajectories[-1]
+    assert trajectory[-1] in storage.snapshots
+    loaded = time.time()
+    storage.close()
+    return opened - start, loaded - opened
+
+
+def main(filename='storage_open_benchmark.nc', size_mb=2048, n_atoms=1000):
+    if not os.path.isfile(filename):
+        print("creating {} ...".format(filename))
+        make_storage(filename, size_mb, n_atoms)
+
+    print("file size: {:.0f} MB".format(
+        os.path.getsize(filename) / 1024. ** 2))
+
+    modes = [
+        ('eager', dict(index_files=False)),
+        ('lazy', dict(index_files=False, lazy=True)),
+        ('lazy + index files', dict(index_files=True, lazy=True))
+    ]
+
+    print("{:>20} {:>10} {:>18}".format("", "open (s)", "last traj (s)"))
+    for name, kwargs in modes:
+        open_time, load_time = time_open(filename, **kwargs)
+        print("{:>20} {:10.3f} {:18.3f}".format(name, open_time, load_time))
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(*(args[:1] + [int(arg) for arg in args[1:]]))
@@ -129,7 +129,7 @@ from .volume import (
     Volume, VolumeCombination,
     EmptyVolume, FullVolume, CVDefinedVolume, PeriodicCVDefinedVolume,
     IntersectionVolume, UnionVolume, SymmetricDifferenceVolume,
-    RelativeComplementVolume, join_volumes
+    RelativeComplementVolume, VoronoiVolume, VoronoiCells, join_volumes
 )
 
 # from .high_level import move_strategy as strategies
@@ -166,7 +166,7 @@ from .pathmovers.move_schemes import *
 
 import openpathsampling.numerics as numerics
 
-from openpathsampling.engines import Trajectory, BaseSnapshot
+from openpathsampling.engines import Trajectory, ArrayTrajectory, BaseSnapshot
 
 # until engines are proper subpackages, built-ins need to be findable!
 import openpathsampling.engines.openmm #as openmm
@@ -1,7 +1,7 @@
 import openpathsampling as paths
 import openpathsampling.netcdfplus.chaindict as cd
 from openpathsampling.integration_tools import md, error_if_no_mdtraj
-from openpathsampling.engines.openmm.tools import trajectory_to_mdtraj
+from openpathsampling.engines.openmm.tools import mdtraj_conversions
 from openpathsampling.netcdfplus import WeakKeyCache, \
     ObjectJSON, create_to_dict, ObjectStore, PseudoAttribute
 
@@ -565,9 +565,7 @@ class MDTrajFunctionCV(CoordinateFunctionCV):
         self.topology = topology
 
     def _eval(self, items):
-        trajectory = paths.Trajectory(items)
-
-        t = trajectory_to_mdtraj(trajectory, self.topology.mdtraj)
+        t = mdtraj_conversions.convert(items, self.topology.mdtraj)
         return self.cv_callable(t, **self.kwargs)
 
     @property
@@ -653,10 +651,8 @@ class MSMBFeaturizerCV(CoordinateGeneratorCV):
         return self.cv_callable
 
     def _eval(self, items):
-        trajectory = paths.Trajectory(items)
-
         # create an mdtraj trajectory out of it
-        ptraj = trajectory_to_mdtraj(trajectory, self.topology.mdtraj)
+        ptraj = mdtraj_conversions.convert(items, self.topology.mdtraj)
 
         # run the featurizer
         return self._instance.partial_transform(ptraj)
@@ -740,9 +736,7 @@ class PyEMMAFeaturizerCV(MSMBFeaturizerCV):
         )
 
     def _eval(self, items):
-        trajectory = paths.Trajectory(items)
-
-        t = trajectory_to_mdtraj(trajectory, self.topology.mdtraj)
+        t = mdtraj_conversions.convert(items, self.topology.mdtraj)
         return self._instance.transform(t)
 
     def to_dict(self):
@@ -1,5 +1,5 @@
 from .snapshot import BaseSnapshot, SnapshotFactory, SnapshotDescriptor
-from .trajectory import Trajectory
+from .trajectory import Trajectory, ArrayTrajectory
 
 from .topology import Topology
 
@@ -10,6 +10,8 @@ from .dynamics_engine import (
     EngineNaNError, EngineMaxLengthError)
 
 from .external_engine import ExternalEngine
+from .persistent_engine import (
+    PersistentExternalEngine, ExternalEngineWorkerPool, ExternalEngineWorker)
 
 from . import external_snapshots
 
@@ -1,6 +1,9 @@
 from openpathsampling.engines.dynamics_engine import DynamicsEngine
 from openpathsampling.engines.snapshot import BaseSnapshot
 from openpathsampling.engines.toy import ToySnapshot
+from openpathsampling.engines.file_watch import (
+    make_watcher, IncrementalFileReader
+)
 import numpy as np
 import os
 
@@ -51,6 +54,16 @@ def _debug_snapshot_loading(snapshot):
 class ExternalEngine(DynamicsEngine):
     """
     Generic object to handle arbitrary external engines. Subclass to use.
+
+    While waiting for a new frame, the engine sleeps until the output file
+    changes. The ``frame_watcher`` option selects how: 'inotify' (Linux)
+    wakes up as soon as the file is written, 'select' blocks on a FIFO
+    output file, and 'sleep' polls every ``sleep_ms`` milliseconds. The
+    default, 'auto', picks the best available.
+
+    Subclasses that implement :meth:`.parse_frame` are read incrementally:
+    the output file stays open and only newly written bytes are parsed.
+    Otherwise, :meth:`.read_frame_from_file` is called for each frame.
     """
 
     _default_options = {
@@ -62,7 +75,8 @@ class ExternalEngine(DynamicsEngine):
         'engine_directory' : "",
         'n_spatial' : 1,
         'n_atoms' : 1,
-        'n_poll_per_step': 1
+        'n_poll_per_step': 1,
+        'frame_watcher': 'auto'
     }
 
     killsig = signal.SIGTERM
@@ -78,6 +92,8 @@ class ExternalEngine(DynamicsEngine):
         self.first_frame_in_file = first_frame_in_file
         self._traj_num = -1
         self._current_snapshot = template
+        self._reader = None
+        self._watcher = None
 
     @property
     def current_snapshot(self):
@@ -93,8 +109,7 @@ class ExternalEngine(DynamicsEngine):
         logger.debug("Looking for frame %d", self.n_frames_since_start+1)
         while not next_frame_found:
             try:
-                next_frame = self.read_frame_from_file(self.output_file,
-                                                       self.frame_num)
+                next_frame = self._read_next_frame()
             except IOError:
                 # maybe the file doesn't exist
                 if self.proc.is_running():
@@ -111,8 +126,8 @@ class ExternalEngine(DynamicsEngine):
             elif next_frame is None:
                 if not self.proc.is_running():
                     raise RuntimeError("External engine died unexpectedly")
-                logger.debug("Sleeping for {:.2f}ms".format(self.sleep_ms))
-                time.sleep(self.sleep_ms/1000.0)
+                logger.debug("Waiting up to {:.2f}ms".format(self.sleep_ms))
+                self._wait_for_frame(self.sleep_ms/1000.0)
             elif isinstance(next_frame, BaseSnapshot): # success
                 self.n_frames_since_start += 1
                 logger.debug("Found frame %d", self.n_frames_since_start)
@@ -129,6 +144,48 @@ class ExternalEngine(DynamicsEngine):
 
         return self.current_snapshot
 
+    @property
+    def reads_incrementally(self):
+        """bool : whether this engine implements :meth:`.parse_frame`"""
+        return type(self).parse_frame is not ExternalEngine.parse_frame
+
+    def _read_next_frame(self):
+        if self._reader is None:
+            return self.read_frame_from_file(self.output_file,
+                                             self.frame_num)
+
+        self._reader.read()
+        snapshot, n_bytes = self.parse_frame(self._reader.buffer)
+        if snapshot is None:
+            return None
+        self._reader.consume(n_bytes)
+        return snapshot
+
+    def _wait_for_frame(self, timeout):
+        if self._watcher is None:
+            time.sleep(timeout)
+        else:
+            self._watcher.wait(timeout)
+
+    def _open_output(self):
+        if self.reads_incrementally:
+            self._reader = IncrementalFileReader(self.output_file)
+        try:
+            self._watcher = make_watcher(self.output_file,
+                                         self.options['frame_watcher'],
+                                         self._reader)
+        except (OSError, RuntimeError) as e:
+            logger.info("Falling back to sleeping between frames: "
+                        + str(e))
+            self._watcher = None
+
+    def _close_output(self):
+        for obj in [self._reader, self._watcher]:
+            if obj is not None:
+                obj.close()
+        self._reader = None
+        self._watcher = None
+
     def start(self, snapshot=None):
         super(ExternalEngine, self).start(snapshot)
         self._traj_num += 1
@@ -138,8 +195,26 @@ class ExternalEngine(DynamicsEngine):
         self.write_frame_to_file(self.input_file, self.current_snapshot, "w")
         self.prepare()
 
-        cmd = shlex.split(self.engine_command())
+        self._close_output()
+        self._open_output()
         self.start_time = time.time()
+        self.launch_engine()
+
+        if self.first_frame_in_file:
+            _ = self.generate_next_frame()  # throw away repeat first frame
+
+    def stop(self, trajectory):
+        super(ExternalEngine, self).stop(trajectory)
+        logger.info("total_time {:.4f}".format(time.time() - self.start_time))
+        self.halt_engine()
+        self._close_output()
+        self.cleanup()
+
+    def launch_engine(self):
+        """Start the external process for the current trajectory.
+
+        Sets ``self.proc`` to the process that writes the output file.
+        """
         try:
             logger.info(self.engine_command())
             # TODO: add the ability to have handlers for stdin and stdout
@@ -150,12 +225,8 @@ class ExternalEngine(DynamicsEngine):
         else:
             logger.info("Started engine: " + str(self.proc))
 
-        if self.first_frame_in_file:
-            _ = self.generate_next_frame()  # throw away repeat first frame
-
-    def stop(self, trajectory):
-        super(ExternalEngine, self).stop(trajectory)
-        logger.info("total_time {:.4f}".format(time.time() - self.start_time))
+    def halt_engine(self):
+        """Stop the external process once the trajectory is complete."""
         proc = self.who_to_kill()
         logger.info("About to send signal %s to %s", str(self.killsig),
                     str(proc))
@@ -163,7 +234,6 @@ class ExternalEngine(DynamicsEngine):
         logger.debug("Signal has been sent")
         proc.wait()  # wait for the zombie to die
         logger.debug("Zombie should be dead")
-        self.cleanup()
 
     # FROM HERE ARE THE FUNCTIONS TO OVERRIDE IN SUBCLASSES:
     def read_frame_from_file(self, filename, frame_num):
@@ -174,6 +244,27 @@ class ExternalEngine(DynamicsEngine):
         """
         raise NotImplementedError()
 
+    def parse_frame(self, data):
+        """Parses the first frame from newly written bytes of the output.
+
+        Optional; implement this to have the output file read
+        incrementally, instead of with :meth:`.read_frame_from_file`.
+
+        Parameters
+        ----------
+        data : bytes
+            the unparsed bytes of the output file, starting at the first
+            frame that has not been returned yet
+
+        Returns
+        -------
+        snapshot : :class:`.BaseSnapshot` or None
+            the frame, or None if ``data`` does not contain a complete frame
+        n_bytes : int
+            number of bytes of ``data`` used for this frame
+        """
+        raise NotImplementedError()
+
     def write_frame_to_file(self, filename, snapshot, mode="a"):
         """Writes given snapshot to file."""
         raise NotImplementedError()
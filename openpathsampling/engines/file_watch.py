@@ -0,0 +1,296 @@
+"""
+Tools to wait for an external engine to write new frames.
+
+An :class:`.ExternalEngine` checks for new frames in its output file after
+every wakeup. The watchers here decide when to wake up:
+
+* :class:`.InotifyWatcher` (Linux only) wakes as soon as the output file is
+  created or modified
+* :class:`.SelectWatcher` blocks until data is available, for output files
+  that are FIFOs (named pipes)
+* :class:`.SleepWatcher` sleeps for the given time; this is the classic
+  polling loop, and the fallback where nothing better is available
+
+The :class:`.IncrementalFileReader` keeps the output file open and returns
+only the bytes written since the last read, so that frames can be parsed
+from a persistent offset instead of reopening the file for every frame.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import stat
+import struct
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+# constants from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = getattr(os, 'O_NONBLOCK', 0o4000)
+IN_CLOEXEC = getattr(os, 'O_CLOEXEC', 0o2000000)
+
+_INOTIFY_EVENT = struct.Struct('iIII')
+
+_libc = None
+
+
+def _get_libc():
+    global _libc
+    if _libc is None and sys.platform.startswith('linux'):
+        libc_name = ctypes.util.find_library('c')
+        if libc_name is not None:
+            libc = ctypes.CDLL(libc_name, use_errno=True)
+            if hasattr(libc, 'inotify_init1'):
+                _libc = libc
+    return _libc
+
+
+def inotify_available():
+    """Whether the Linux inotify API can be used on this system"""
+    return _get_libc() is not None
+
+
+def is_fifo(filename):
+    """Whether ``filename`` exists and is a FIFO (named pipe)"""
+    try:
+        return stat.S_ISFIFO(os.stat(filename).st_mode)
+    except OSError:
+        return False
+
+
+class SleepWatcher(object):
+    """Wait by sleeping; used when no file events are available.
+    """
+    def wait(self, timeout):
+        """Wait for the file to change.
+
+        Parameters
+        ----------
+        timeout : float
+            maximum time to wait, in seconds
+
+        Returns
+        -------
+        bool
+            whether a change was detected; always False for this watcher,
+            since it cannot tell
+        """
+        time.sleep(timeout)
+        return False
+
+    def close(self):
+        pass
+
+
+class SelectWatcher(object):
+    """Block until a file descriptor (e.g., of a FIFO) has data to read.
+
+    Parameters
+    ----------
+    fileno : int
+        file descriptor to watch
+    """
+    def __init__(self, fileno):
+        self.fileno = fileno
+
+    def wait(self, timeout):
+        ready, _, _ = select.select([self.fileno], [], [], timeout)
+        return bool(ready)
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher(object):
+    """Wake up when a file is created or written to (Linux only).
+
+    This watches the directory containing the file, so it can be created
+    before the file itself exists.
+
+    Parameters
+    ----------
+    filename : str
+        the file to watch
+    """
+    def __init__(self, filename):
+        libc = _get_libc()
+        if libc is None:
+            raise OSError("inotify is not available on this system")
+        self.filename = filename
+        self._basename = os.path.basename(filename).encode()
+        directory = os.path.dirname(os.path.abspath(filename))
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_CREATE | IN_MOVED_TO
+        wd = libc.inotify_add_watch(self._fd, directory.encode(), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(err, os.strerror(err), directory)
+
+    def _read_events(self):
+        """Names of the files with pending events"""
+        names = []
+        while True:
+            try:
+                buf = os.read(self._fd, 4096)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                raise
+            if not buf:  # pragma: no cover
+                break
+            offset = 0
+            while offset < len(buf):
+                (_, _, _, length) = _INOTIFY_EVENT.unpack_from(buf, offset)
+                offset += _INOTIFY_EVENT.size
+                names.append(buf[offset:offset + length].rstrip(b'\0'))
+                offset += length
+        return names
+
+    def wait(self, timeout):
+        deadline = time.time() + timeout
+        remaining = timeout
+        while remaining > 0:
+            ready, _, _ = select.select([self._fd], [], [], remaining)
+            if ready and self._basename in self._read_events():
+                return True
+            remaining = deadline - time.time()
+        return False
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class IncrementalFileReader(object):
+    """Read a growing file from a persistent offset.
+
+    The file is opened on the first read (it may not exist yet) and stays
+    open until :meth:`.close`. Each call to :meth:`.read` appends whatever
+    was written since the previous call to :attr:`.buffer`; callers remove
+    the bytes they have parsed with :meth:`.consume`. This works for regular
+    files as well as FIFOs.
+
+    Parameters
+    ----------
+    filename : str
+        the file to read
+    chunk_size : int
+        number of bytes requested from the OS per read call
+    """
+    def __init__(self, filename, chunk_size=1 << 16):
+        self.filename = filename
+        self.chunk_size = chunk_size
+        self.buffer = b''
+        self.offset = 0
+        self._fd = None
+
+    def fileno(self):
+        return self._fd
+
+    def open(self):
+        """Open the file, if possible.
+
+        Returns
+        -------
+        bool
+            whether the file is open
+        """
+        if self._fd is None:
+            try:
+                # there is no O_NONBLOCK on Windows, where reading a
+                # regular file does not block anyway
+                self._fd = os.open(self.filename,
+                                   os.O_RDONLY | getattr(os, 'O_NONBLOCK', 0))
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+        return self._fd is not None
+
+    def read(self):
+        """Read all newly available bytes into the buffer.
+
+        Returns
+        -------
+        int
+            number of new bytes
+        """
+        if not self.open():
+            return 0
+        n_new = 0
+        while True:
+            try:
+                data = os.read(self._fd, self.chunk_size)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                raise
+            if not data:
+                break
+            self.buffer += data
+            n_new += len(data)
+        return n_new
+
+    def consume(self, n_bytes):
+        """Remove the first ``n_bytes`` of the buffer after parsing them"""
+        self.buffer = self.buffer[n_bytes:]
+        self.offset += n_bytes
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+def make_watcher(filename, method='auto', reader=None):
+    """Choose how to wait for new frames in ``filename``.
+
+    Parameters
+    ----------
+    filename : str
+        the file the engine writes to
+    method : str
+        one of 'auto', 'inotify', 'select', or 'sleep'. For 'auto', FIFOs
+        use 'select' (if a reader is given), other files use 'inotify' if
+        available, and 'sleep' otherwise.
+    reader : :class:`.IncrementalFileReader` or None
+        reader for the file; required for 'select'
+
+    Returns
+    -------
+    :class:`.InotifyWatcher` or :class:`.SelectWatcher` or :class:`.SleepWatcher`
+    """
+    if method == 'auto':
+        if reader is not None and is_fifo(filename):
+            method = 'select'
+        elif inotify_available():
+            method = 'inotify'
+        else:
+            method = 'sleep'
+
+    if method == 'inotify':
+        watcher = InotifyWatcher(filename)
+    elif method == 'select':
+        if reader is None or not reader.open():
+            raise RuntimeError("Waiting with select requires an open reader")
+        watcher = SelectWatcher(reader.fileno())
+    elif method == 'sleep':
+        watcher = SleepWatcher()
+    else:
+        raise ValueError("Unknown method to wait for frames: "
+                         + str(method))
+    logger.debug("Waiting for frames in %s with %s", filename,
+                 watcher.__class__.__name__)
+    return watcher
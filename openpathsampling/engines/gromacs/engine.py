@@ -24,8 +24,11 @@ import os
 import psutil
 import shlex
 import time
+import collections
 import numpy as np
 
+from .trr import TRRFrameReader
+
 from openpathsampling.engines.external_engine import (
     _debug_open_files, close_file_descriptors
 )
@@ -104,12 +107,16 @@ class GromacsEngine(ExternalEngine):
               -e self.edr_file -g self.log_file``, where the ``topol.top``
               is generated by :meth:`.prepare`, and the other filenames are
               set by :meth:`.set_filenames`. Default is the empty string.
+            * ``max_open_trr``: Number of TRR files kept open for reading.
+              Each open file remembers where its frames are, so that
+              reading the next frame does not rescan the file. Default is 4.
     """
     _default_options = dict(ExternalEngine._default_options,
         **{
             'gmx_executable': "gmx ",
             'grompp_args': "",
-            'mdrun_args': ""
+            'mdrun_args': "",
+            'max_open_trr': 4
         }
     )
     def __init__(self, gro, mdp, top, options, base_dir="", prefix="gmx"):
@@ -130,8 +137,7 @@ class GromacsEngine(ExternalEngine):
             except OSError:
                 pass  # the directory already exists
 
-        self._file = None  # file open/close efficiency
-        self._last_filename = None
+        self._trr_readers = collections.OrderedDict()
         # TODO: add snapshot_timestep; first via options, later read mdp
         template = snapshot_from_gro(self.gro)
         self.topology = template.topology
@@ -179,50 +185,56 @@ class GromacsEngine(ExternalEngine):
     def mdtraj_topology(self, value):
         self._mdtraj_topology = value
 
+    def trr_reader(self, filename):
+        """Open :class:`.TRRFrameReader` for ``filename``.
+
+        Readers are reused while the file is unchanged; at most
+        ``max_open_trr`` files are kept open.
+        """
+        reader = self._trr_readers.pop(filename, None)
+        if reader is not None and not reader.is_current():
+            reader.close()
+            reader = None
+        if reader is None:
+            reader = TRRFrameReader(filename)  # IOError if no file
+        self._trr_readers[filename] = reader  # most recently used is last
+        while len(self._trr_readers) > self.options['max_open_trr']:
+            _, oldest = self._trr_readers.popitem(last=False)
+            oldest.close()
+        return reader
+
+    def close_trr_readers(self):
+        """Close all TRR files kept open for reading"""
+        for reader in self._trr_readers.values():
+            reader.close()
+        self._trr_readers.clear()
+
+    def _forget_trr_reader(self, filename):
+        reader = self._trr_readers.pop(filename, None)
+        if reader is not None:
+            reader.close()
+
     def read_frame_data(self, filename, frame_num):
         """
         Returns pos, vel, box or raises error
         """
-        # if self._last_filename != filename:
-            # try:
-                # self._file.close()
-            # except AttributeError:
-                # pass  # first time thru, self._file is None
-            # self._file = TRRTrajectoryFile(filename)
-        # f = self._file
-        # do we need to reopen the TRR each time to avoid problems with the
-        # fiel length changing?
-        trr = TRRTrajectoryFile(filename)
-        f = trr
-        logger.debug("Reading file %s frame %d (of %d)",
-                     filename, frame_num, len(f))
-        # logger.debug("File length: %d", len(f))
-        try:
-            f.seek(offset=frame_num)
-            data = f._read(n_frames=1, atom_indices=None, get_velocities=True)
-        finally:
-            trr.close()
-
-        return data[0][0], data[5][0], data[3][0]
+        logger.debug("Reading file %s frame %d", filename, frame_num)
+        return self.trr_reader(filename).read_frame(frame_num)
 
     def read_frame_from_file(self, file_name, frame_num):
         # note: this only needs to return the file pointers -- but should
-        # only do so once that frame has been written!
-        basename = os.path.basename(file_name)
-        # basename should be in the format [0-9]+\.trr (as set by the
-        # trajectory_filename method)
-        file_number = int(basename.split('.')[0])
+        # only do so once that frame has been written! We only check the
+        # frame headers here; the data is read when the snapshot needs it.
         try:
-            xyz, vel, box = self.read_frame_data(file_name, frame_num)
-        except (IndexError, OSError, IOError) as e:
-            # this means that no such frame exists yet, so we return None
-            # IndexError in older version, OSError more recently (specific
-            # MDTraj error)
+            status = self.trr_reader(file_name).frame_status(frame_num)
+        except (OSError, IOError) as e:
+            # the file doesn't exist yet
             logger.debug("Expected exception caught: " + str(e))
-            close_file_descriptors(basename)
             return None
-        except RuntimeError as e:
-            # TODO: matches "TRR read error"
+
+        if status is None:
+            return None
+        elif status == 'partial':
             logger.debug("Received partial frame for %s %d", file_name,
                          frame_num+1)
             return 'partial'
@@ -240,6 +252,7 @@ class GromacsEngine(ExternalEngine):
             # you don't want them.
             raise RuntimeError("File " + str(filename) + " exists. "
                                + "Preventing overwrite.")
+        self._forget_trr_reader(filename)
         # type control before passing things to Cython code
         xyz = np.asarray([snapshot.xyz], dtype=np.float32)
         time = np.asarray([0.0], dtype=np.float32)
@@ -292,6 +305,8 @@ class GromacsEngine(ExternalEngine):
         return return_code
 
     def cleanup(self):
+        # frames of the trajectory reopen their file when they are read
+        self.close_trr_readers()
         if os.path.isfile(self.input_file):
             os.remove(self.input_file)
 
@@ -0,0 +1,233 @@
+"""
+Streaming reader for Gromacs TRR files.
+
+MDTraj's TRR reader is designed to read complete files; finding frame ``k``
+requires reopening the file and seeking through the ``k`` previous frames.
+When monitoring a trajectory that Gromacs is still writing, we request the
+frames one after another, so that would make reading a trajectory of ``n``
+frames cost :math:`O(n^2)`. The :class:`.TRRFrameReader` instead keeps the
+file open and remembers the byte offset of every complete frame it has seen,
+so checking for the next frame only needs to parse one new header.
+"""
+
+import logging
+import os
+import struct
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+TRR_MAGIC = 1993
+
+# magic, length of version string (+1), length of version string, version
+_VERSION = struct.Struct('>iii12s')
+# ir, e, box, vir, pres, top, sym, x, v, f sizes; natoms, step, nre
+_SIZES = struct.Struct('>13i')
+_HEADER_INTS_SIZE = _VERSION.size + _SIZES.size
+
+
+class TRRFrameHeader(object):
+    """Sizes and metadata of a single TRR frame.
+
+    Parameters
+    ----------
+    offset : int
+        byte offset of the start of the frame in the file
+    sizes : tuple of int
+        the integers of the TRR frame header, in file order
+    """
+    def __init__(self, offset, sizes):
+        self.offset = offset
+        (_, _, self.box_size, self.vir_size, self.pres_size, _, _,
+         self.x_size, self.v_size, self.f_size,
+         self.n_atoms, self.step, _) = sizes
+        n_xyz = self.n_atoms * 3
+        if self.box_size:
+            self.real_size = self.box_size // 9
+        elif self.x_size:
+            self.real_size = self.x_size // n_xyz
+        elif self.v_size:
+            self.real_size = self.v_size // n_xyz
+        else:
+            self.real_size = self.f_size // n_xyz
+        if self.real_size not in (4, 8):
+            raise RuntimeError("TRR read error: bad header at byte %d"
+                               % offset)
+        self.dtype = np.dtype('>f%d' % self.real_size)
+        self.header_size = _HEADER_INTS_SIZE + 2 * self.real_size
+        self.box_offset = self.header_size
+        self.x_offset = (self.box_offset + self.box_size + self.vir_size
+                         + self.pres_size)
+        self.v_offset = self.x_offset + self.x_size
+        self.data_size = (self.v_offset + self.v_size + self.f_size
+                          - self.header_size)
+        self.frame_size = self.header_size + self.data_size
+
+
+class TRRFrameReader(object):
+    """Read frames from a (possibly growing) TRR file.
+
+    The file stays open, and the offsets of complete frames are kept so that
+    each frame header is only parsed once. Frame data is read with a single
+    ``readinto`` into a reused buffer, and converted into preallocated
+    arrays when those are given.
+
+    Parameters
+    ----------
+    filename : str
+        the TRR file
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self._file = open(filename, 'rb')
+        self._inode = os.fstat(self._file.fileno()).st_ino
+        self.headers = []
+        self._end_offset = 0  # end of the last complete frame
+        self._buffer = bytearray()
+
+    def __len__(self):
+        """Number of complete frames found so far"""
+        return len(self.headers)
+
+    def is_current(self):
+        """Whether the open file is still the file at ``filename``.
+
+        This is False if the file has been removed, replaced, or truncated
+        (e.g., a trajectory was rerun with the same file name).
+        """
+        if self._file is None:
+            return False
+        try:
+            stat = os.stat(self.filename)
+        except OSError:
+            return False
+        return (stat.st_ino == self._inode
+                and stat.st_size >= self._end_offset)
+
+    def _file_size(self):
+        return os.fstat(self._file.fileno()).st_size
+
+    def _scan(self, frame_num):
+        """Find complete frames up to ``frame_num``.
+
+        Returns
+        -------
+        str or None
+            'complete' if the frame is available, 'partial' if it is being
+            written, and None if it has not been started
+        """
+        file_size = self._file_size()
+        while len(self.headers) <= frame_num:
+            offset = self._end_offset
+            remaining = file_size - offset
+            if remaining <= 0:
+                return None
+            if remaining < _HEADER_INTS_SIZE:
+                break
+            self._file.seek(offset)
+            raw = self._file.read(_HEADER_INTS_SIZE)
+            version = _VERSION.unpack_from(raw)
+            if version[0] != TRR_MAGIC:
+                raise RuntimeError("TRR read error: bad magic number in "
+                                   "%s at byte %d" % (self.filename, offset))
+            header = TRRFrameHeader(offset, _SIZES.unpack_from(raw,
+                                                               _VERSION.size))
+            if remaining < header.frame_size:
+                break
+            self.headers.append(header)
+            self._end_offset = offset + header.frame_size
+
+        if len(self.headers) > frame_num:
+            return 'complete'
+        elif len(self.headers) == frame_num:
+            return 'partial'
+        else:
+            return None
+
+    def frame_status(self, frame_num):
+        """Whether ``frame_num`` is complete, without reading its data.
+
+        Parameters
+        ----------
+        frame_num : int
+            the frame number (0-based)
+
+        Returns
+        -------
+        str or None
+            'complete' if the frame is available, 'partial' if it is being
+            written, and None if it has not been started
+        """
+        if frame_num < len(self.headers):
+            return 'complete'
+        return self._scan(frame_num)
+
+    def read_frame(self, frame_num, xyz=None, velocities=None, box=None):
+        """Read the coordinates, velocities, and box of a frame.
+
+        Parameters
+        ----------
+        frame_num : int
+            the frame number (0-based)
+        xyz, velocities : np.array (n_atoms, 3) or None
+            preallocated output arrays; new arrays are created if None
+        box : np.array (3, 3) or None
+            preallocated output array; a new array is created if None
+
+        Returns
+        -------
+        xyz, velocities, box : np.array
+            the frame data; velocities are zero if the frame has none
+
+        Raises
+        ------
+        IndexError
+            if the frame has not been started
+        RuntimeError
+            if the frame is only partially written
+        """
+        status = self.frame_status(frame_num)
+        if status is None:
+            raise IndexError("Frame %d not in %s" % (frame_num,
+                                                     self.filename))
+        elif status == 'partial':
+            raise RuntimeError("TRR read error: frame %d of %s is partial"
+                               % (frame_num, self.filename))
+
+        header = self.headers[frame_num]
+        if len(self._buffer) < header.data_size:
+            self._buffer = bytearray(header.data_size)
+        data = memoryview(self._buffer)[:header.data_size]
+        self._file.seek(header.offset + header.header_size)
+        self._file.readinto(data)
+
+        native = header.dtype.newbyteorder('=')
+        shape = (header.n_atoms, 3)
+        if xyz is None:
+            xyz = np.empty(shape, dtype=native)
+        if velocities is None:
+            velocities = np.empty(shape, dtype=native)
+        if box is None:
+            box = np.empty((3, 3), dtype=native)
+
+        def copy_block(out, block_offset, block_size, n_values, out_shape):
+            if block_size:
+                start = block_offset - header.header_size
+                values = np.frombuffer(self._buffer, dtype=header.dtype,
+                                       count=n_values, offset=start)
+                np.copyto(out, values.reshape(out_shape))
+            else:
+                out.fill(0.0)
+
+        copy_block(box, header.box_offset, header.box_size, 9, (3, 3))
+        copy_block(xyz, header.x_offset, header.x_size, 3 * header.n_atoms,
+                   shape)
+        copy_block(velocities, header.v_offset, header.v_size,
+                   3 * header.n_atoms, shape)
+        return xyz, velocities, box
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -1,3 +1,6 @@
+import collections
+import threading
+
 import numpy as np
 
 from openpathsampling.integration_tools import (
@@ -366,6 +369,130 @@ def trajectory_to_mdtraj(trajectory, md_topology=None):
     # engines.openmm.tools to require engines.trajectory than vice versa
     return trajectory.to_mdtraj(md_topology)
 
+
+class MDTrajConversionCache(object):
+    """
+    Recent conversions of trajectories to mdtraj, shared between CVs
+
+    Several mdtraj-based CVs evaluated on the same snapshots (e.g., the CVs
+    of a state definition) would each build the same
+    :class:`mdtraj.Trajectory`. This keeps the coordinates and box vectors
+    of the most recent conversions, keyed by the snapshots and the mdtraj
+    topology, so that they are gathered from the snapshots only once.
+
+    Each call returns a new :class:`mdtraj.Trajectory` with a copy of the
+    coordinates, so CV functions that change the trajectory in place (like
+    ``superpose``) do not affect the others.
+
+    The stored coordinates stay in memory until newer conversions replace
+    them or :meth:`clear` is called. At most ``max_entries`` conversions
+    with together at most ``max_bytes`` of coordinates and box vectors are
+    kept; larger conversions are not stored at all. The cache can be used
+    from several threads.
+
+    Parameters
+    ----------
+    max_entries : int
+        the number of conversions that are kept
+    max_bytes : int
+        the maximal size in bytes of the stored arrays. The default is
+        64 MiB.
+
+    Attributes
+    ----------
+    n_hits : int
+        number of conversions that could reuse stored coordinates
+    n_misses : int
+        number of conversions that had to gather the coordinates
+    nbytes : int
+        the size in bytes of the stored arrays
+    """
+    def __init__(self, max_entries=4, max_bytes=64 * 1024 ** 2):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.n_hits = 0
+        self.n_misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        """Remove all stored conversions"""
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    @staticmethod
+    def _size(xyz, box_vectors):
+        size = xyz.nbytes
+        if box_vectors is not None:
+            size += box_vectors.nbytes
+        return size
+
+    def _store(self, key, md_topology, xyz, box_vectors):
+        size = self._size(xyz, box_vectors)
+        if self.max_entries < 1 or size > self.max_bytes:
+            return
+
+        if key in self._entries:
+            return
+
+        # keep the topology, so that its id is not reused
+        self._entries[key] = (md_topology, xyz, box_vectors)
+        self.nbytes += size
+        while len(self._entries) > self.max_entries or \
+                self.nbytes > self.max_bytes:
+            _, (_, old_xyz, old_box) = self._entries.popitem(last=False)
+            self.nbytes -= self._size(old_xyz, old_box)
+
+    def convert(self, snapshots, md_topology):
+        """
+        Convert snapshots to a :class:`mdtraj.Trajectory`
+
+        Parameters
+        ----------
+        snapshots : list of :class:`.BaseSnapshot` or :class:`.Trajectory`
+            the snapshots to convert
+        md_topology : :class:`mdtraj.Topology`
+            the topology of the mdtraj trajectory
+
+        Returns
+        -------
+        :class:`mdtraj.Trajectory`
+            the trajectory, as :func:`trajectory_to_mdtraj` would return it
+        """
+        error_if_no_mdtraj("Converting to mdtraj")
+        key = (id(md_topology),
+               tuple(snap.__uuid__ for snap in snapshots))
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self.n_misses += 1
+            else:
+                self.n_hits += 1
+                # most recently used entries are last
+                self._entries[key] = entry
+
+        if entry is None:
+            traj = trajectory_to_mdtraj(snapshots, md_topology)
+            xyz, box_vectors = traj.xyz, traj.unitcell_vectors
+            with self._lock:
+                self._store(key, md_topology, xyz, box_vectors)
+        else:
+            _, xyz, box_vectors = entry
+
+        traj = md.Trajectory(xyz.copy(), md_topology)
+        if box_vectors is not None:
+            traj.unitcell_vectors = box_vectors.copy()
+        return traj
+
+
+mdtraj_conversions = MDTrajConversionCache()
+
+
 def ops_load_trajectory(filename, **kwargs):
     error_if_no_mdtraj("ops_load_trajectory")
     return trajectory_from_mdtraj(md.load(filename, **kwargs))
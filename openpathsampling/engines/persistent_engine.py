@@ -0,0 +1,258 @@
+"""
+Indirect engines that keep their external processes alive between
+trajectories.
+
+The normal :class:`.ExternalEngine` launches a new process for every
+trajectory and kills it when the trajectory is done. For short trajectories,
+the cost of starting the process can be larger than the cost of the
+dynamics. A :class:`.PersistentExternalEngine` instead sends each new
+trajectory to a long-running worker process, using a simple line-based
+protocol over the worker's stdin and stdout:
+
+* ``run <input_file> <output_file>``: (OPS to worker) load the initial frame
+  from ``input_file`` and start writing frames to ``output_file``
+* ``stop``: (OPS to worker) stop the current trajectory and close its
+  output file; the worker must reply ``stopped`` once the output file is
+  closed
+* ``quit``: (OPS to worker) exit; the worker should also exit when its
+  stdin is closed
+
+File names are quoted as for a POSIX shell, so workers should split
+commands with :func:`shlex.split` (or equivalent). Anything else the worker
+needs to write should go to stderr or to a log file, since stdout is
+reserved for replies.
+"""
+
+import logging
+import os
+import shlex
+import subprocess
+import threading
+
+import psutil
+
+try:
+    from shlex import quote
+except ImportError:  # pragma: no cover
+    from pipes import quote  # Py2
+
+from .external_engine import ExternalEngine
+
+logger = logging.getLogger(__name__)
+
+
+class ExternalEngineWorker(object):
+    """A long-running external engine process
+
+    Parameters
+    ----------
+    command : str
+        the command to start the worker process
+    """
+    def __init__(self, command):
+        self.command = command
+        self.busy = False
+        logger.info("Starting engine worker: " + command)
+        self.proc = psutil.Popen(shlex.split(command),
+                                 stdin=subprocess.PIPE,
+                                 stdout=subprocess.PIPE,
+                                 preexec_fn=os.setsid,
+                                 universal_newlines=True)
+
+    def __repr__(self):  # pragma: no cover
+        return "ExternalEngineWorker({})".format(self.proc.pid)
+
+    def is_running(self):
+        """Whether the worker process is still alive"""
+        try:
+            return (self.proc.is_running()
+                    and self.proc.status() != psutil.STATUS_ZOMBIE)
+        except psutil.NoSuchProcess:
+            return False
+
+    def send(self, *words):
+        """Send a single command line to the worker"""
+        line = " ".join(quote(str(word)) for word in words)
+        logger.debug("Sending to %s: %s", repr(self), line)
+        self.proc.stdin.write(line + "\n")
+        self.proc.stdin.flush()
+
+    def receive(self):
+        """Wait for the next reply line from the worker"""
+        line = self.proc.stdout.readline()
+        if not line:
+            raise RuntimeError("External engine worker died unexpectedly")
+        return line.strip()
+
+    def run(self, input_file, output_file):
+        """Start a trajectory from ``input_file``, writing ``output_file``
+        """
+        self.busy = True
+        self.send("run", input_file, output_file)
+
+    def halt(self):
+        """Stop the current trajectory and wait until the worker confirms
+
+        After this returns, the worker has closed the output file and can
+        accept a new trajectory.
+        """
+        self.send("stop")
+        reply = self.receive()
+        if reply != "stopped":
+            raise RuntimeError("Unexpected reply from engine worker: "
+                               + str(reply))
+        self.busy = False
+
+    def close(self, timeout=10):
+        """Tell the worker to exit; kill it if it does not
+
+        Parameters
+        ----------
+        timeout : float
+            seconds to wait for the worker to exit before killing it
+        """
+        if self.is_running():
+            try:
+                self.send("quit")
+                self.proc.stdin.close()
+                self.proc.wait(timeout)
+            except (IOError, OSError, psutil.TimeoutExpired):
+                logger.info("Killing unresponsive engine worker %s",
+                            repr(self))
+                self.proc.kill()
+                self.proc.wait()
+        self.busy = False
+
+
+class ExternalEngineWorkerPool(object):
+    """Set of persistent engine workers that engines can borrow from.
+
+    Workers are started on demand, up to ``n_workers``. Several
+    :class:`.PersistentExternalEngine` objects (e.g., copies of an engine
+    used in different threads) can share one pool.
+
+    Parameters
+    ----------
+    n_workers : int
+        maximum number of worker processes
+    """
+    def __init__(self, n_workers=1):
+        self.n_workers = n_workers
+        self.workers = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.workers)
+
+    def acquire(self, command):
+        """Get an idle worker, starting a new one if needed.
+
+        Parameters
+        ----------
+        command : str
+            command used to start a worker, if a new worker is needed
+
+        Returns
+        -------
+        :class:`.ExternalEngineWorker`
+            worker that is now marked as busy
+        """
+        with self._lock:
+            dead = [w for w in self.workers if not w.is_running()]
+            for worker in dead:
+                logger.info("Removing dead engine worker %s", repr(worker))
+                self.workers.remove(worker)
+
+            idle = [w for w in self.workers
+                    if not w.busy and w.command == command]
+            if idle:
+                worker = idle[0]
+            elif len(self.workers) < self.n_workers:
+                worker = ExternalEngineWorker(command)
+                self.workers.append(worker)
+            else:
+                raise RuntimeError("All %d engine workers are busy"
+                                   % self.n_workers)
+            worker.busy = True
+            return worker
+
+    def close(self):
+        """Shut down all workers in the pool"""
+        with self._lock:
+            for worker in self.workers:
+                worker.close()
+            self.workers = []
+
+
+class PersistentExternalEngine(ExternalEngine):
+    """
+    External engine that reuses long-running worker processes.
+
+    Instead of launching a process for every trajectory (and killing it at
+    the end), this sends the trajectory to a worker from an
+    :class:`.ExternalEngineWorkerPool` and tells it to stop once the stop
+    condition is reached. See the module documentation for the protocol
+    the worker must follow.
+
+    Subclasses implement the same methods as for :class:`.ExternalEngine`,
+    except that :meth:`.worker_command` replaces
+    :meth:`.ExternalEngine.engine_command`. Call :meth:`.close` to shut down
+    the workers when the engine is no longer needed.
+
+    Parameters
+    ----------
+    options : dict
+        engine options; in addition to the options of
+        :class:`.ExternalEngine`, ``n_workers`` sets the size of the worker
+        pool created by this engine (default 1)
+    descriptor : :class:`.SnapshotDescriptor`
+        descriptor for the snapshots
+    template : :class:`.BaseSnapshot`
+        template snapshot
+    first_frame_in_file : bool
+        whether the worker writes the initial frame to the output file
+    pool : :class:`.ExternalEngineWorkerPool`
+        pool to take workers from. If None (default), the engine creates
+        its own pool with ``n_workers`` workers.
+    """
+    _default_options = dict(ExternalEngine._default_options,
+                            **{'n_workers': 1})
+
+    def __init__(self, options, descriptor, template,
+                 first_frame_in_file=False, pool=None):
+        super(PersistentExternalEngine, self).__init__(
+            options=options,
+            descriptor=descriptor,
+            template=template,
+            first_frame_in_file=first_frame_in_file
+        )
+        if pool is None:
+            pool = ExternalEngineWorkerPool(self.options['n_workers'])
+        self.pool = pool
+        self.worker = None
+
+    def launch_engine(self):
+        self.worker = self.pool.acquire(self.worker_command())
+        self.proc = self.worker.proc
+        self.worker.run(self.input_file, self.output_file)
+        logger.info("Sent trajectory to engine worker: " + repr(self.worker))
+
+    def halt_engine(self):
+        worker = self.worker
+        self.worker = None
+        try:
+            worker.halt()
+        except (IOError, OSError, RuntimeError):
+            # never hand a worker in an unknown state to the next trajectory
+            worker.close()
+            raise
+        finally:
+            worker.busy = False
+
+    def close(self):
+        """Shut down all worker processes of this engine's pool"""
+        self.pool.close()
+
+    def worker_command(self):
+        """Generates a string for the command to start a worker process."""
+        raise NotImplementedError()
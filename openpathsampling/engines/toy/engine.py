@@ -1,8 +1,118 @@
+import logging
+
 import numpy as np
 
 from openpathsampling.engines import DynamicsEngine, SnapshotDescriptor
+from openpathsampling.engines import (Trajectory, EngineMaxLengthError,
+                                      EngineNaNError)
 from .snapshot import ToySnapshot as Snapshot
 
+logger = logging.getLogger(__name__)
+
+
+class ToyWalkerBatch(object):
+    """State of several independent toy systems, integrated together.
+
+    This exposes the same attributes that the toy integrators and PESs read
+    from a :class:`.ToyEngine` (``positions``, ``velocities``, ``pes``,
+    ``mass`` and ``_minv``), but ``positions`` and ``velocities`` have shape
+    ``(n_walkers, n_spatial)``. Each integrator step therefore advances all
+    walkers with a single set of NumPy operations.
+
+    Parameters
+    ----------
+    engine : :class:`.ToyEngine`
+        engine providing PES and masses
+    positions : np.array (n_walkers, n_spatial)
+        initial positions of the walkers
+    velocities : np.array (n_walkers, n_spatial)
+        initial velocities of the walkers
+    """
+    def __init__(self, engine, positions, velocities):
+        self.pes = engine.pes
+        self.mass = engine.mass
+        self._minv = engine._minv
+        self.positions = np.array(positions, dtype=float)
+        self.velocities = np.array(velocities, dtype=float)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def keep(self, mask):
+        """Drop all walkers where ``mask`` is False."""
+        self.positions = self.positions[mask]
+        self.velocities = self.velocities[mask]
+
+
+class ToyFrameBuffer(object):
+    """Preallocated storage for the frames of a toy engine.
+
+    Each frame is written to the next row of a block of ``block_size``
+    frames, and the snapshot of the frame gets read-only views of that row
+    as its coordinates and velocities. Producing a frame therefore copies
+    the state once into the block, instead of allocating new arrays. Rows
+    are never reused: when a block is full, a new one is started, and the
+    old block is freed with the last snapshot that refers to it. A single
+    snapshot that is kept therefore keeps the memory of its whole block,
+    ``block_size`` frames; copy its arrays to avoid this.
+
+    Parameters
+    ----------
+    block_size : int
+        number of frames per block
+    """
+    def __init__(self, block_size=1024):
+        self.block_size = block_size
+        self._coordinates = None
+        self._velocities = None
+        self._next = block_size
+
+    def _new_block(self, positions, velocities):
+        self._coordinates = np.empty(
+            (self.block_size, 1) + positions.shape, dtype=positions.dtype)
+        self._velocities = np.empty(
+            (self.block_size, 1) + velocities.shape, dtype=velocities.dtype)
+        self._next = 0
+
+    def _fits(self, block, value):
+        return block.shape[2:] == value.shape and block.dtype == value.dtype
+
+    def add(self, positions, velocities):
+        """Store a frame.
+
+        Parameters
+        ----------
+        positions : np.array (n_spatial)
+            positions of the frame
+        velocities : np.array (n_spatial)
+            velocities of the frame
+
+        Returns
+        -------
+        coordinates : np.array (1, n_spatial)
+            read-only view of the stored positions
+        velocities : np.array (1, n_spatial)
+            read-only view of the stored velocities
+        """
+        positions = np.asarray(positions)
+        velocities = np.asarray(velocities)
+        if (self._next == self.block_size
+                or not self._fits(self._coordinates, positions)
+                or not self._fits(self._velocities, velocities)):
+            self._new_block(positions, velocities)
+
+        row = self._next
+        self._next += 1
+        frame = []
+        for (block, value) in [(self._coordinates, positions),
+                               (self._velocities, velocities)]:
+            block[row, 0] = value
+            view = block[row]
+            view.flags.writeable = False
+            frame.append(view)
+
+        return tuple(frame)
+
 
 class ToyEngine(DynamicsEngine):
     """Engine for toy models. Mostly used for 2D examples.
@@ -35,7 +145,15 @@ class ToyEngine(DynamicsEngine):
     snapshot_timestep : float
         time step between reported snapshots
     current_snapshot : :class:`.Snapshot`
-        the current state of the system, as a snapshot
+        the current state of the system, as a snapshot. Its coordinates
+        and velocities are read-only views into a :class:`.ToyFrameBuffer`
+        owned by the engine
+    positions : np.array (n_spatial)
+        the current positions. The integrators change this array in place,
+        so read-only arrays (like those of snapshots) are copied when they
+        are assigned.
+    velocities : np.array (n_spatial)
+        the current velocities; read-only arrays are copied as well
     """
 
     base_snapshot_type = Snapshot
@@ -76,6 +194,10 @@ class ToyEngine(DynamicsEngine):
         self.positions = None
         self.velocities = None
 
+        # state arrays allocated by the engine, which may be overwritten
+        self._state_arrays = {}
+        self._frames = ToyFrameBuffer()
+
         self._mass = np.array(topology.masses)
         self._pes = topology.pes
         self._minv = 1.0 / self._mass
@@ -107,17 +229,39 @@ class ToyEngine(DynamicsEngine):
         self._mass = value
         self._minv = np.reciprocal(value)
 
+    @staticmethod
+    def _writeable(value):
+        if isinstance(value, np.ndarray) and not value.flags.writeable:
+            return value.copy()
+        return value
+
+    @property
+    def positions(self):
+        return self._positions
+
+    @positions.setter
+    def positions(self, value):
+        self._positions = self._writeable(value)
+
+    @property
+    def velocities(self):
+        return self._velocities
+
+    @velocities.setter
+    def velocities(self, value):
+        self._velocities = self._writeable(value)
+
     @property
     def snapshot_timestep(self):
         return self.n_steps_per_frame * self.integ.dt
 
     @property
     def current_snapshot(self):
-        snap_pos = self.positions
-        snap_vel = self.velocities
+        coordinates, velocities = self._frames.add(self.positions,
+                                                   self.velocities)
         return Snapshot(
-            coordinates=np.array([snap_pos]),
-            velocities=np.array([snap_vel]),
+            coordinates=coordinates,
+            velocities=velocities,
             engine=self
         )
 
@@ -125,12 +269,143 @@ class ToyEngine(DynamicsEngine):
     def current_snapshot(self, snap):
         self.check_snapshot_type(snap)
 
-        coords = np.copy(snap.coordinates)
-        vels = np.copy(snap.velocities)
-        self.positions = coords[0]
-        self.velocities = vels[0]
+        self._set_state('positions', snap.coordinates[0])
+        self._set_state('velocities', snap.velocities[0])
+
+    def _set_state(self, name, value):
+        # copy into the array the engine allocated before, if it is still
+        # in use; arrays set from outside are never overwritten
+        current = getattr(self, name)
+        if (current is not None
+                and current is self._state_arrays.get(name)
+                and current.shape == np.shape(value)
+                and current.dtype == np.asarray(value).dtype):
+            current[...] = value
+        else:
+            current = np.array(value)
+            self._state_arrays[name] = current
+            setattr(self, name, current)
 
     def generate_next_frame(self):
         for i in range(self.n_steps_per_frame):
             self.integ.step(sys=self)
         return self.current_snapshot
+
+    def generate_batch(self, snapshots, running=None, direction=+1):
+        """Generate one trajectory per initial snapshot, all at once.
+
+        All walkers are integrated together as a :class:`.ToyWalkerBatch`,
+        so that each integration step is a handful of NumPy calls on
+        ``(n_walkers, n_spatial)`` arrays instead of one Python-level step
+        per walker. The stop conditions are evaluated separately for each
+        walker; walkers that are finished are dropped from the batch.
+
+        Parameters
+        ----------
+        snapshots : list of :class:`.Snapshot`
+            initial snapshot for each walker
+        running : (list of) function(:class:`.Trajectory`)
+            callable function of a 'Trajectory' that returns True or False.
+            If one of these returns False the walker is stopped.
+        direction : -1 or +1 (DynamicsEngine.FORWARD or DynamicsEngine.BACKWARD)
+            If +1 then this will integrate forward, if -1 it will reverse
+            the momenta of the given snapshots and then prepend the
+            generated snapshots with reversed momenta, as in
+            :meth:`.DynamicsEngine.generate`
+
+        Returns
+        -------
+        list of :class:`.Trajectory`
+            the trajectory for each walker, in the order of ``snapshots``
+
+        Raises
+        ------
+        ValueError
+            if ``on_nan`` or ``on_max_length`` is ``'retry'``. Walkers are
+            not restarted; use :meth:`.generate` for each snapshot instead.
+        EngineNaNError
+            if a snapshot is not valid (see :meth:`.is_valid_snapshot`)
+        EngineMaxLengthError
+            if ``on_max_length`` is ``'fail'`` and a walker hits the
+            maximal length
+        """
+        if direction == 0:
+            raise RuntimeError(
+                'direction must be positive (FORWARD) or negative (BACKWARD).')
+
+        if 'retry' in (self.on_nan, self.on_max_length):
+            raise ValueError(
+                "generate_batch does not retry trajectories. Set on_nan and "
+                "on_max_length to something other than 'retry' or use "
+                "generate for each snapshot.")
+
+        try:
+            iter(running)
+        except TypeError:
+            running = [running]
+
+        if direction < 0:
+            starts = [snap.reversed for snap in snapshots]
+        else:
+            starts = list(snapshots)
+
+        for snap in starts:
+            self.check_snapshot_type(snap)
+
+        trajectories = [Trajectory([snap]) for snap in snapshots]
+        max_length = self.options['n_frames_max']
+
+        # indices (into trajectories) of the walkers that are still running
+        active = [
+            idx for idx, traj in enumerate(trajectories)
+            if not self.stop_conditions(trajectory=traj,
+                                        continue_conditions=running,
+                                        trusted=False)
+        ]
+
+        batch = ToyWalkerBatch(
+            engine=self,
+            positions=[starts[idx].coordinates[0] for idx in active],
+            velocities=[starts[idx].velocities[0] for idx in active]
+        )
+
+        logger.info("Starting batch of %d trajectories", len(active))
+        while active:
+            for _ in range(self.n_steps_per_frame):
+                self.integ.step(sys=batch)
+
+            keep = np.ones(len(active), dtype=bool)
+            for (row, idx) in enumerate(active):
+                traj = trajectories[idx]
+                snapshot = Snapshot(
+                    coordinates=batch.positions[row:row + 1].copy(),
+                    velocities=batch.velocities[row:row + 1].copy(),
+                    engine=self
+                )
+                # as in iter_generate, an invalid snapshot is not added
+                if not self.is_valid_snapshot(snapshot):
+                    raise EngineNaNError('`nan` in snapshot', traj)
+
+                if direction > 0:
+                    traj.append(snapshot)
+                else:
+                    traj.insert(0, snapshot.reversed)
+
+                if self.stop_conditions(trajectory=traj,
+                                        continue_conditions=running):
+                    keep[row] = False
+                elif max_length and len(traj) >= max_length:
+                    if self.on_max_length == 'fail':
+                        raise EngineMaxLengthError(
+                            'Hit maximal length of %d frames.' % max_length,
+                            traj
+                        )
+                    logger.info('Trajectory hit max length. Stopping.')
+                    keep[row] = False
+
+            if not keep.all():
+                batch.keep(keep)
+                active = [idx for (idx, k) in zip(active, keep) if k]
+
+        logger.info("Finished batch of %d trajectories", len(trajectories))
+        return trajectories
@@ -6,8 +6,30 @@ from openpathsampling.netcdfplus import StorableObject
 # The decorator @restores_ allows us to restore the object from a JSON
 # string completely and can thus be stored automatically
 
+class _ConfigurationSystem(object):
+    """Minimal stand-in for an engine, used to evaluate a PES on arrays.
+
+    Parameters
+    ----------
+    positions : array-like (..., n_spatial)
+        positions of the configurations
+    mass : array-like (n_spatial) or None
+        masses; unit masses if None
+    """
+    def __init__(self, positions, mass=None):
+        self.positions = np.asarray(positions, dtype=float)
+        if mass is None:
+            mass = np.ones(self.positions.shape[-1])
+        self.mass = np.asarray(mass, dtype=float)
+
+
 class PES(StorableObject):
     """Abstract base class for toy potential energy surfaces.
+
+    The ``V`` and ``dVdx`` methods read ``sys.positions``, where the last
+    axis is the spatial degree of freedom. Any leading axes (e.g., one per
+    walker in :meth:`.ToyEngine.generate_batch`) are broadcast, giving one
+    energy (or one gradient row) per configuration.
     """
     # For now, we only support additive combinations; maybe someday that can
     # include multiplication, too
@@ -21,6 +43,55 @@ class PES(StorableObject):
     def __sub__(self, other):
         return PES_Sub(self, other)
 
+    def V_array(self, positions, mass=None):
+        """Potential energy for many configurations at once.
+
+        Parameters
+        ----------
+        positions : array-like (..., n_spatial)
+            configurations to evaluate; the last axis is the spatial degree
+            of freedom, e.g., ``trajectory.xyz[:, 0, :]``
+        mass : array-like (n_spatial) or None
+            masses, only used by mass-dependent PESs. If None, unit masses
+            are used.
+
+        Returns
+        -------
+        np.array (...)
+            the potential energy of each configuration
+        """
+        return self.V(_ConfigurationSystem(positions, mass))
+
+    def dVdx_array(self, positions, mass=None):
+        """Derivative of the potential energy for many configurations.
+
+        Parameters
+        ----------
+        positions : array-like (..., n_spatial)
+            configurations to evaluate; the last axis is the spatial degree
+            of freedom
+        mass : array-like (n_spatial) or None
+            masses, only used by mass-dependent PESs. If None, unit masses
+            are used.
+
+        Returns
+        -------
+        np.array (..., n_spatial)
+            the derivatives of the potential for each configuration
+        """
+        dVdx = self.dVdx(_ConfigurationSystem(positions, mass))
+        return np.broadcast_to(dVdx, np.shape(positions)).copy()
+
+    def flatten(self):
+        """Fuse this PES into a single-pass :class:`.FlattenedPES`.
+
+        Returns
+        -------
+        :class:`.FlattenedPES`
+            PES with the same energy and forces as this one
+        """
+        return FlattenedPES(self)
+
     def kinetic_energy(self, sys):
         """Default kinetic energy implementation.
 
@@ -31,7 +102,7 @@ class PES(StorableObject):
         """
         v = sys.velocities
         m = sys.mass
-        return 0.5*np.dot(m, np.multiply(v, v))
+        return 0.5*np.dot(np.multiply(v, v), m)
 
 
 class PES_Combination(PES):
@@ -169,7 +240,7 @@ class HarmonicOscillator(PES):
         """
         dx = sys.positions - self.x0
         k = self.omega*self.omega*sys.mass
-        return 0.5*np.dot(self.A * k, dx * dx)
+        return 0.5*np.dot(dx * dx, self.A * k)
 
     def dVdx(self, sys):
         """Derivative of potential energy (-force)
@@ -206,7 +277,6 @@ class Gaussian(PES):
         self.A = A
         self.alpha = np.array(alpha)
         self.x0 = np.array(x0)
-        self._local_dVdx = np.zeros(self.x0.size)
 
     def __repr__(self):  # pragma: no cover
         return "Gaussian({o.A}, {o.alpha}, {o.x0})".format(o=self)
@@ -225,7 +295,7 @@ class Gaussian(PES):
             the potential energy
         """
         dx = sys.positions - self.x0
-        return self.A*np.exp(-np.dot(self.alpha, np.multiply(dx, dx)))
+        return self.A*np.exp(-np.dot(np.multiply(dx, dx), self.alpha))
 
     def dVdx(self, sys):
         """Derivative of potential energy (-force)
@@ -241,10 +311,8 @@ class Gaussian(PES):
             the derivatives of the potential at this point
         """
         dx = sys.positions - self.x0
-        exp_part = self.A*np.exp(-np.dot(self.alpha, np.multiply(dx, dx)))
-        for i in range(len(dx)):
-            self._local_dVdx[i] = -2*self.alpha[i]*dx[i]*exp_part
-        return self._local_dVdx
+        exp_part = self.A*np.exp(-np.dot(np.multiply(dx, dx), self.alpha))
+        return -2.0*self.alpha*dx*np.expand_dims(exp_part, -1)
 
 
 class OuterWalls(PES):
@@ -263,7 +331,6 @@ class OuterWalls(PES):
         super(OuterWalls, self).__init__()
         self.sigma = np.array(sigma)
         self.x0 = np.array(x0)
-        self._local_dVdx = np.zeros(self.x0.size)
 
     def __repr__(self):  # pragma: no cover
         return "OuterWalls({o.sigma}, {o.x0})".format(o=self)
@@ -282,10 +349,7 @@ class OuterWalls(PES):
             the potential energy
         """
         dx = sys.positions - self.x0
-        myV = 0.0
-        for i in range(len(dx)):
-            myV += self.sigma[i]*dx[i]**6
-        return myV
+        return np.dot(dx**6, self.sigma)
 
     def dVdx(self, sys):
         """Derivative of potential energy (-force)
@@ -301,9 +365,7 @@ class OuterWalls(PES):
             the derivatives of the potential at this point
         """
         dx = sys.positions - self.x0
-        for i in range(len(dx)):
-            self._local_dVdx[i] = 6.0*self.sigma[i]*dx[i]**5
-        return self._local_dVdx
+        return 6.0*self.sigma*dx**5
 
 
 class LinearSlope(PES):
@@ -339,7 +401,7 @@ class LinearSlope(PES):
         float
             the potential energy
         """
-        return np.dot(self.m, sys.positions) + self.c
+        return np.dot(sys.positions, self.m) + self.c
 
     def dVdx(self, sys):
         """Derivative of potential energy (-force)
@@ -356,3 +418,180 @@ class LinearSlope(PES):
         """
         # this is independent of the position
         return self._local_dVdx
+
+
+class FlattenedPES(PES):
+    """Combination of toy PESs fused into a single evaluation pass.
+
+    The ``PES_Add``/``PES_Sub`` tree of ``pes`` is walked once, when this
+    object is created, and its terms are grouped by type. All harmonic,
+    Gaussian, and outer-wall terms of the tree are stacked into arrays, so
+    each group costs one set of NumPy operations. The displacements
+    ``x - x0`` are computed once for each distinct center and shared by all
+    terms with that center, and the Gaussian exponentials are shared between
+    the energy and its derivative in :meth:`.V_and_dVdx`. Linear slopes are
+    summed into a single slope. Terms of any other type are evaluated as
+    usual.
+
+    Parameters
+    ----------
+    pes : :class:`.PES`
+        the PES to flatten
+    """
+    def __init__(self, pes):
+        super(FlattenedPES, self).__init__()
+        self.pes = pes
+
+        harmonic, gaussian, walls, other = [], [], [], []
+        self._slope = 0.0
+        self._offset = 0.0
+        for (sign, term) in self._signed_terms(pes):
+            if isinstance(term, HarmonicOscillator):
+                harmonic.append((sign, term))
+            elif isinstance(term, Gaussian):
+                gaussian.append((sign, term))
+            elif isinstance(term, OuterWalls):
+                walls.append((sign, term))
+            elif isinstance(term, LinearSlope):
+                self._slope = self._slope + sign * np.asarray(term.m)
+                self._offset += sign * term.c
+            else:
+                other.append((sign, term))
+
+        self._other = other
+        centered = harmonic + gaussian + walls
+        if centered:
+            centers = np.array([term.x0 for (_, term) in centered],
+                               dtype=float)
+            self._centers, center_idx = np.unique(centers, axis=0,
+                                                  return_inverse=True)
+            center_idx = np.ravel(center_idx)
+        else:
+            self._centers = None
+            center_idx = np.array([], dtype=int)
+
+        n_h, n_g = len(harmonic), len(gaussian)
+        self._h_idx = center_idx[:n_h]
+        self._h_k = np.array([sign * term.A * term.omega * term.omega
+                              for (sign, term) in harmonic])
+        self._g_idx = center_idx[n_h:n_h + n_g]
+        self._g_A = np.array([sign * term.A for (sign, term) in gaussian])
+        self._g_alpha = np.array([term.alpha for (_, term) in gaussian])
+        self._w_idx = center_idx[n_h + n_g:]
+        self._w_sigma = np.array([sign * term.sigma
+                                  for (sign, term) in walls])
+
+    def __repr__(self):  # pragma: no cover
+        return "FlattenedPES({o.pes})".format(o=self)
+
+    @staticmethod
+    def _signed_terms(pes, sign=1.0):
+        """List of (sign, term) for the leaves of a PES tree"""
+        if isinstance(pes, FlattenedPES):
+            return FlattenedPES._signed_terms(pes.pes, sign)
+        elif isinstance(pes, PES_Add):
+            return (FlattenedPES._signed_terms(pes.pes1, sign)
+                    + FlattenedPES._signed_terms(pes.pes2, sign))
+        elif isinstance(pes, PES_Sub):
+            return (FlattenedPES._signed_terms(pes.pes1, sign)
+                    + FlattenedPES._signed_terms(pes.pes2, -sign))
+        else:
+            return [(sign, pes)]
+
+    def V_and_dVdx(self, sys):
+        """Potential energy and its derivative, from one shared pass
+
+        Parameters
+        ----------
+        sys : :class:`.ToyEngine`
+            engine contains its state, including velocities and masses
+
+        Returns
+        -------
+        V : float or np.array
+            the potential energy
+        dVdx : np.array
+            the derivatives of the potential at this point
+        """
+        return self._evaluate(sys, energy=True, derivative=True)
+
+    def V(self, sys):
+        """Potential energy
+
+        Parameters
+        ----------
+        sys : :class:`.ToyEngine`
+            engine contains its state, including velocities and masses
+
+        Returns
+        -------
+        float
+            the potential energy
+        """
+        return self._evaluate(sys, energy=True, derivative=False)[0]
+
+    def dVdx(self, sys):
+        """Derivative of potential energy (-force)
+
+        Parameters
+        ----------
+        sys : :class:`.ToyEngine`
+            engine contains its state, including velocities and masses
+
+        Returns
+        -------
+        np.array
+            the derivatives of the potential at this point
+        """
+        return self._evaluate(sys, energy=False, derivative=True)[1]
+
+    def _evaluate(self, sys, energy, derivative):
+        x = np.asarray(sys.positions, dtype=float)
+        V = np.zeros(x.shape[:-1])
+        dVdx = np.zeros(x.shape)
+
+        if self._centers is not None:
+            dx = x[..., np.newaxis, :] - self._centers
+
+            if len(self._h_idx):
+                k = self._h_k * sys.mass
+                dx_h = dx[..., self._h_idx, :]
+                if energy:
+                    V += 0.5 * np.einsum('td,...td->...', k, dx_h * dx_h)
+                if derivative:
+                    dVdx += np.einsum('td,...td->...d', k, dx_h)
+
+            if len(self._g_idx):
+                dx_g = dx[..., self._g_idx, :]
+                exp_part = self._g_A * np.exp(
+                    -np.einsum('td,...td->...t', self._g_alpha, dx_g * dx_g)
+                )
+                if energy:
+                    V += exp_part.sum(axis=-1)
+                if derivative:
+                    dVdx -= 2.0 * np.einsum('td,...td,...t->...d',
+                                            self._g_alpha, dx_g, exp_part)
+
+            if len(self._w_idx):
+                dx_w = dx[..., self._w_idx, :]
+                dx5_w = dx_w**5
+                if energy:
+                    V += np.einsum('td,...td->...', self._w_sigma,
+                                   dx5_w * dx_w)
+                if derivative:
+                    dVdx += 6.0 * np.einsum('td,...td->...d', self._w_sigma,
+                                            dx5_w)
+
+        if energy:
+            V += np.dot(x, np.broadcast_to(self._slope, x.shape[-1:]))
+            V += self._offset
+        if derivative:
+            dVdx += self._slope
+
+        for (sign, term) in self._other:
+            if energy:
+                V += sign * term.V(sys)
+            if derivative:
+                dVdx += sign * term.dVdx(sys)
+
+        return V[()], dVdx
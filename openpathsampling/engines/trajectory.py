@@ -352,24 +352,22 @@ class Trajectory(list, StorableObject):
         list of tuple
             format is (label, number_of_frames)
         """
+        labels = list(label_dict.keys())
+        in_volume = np.zeros((len(labels), len(self)), dtype=bool)
+        for (i, label) in enumerate(labels):
+            in_volume[i] = label_dict[label].mask(self)
+        if np.any(in_volume.sum(axis=0) > 1):
+            raise RuntimeError(
+                "Volumes given to summarize_by_volumes not disjoint")
+        frame_labels = [None] * len(self)
+        for (i, label) in enumerate(labels):
+            for frame in np.flatnonzero(in_volume[i]):
+                frame_labels[frame] = label
+
         last_vol = None
         count = 0
         segment_labels = []
-        # list.__iter__ for speed
-        for frame in list.__iter__(self):
-            in_state = []
-            for key in label_dict.keys():
-                vol = label_dict[key]
-                if vol(frame):
-                    in_state.append(key)
-            if len(in_state) > 1:
-                raise RuntimeError(
-                    "Volumes given to summarize_by_volumes not disjoint")
-            if len(in_state) == 0:
-                current_vol = None
-            else:
-                current_vol = in_state[0]
-
+        for current_vol in frame_labels:
             if last_vol == current_vol:
                 count += 1
             else:
@@ -594,3 +592,227 @@ class Trajectory(list, StorableObject):
             return paths.Trajectory([trajectories])
 
         return trajectories
+
+
+def _join_views(first, second):
+    """Join two arrays without copying, if possible.
+
+    This is possible if ``second`` starts in memory where ``first`` ends,
+    e.g., for ``a[:5]`` and ``a[5:]``. Returns None otherwise.
+    """
+    if (first.base is None or first.base is not second.base
+            or first.dtype != second.dtype
+            or first.shape[1:] != second.shape[1:]
+            or first.strides != second.strides
+            or len(first) == 0 or len(second) == 0):
+        return None
+    end = first.__array_interface__['data'][0] + len(first) * first.strides[0]
+    if end != second.__array_interface__['data'][0]:
+        return None
+    return np.lib.stride_tricks.as_strided(
+        first, shape=(len(first) + len(second),) + first.shape[1:],
+        strides=first.strides, writeable=False
+    )
+
+
+class ArrayTrajectory(Trajectory):
+    """
+    Trajectory that keeps the arrays of its snapshots in contiguous buffers.
+
+    The coordinates, velocities, and box vectors of all frames are kept in
+    arrays with the frame as first index, e.g., ``(n_frames, n_atoms,
+    n_spatial)`` for coordinates. Accessing ``trajectory.coordinates`` (or
+    ``xyz``, ``velocities``, ``box_vectors``) returns the buffer instead of
+    stacking the arrays of all snapshots. Slicing and reversal give views of
+    the buffers (reversal negates the velocities), and concatenation joins
+    the buffers with a single copy, or none if they are adjacent views.
+
+    Snapshots created by :meth:`.from_arrays` are views as well: their
+    arrays are rows of the buffers. An :class:`.ArrayTrajectory` made from
+    existing snapshots gathers their arrays once, when the buffers are first
+    needed.
+
+    Only features that are plain numpy arrays (no units) are buffered;
+    everything else falls back to the behavior of :class:`.Trajectory`.
+    Buffers should be treated as read-only, just like snapshots. Changing
+    the list of snapshots (``append``, ``extend``, etc.) discards the
+    buffers, which are gathered again when needed.
+    """
+
+    buffered_features = ['coordinates', 'velocities', 'box_vectors']
+
+    def __init__(self, trajectory=None):
+        self._buffers = None
+        super(ArrayTrajectory, self).__init__(trajectory)
+        if isinstance(trajectory, ArrayTrajectory) \
+                and len(trajectory) == len(self):
+            self._buffers = trajectory._buffers
+
+    @classmethod
+    def from_arrays(cls, template, coordinates, velocities=None,
+                    box_vectors=None):
+        """Create a trajectory (and its snapshots) from arrays.
+
+        Parameters
+        ----------
+        template : :class:`.BaseSnapshot`
+            snapshot with the features that are not given as arrays (e.g.,
+            the engine); the snapshots are copies of it
+        coordinates : np.array (n_frames, n_atoms, n_spatial)
+            coordinates of each frame
+        velocities : np.array (n_frames, n_atoms, n_spatial) or None
+            velocities of each frame; if None, the template's are used
+        box_vectors : np.array (n_frames, 3, 3) or None
+            box vectors of each frame; if None, the template's are used
+
+        Returns
+        -------
+        :class:`.ArrayTrajectory`
+        """
+        arrays = {name: np.asarray(value) for (name, value) in [
+            ('coordinates', coordinates),
+            ('velocities', velocities),
+            ('box_vectors', box_vectors)
+        ] if value is not None}
+        snapshots = [
+            template.copy_with_replacement(
+                **{name: value[frame] for (name, value) in arrays.items()}
+            )
+            for frame in range(len(arrays['coordinates']))
+        ]
+        return cls._from_buffers(snapshots, arrays)
+
+    @classmethod
+    def _from_buffers(cls, snapshots, buffers):
+        traj = cls()
+        list.extend(traj, snapshots)
+        traj._buffers = buffers
+        return traj
+
+    @property
+    def buffers(self):
+        """
+        dict : feature name to array with the values of all frames
+        """
+        if self._buffers is None:
+            self._buffers = self._gather_buffers()
+        return self._buffers
+
+    def _gather_buffers(self):
+        buffers = {}
+        if len(self) == 0:
+            return buffers
+        snapshots = list(self)
+        for name in self.buffered_features:
+            value = getattr(snapshots[0], name, None)
+            if isinstance(value, np.ndarray):
+                buffers[name] = np.array([getattr(snap, name)
+                                          for snap in snapshots])
+        return buffers
+
+    def __getattr__(self, item):
+        if item == 'xyz' or item in self.buffered_features:
+            name = 'coordinates' if item == 'xyz' else item
+            buffers = self.buffers
+            if name in buffers:
+                return buffers[name]
+        return super(ArrayTrajectory, self).__getattr__(item)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            proxies = list.__getitem__(self, index)
+        elif hasattr(index, '__iter__'):
+            index = list(index)
+            proxies = [list.__getitem__(self, i) for i in index]
+        else:
+            return super(ArrayTrajectory, self).__getitem__(index)
+
+        buffers = None
+        if self._buffers is not None:
+            buffers = {name: value[index]
+                       for (name, value) in self._buffers.items()}
+        return ArrayTrajectory._from_buffers(proxies, buffers)
+
+    def __getslice__(self, i, j):
+        return self.__getitem__(slice(i, j))
+
+    @property
+    def reversed(self):
+        snapshots = [snap for snap in reversed(self)]
+        buffers = None
+        if self._buffers is not None and len(self) > 0:
+            minus = self[0].__features__.minus
+            buffers = {}
+            for (name, value) in self._buffers.items():
+                value = value[::-1]
+                buffers[name] = -value if name in minus else value
+        return ArrayTrajectory._from_buffers(snapshots, buffers)
+
+    def __add__(self, other):
+        buffers = None
+        if (isinstance(other, ArrayTrajectory)
+                and self._buffers is not None
+                and other._buffers is not None
+                and set(self._buffers) == set(other._buffers)):
+            buffers = {}
+            for (name, value) in self._buffers.items():
+                joined = _join_views(value, other._buffers[name])
+                if joined is None:
+                    joined = np.concatenate([value, other._buffers[name]])
+                buffers[name] = joined
+        if isinstance(other, Trajectory):
+            other = other.as_proxies()
+        return ArrayTrajectory._from_buffers(self.as_proxies() + list(other),
+                                             buffers)
+
+    # any change to the list of snapshots invalidates the buffers
+
+    def _invalidate(self):
+        self._buffers = None
+
+    def __setitem__(self, index, value):
+        # replacing a snapshot by its proxy (as storage does) keeps buffers
+        if not (type(value) is LoaderProxy and isinstance(index, int)
+                and list.__getitem__(self, index).__uuid__ == value.__uuid__):
+            self._invalidate()
+        list.__setitem__(self, index, value)
+
+    def __delitem__(self, index):
+        self._invalidate()
+        list.__delitem__(self, index)
+
+    def __iadd__(self, other):
+        self.extend(other)
+        return self
+
+    def __imul__(self, n):
+        self._invalidate()
+        return list.__imul__(self, n)
+
+    def extend(self, iterable):
+        self._invalidate()
+        super(ArrayTrajectory, self).extend(iterable)
+
+    def append(self, snapshot):
+        self._invalidate()
+        list.append(self, snapshot)
+
+    def insert(self, index, snapshot):
+        self._invalidate()
+        list.insert(self, index, snapshot)
+
+    def pop(self, index=-1):
+        self._invalidate()
+        return list.pop(self, index)
+
+    def remove(self, snapshot):
+        self._invalidate()
+        list.remove(self, snapshot)
+
+    def reverse(self):
+        self._invalidate()
+        list.reverse(self)
+
+    def sort(self, *args, **kwargs):
+        self._invalidate()
+        list.sort(self, *args, **kwargs)
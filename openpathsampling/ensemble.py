@@ -192,6 +192,195 @@ class EnsembleCache(object):
         return reset
 
 
+# Frame automata are incremental versions of simple ensembles, used for
+# the streaming evaluation of a SequentialEnsemble. Each one describes a
+# subtrajectory that grows by one frame at a time: `can_extend` gives the
+# result of `can_append` (for these ensembles, also of `can_prepend`) and
+# `accepts` the result of `__call__` for the frames seen so far.
+class _AllInXAutomaton(object):
+    __slots__ = ['volume', 'length', 'all_in']
+
+    def __init__(self, volume):
+        self.volume = volume
+        self.length = 0
+        self.all_in = True
+
+    def append(self, frame):
+        self.length += 1
+        if self.all_in:
+            self.all_in = bool(self.volume(frame))
+
+    def can_extend(self):
+        return self.all_in
+
+    def accepts(self):
+        return self.length > 0 and self.all_in
+
+
+class _PartInXAutomaton(object):
+    __slots__ = ['volume', 'found']
+
+    def __init__(self, volume):
+        self.volume = volume
+        self.found = False
+
+    def append(self, frame):
+        if not self.found:
+            self.found = bool(self.volume(frame))
+
+    def can_extend(self):
+        return True
+
+    def accepts(self):
+        return self.found
+
+
+class _LengthAutomaton(object):
+    __slots__ = ['ensemble', 'length']
+
+    def __init__(self, ensemble):
+        self.ensemble = ensemble
+        self.length = 0
+
+    def append(self, frame):
+        self.length += 1
+
+    def can_extend(self):
+        return self.ensemble._can_append_length(self.length)
+
+    def accepts(self):
+        return self.ensemble._allows_length(self.length)
+
+
+class _CombinationAutomaton(object):
+    __slots__ = ['fnc', 'automaton1', 'automaton2']
+
+    def __init__(self, fnc, automaton1, automaton2):
+        self.fnc = fnc
+        self.automaton1 = automaton1
+        self.automaton2 = automaton2
+
+    def append(self, frame):
+        self.automaton1.append(frame)
+        self.automaton2.append(frame)
+
+    def can_extend(self):
+        return self.fnc(self.automaton1.can_extend(),
+                        self.automaton2.can_extend())
+
+    def accepts(self):
+        return self.fnc(self.automaton1.accepts(),
+                        self.automaton2.accepts())
+
+
+def _extend_segment(automaton, get_frame, final, n_frames):
+    """Feed frames to ``automaton`` while the subtrajectory can grow.
+
+    This is the loop of :meth:`.SequentialEnsemble._find_subtraj_final`:
+    returns the index of the first frame that can't be added (or
+    ``n_frames``). Frames before ``final`` must already be in the
+    automaton.
+    """
+    while final < n_frames:
+        automaton.append(get_frame(final))
+        if not (automaton.can_extend() or automaton.accepts()):
+            break
+        final += 1
+    return final
+
+
+class _SequentialStream(object):
+    """Resumable assignment of frames to the subensembles of a sequence.
+
+    This follows the decision tree of
+    :meth:`.SequentialEnsemble._generic_can_append`, but the frames are fed
+    to frame automata of the subensembles one at a time, and the state is
+    kept between calls. Only the last subtrajectory can change when frames
+    are added, so each new frame costs a constant amount of work (apart
+    from the rare restart with a later first ensemble).
+
+    Frames are numbered in the order they are processed; for the backward
+    direction, the ensembles are given in reverse order and frame 0 is the
+    last frame of the trajectory.
+
+    Parameters
+    ----------
+    ensembles : list of :class:`.Ensemble`
+        the subensembles, in processing order; all must have frame automata
+    strict : bool
+        whether this is for `strict_can_append`/`strict_can_prepend`
+    """
+    def __init__(self, ensembles, strict):
+        self.ensembles = ensembles
+        self.strict = strict
+        self.final_ens = len(ensembles) - 1
+        self.allows_empty = [ens._frame_automaton().accepts()
+                             for ens in ensembles]
+        self.ens_first = 0
+        self.failed = False
+        self._start_segment(0, 0)
+
+    def _start_segment(self, ens_num, first):
+        self.ens_num = ens_num
+        self.first = first
+        self.final = first
+        self.automaton = self.ensembles[ens_num]._frame_automaton()
+
+    def advance(self, get_frame, n_frames):
+        """Process the frames up to ``n_frames``.
+
+        Parameters
+        ----------
+        get_frame : callable
+            takes the frame number (in processing order), returns the frame
+        n_frames : int
+            total number of frames in the trajectory
+
+        Returns
+        -------
+        bool :
+            the result of `can_append` (or `can_prepend`)
+        """
+        while not self.failed:
+            self.final = _extend_segment(self.automaton, get_frame,
+                                         self.final, n_frames)
+            if self.final > self.first:
+                if self.ens_num == self.final_ens:
+                    if self.final == n_frames:
+                        return self.automaton.can_extend()
+                    # last ensemble ends before the end of the trajectory
+                    self.failed = True
+                elif self.final == n_frames:
+                    # the next ensemble starts after the current frames
+                    return True
+                else:
+                    self._start_segment(self.ens_num + 1, self.final)
+            elif self.final == n_frames:
+                return True
+            elif (self.allows_empty[self.ens_num]
+                  and self.ens_num < self.final_ens):
+                self._start_segment(self.ens_num + 1, self.final)
+            elif self.ens_first == self.final_ens or self.strict:
+                self.failed = True
+            else:
+                # start over with sequences that begin with the next ensemble
+                self.ens_first += 1
+                self._start_segment(self.ens_first, 0)
+        return False
+
+    def position(self, n_frames):
+        """Current ensemble and its first frame, as in the cache contents.
+
+        If the last subtrajectory covers the final frame but can't be
+        extended, the next frame belongs to the next ensemble.
+        """
+        if (self.final == n_frames and self.final > self.first
+                and self.ens_num < self.final_ens
+                and not self.automaton.can_extend()):
+            return (self.ens_num + 1, self.final)
+        return (self.ens_num, self.first)
+
+
 class Ensemble(with_metaclass(abc.ABCMeta, StorableNamedObject)):
     """
     Path ensemble object.
@@ -371,6 +560,17 @@ class Ensemble(with_metaclass(abc.ABCMeta, StorableNamedObject)):
         # default behavior is to be the same as can_prepend
         return self.can_prepend(trajectory, trusted)
 
+    def _frame_automaton(self):
+        """Incremental version of this ensemble, for sequential ensembles.
+
+        Returns
+        -------
+        object or None
+            a new frame automaton for the empty trajectory, or None if this
+            ensemble can't be evaluated one frame at a time
+        """
+        return None
+
     def iter_valid_slices(
             self,
             trajectory,
@@ -1379,6 +1579,13 @@ class EnsembleCombination(Ensemble):
             fname="strict_can_prepend"
         )
 
+    def _frame_automaton(self):
+        automaton1 = self.ensemble1._frame_automaton()
+        automaton2 = self.ensemble2._frame_automaton()
+        if automaton1 is None or automaton2 is None:
+            return None
+        return _CombinationAutomaton(self.fnc, automaton1, automaton2)
+
     def _str(self):
         # print self.sfnc, self.ensemble1, self.ensemble2,
         # print self.sfnc.format(
@@ -1482,6 +1689,12 @@ class SequentialEnsemble(Ensemble):
         self._cache_strict_can_prepend = EnsembleCache(-1)
         self._cache_check_reverse = EnsembleCache(-1)
 
+        # if all subensembles can be evaluated frame by frame, can_append
+        # and can_prepend keep their state between calls (stored in the
+        # caches) and only process new frames; this can be turned off
+        self._use_streaming = all(ens._frame_automaton() is not None
+                                  for ens in self.ensembles)
+
         # sanity checks
         if len(self.min_overlap) != len(self.max_overlap):
             raise ValueError("len(min_overlap) != len(max_overlap)")
@@ -1543,6 +1756,8 @@ class SequentialEnsemble(Ensemble):
         # version of the can_append decision tree; see that for detailed
         # comments
         # self._check_cache(trajectory, function="call")
+        if self._use_streaming:
+            return self._streaming_transition_frames(trajectory)
 
         ens_num = 0
         subtraj_first = 0
@@ -1580,6 +1795,27 @@ class SequentialEnsemble(Ensemble):
                 else:
                     return transitions
 
+    def _streaming_transition_frames(self, trajectory):
+        # same as transition_frames, but with frame automata
+        get_frame = trajectory.get_as_proxy
+        traj_final = len(trajectory)
+        final_ens = len(self.ensembles) - 1
+        transitions = []
+        subtraj_first = 0
+        for ens_num in range(final_ens + 1):
+            automaton = self.ensembles[ens_num]._frame_automaton()
+            allows_empty = automaton.accepts()
+            subtraj_final = _extend_segment(automaton, get_frame,
+                                            subtraj_first, traj_final)
+            if subtraj_final - subtraj_first > 0:
+                transitions.append(subtraj_final)
+                subtraj_first = subtraj_final
+            elif allows_empty:
+                transitions.append(subtraj_final)
+            else:
+                break
+        return transitions
+
     def __call__(self, trajectory, trusted=None, candidate=False):
         logger.debug("Looking for transitions in trajectory " + str(trajectory))
         transitions = self.transition_frames(trajectory, trusted)
@@ -1855,10 +2091,68 @@ class SequentialEnsemble(Ensemble):
                         )
                         return False
 
+    def _streaming_can_extend(self, trajectory, strict, direction):
+        """can_append/can_prepend using the frame automata.
+
+        The :class:`._SequentialStream` is kept in the cache, so that a
+        trajectory that grew by one frame since the last call only needs
+        that frame to be processed. The usual cache contents (`ens_num`,
+        `ens_from`, `subtraj_from`) are kept up to date as well.
+        """
+        final_ens = len(self.ensembles) - 1
+        if direction > 0:
+            if strict:
+                cache = self._cache_strict_can_append
+            else:
+                cache = self._cache_can_append
+            ensembles = self.ensembles
+            get_frame = trajectory.get_as_proxy
+        else:
+            if strict:
+                cache = self._cache_strict_can_prepend
+            else:
+                cache = self._cache_can_prepend
+            ensembles = list(reversed(self.ensembles))
+
+            def get_frame(frame_num):
+                return trajectory.get_as_proxy(-1 - frame_num)
+
+        traj_final = len(trajectory)
+        use_cache = self._use_cache and traj_final > 0
+        stream = None
+        if use_cache:
+            cache.check(trajectory)
+            stream = cache.contents.get('stream')
+        if stream is None:
+            stream = _SequentialStream(ensembles, strict)
+            if use_cache:
+                cache.contents['stream'] = stream
+
+        result = stream.advance(get_frame, traj_final)
+
+        if use_cache:
+            (ens_num, subtraj_from) = stream.position(traj_final)
+            if direction > 0:
+                self.update_cache(cache, ens_num, stream.ens_first,
+                                  subtraj_from)
+            else:
+                # backward caches count ensembles from the end, and frames
+                # as (negative) offsets from the end of the trajectory
+                self.update_cache(cache, final_ens - ens_num,
+                                  final_ens - stream.ens_first,
+                                  -subtraj_from if subtraj_from else None)
+        return result
+
     def can_append(self, trajectory, trusted=False):
+        if self._use_streaming:
+            return self._streaming_can_extend(trajectory, strict=False,
+                                              direction=+1)
         return self._generic_can_append(trajectory, trusted, strict=False)
 
     def strict_can_append(self, trajectory, trusted=False):
+        if self._use_streaming:
+            return self._streaming_can_extend(trajectory, strict=True,
+                                              direction=+1)
         return self._generic_can_append(trajectory, trusted, strict=True)
 
     def _generic_can_prepend(self, trajectory, trusted, strict):
@@ -2026,9 +2320,15 @@ class SequentialEnsemble(Ensemble):
                         return False
 
     def can_prepend(self, trajectory, trusted=False):
+        if self._use_streaming:
+            return self._streaming_can_extend(trajectory, strict=False,
+                                              direction=-1)
         return self._generic_can_prepend(trajectory, trusted, strict=False)
 
     def strict_can_prepend(self, trajectory, trusted=False):
+        if self._use_streaming:
+            return self._streaming_can_extend(trajectory, strict=True,
+                                              direction=-1)
         return self._generic_can_prepend(trajectory, trusted, strict=True)
 
     def _str(self):
@@ -2058,28 +2358,37 @@ class LengthEnsemble(Ensemble):
         super(LengthEnsemble, self).__init__()
         self.length = length
 
-    def __call__(self, trajectory, trusted=None, candidate=False):
-        length = len(trajectory)
+    def _allows_length(self, length):
         if type(self.length) is int:
             return length == self.length
         else:
             return length >= self.length.start and (
                 self.length.stop is None or length < self.length.stop)
 
+    def _can_append_length(self, length):
+        if type(self.length) is int:
+            return length < self.length
+        else:
+            return self.length.stop is None or length < self.length.stop - 1
+
+    def __call__(self, trajectory, trusted=None, candidate=False):
+        return self._allows_length(len(trajectory))
+
     def can_append(self, trajectory, trusted=False):
         length = len(trajectory)
+        return_value = self._can_append_length(length)
         if type(self.length) is int:
-            return_value = (length < self.length)
             logger.debug("LengthEnsemble.can_append: Segment length " +
                          str(length) + " < " + str(self.length) + " : " +
                          str(return_value))
-            return return_value
-        else:
-            return self.length.stop is None or length < self.length.stop - 1
+        return return_value
 
     def can_prepend(self, trajectory, trusted=False):
         return self.can_append(trajectory)
 
+    def _frame_automaton(self):
+        return _LengthAutomaton(self)
+
     def _str(self):
         if type(self.length) is int:
             return 'len(x) = {0}'.format(self.length)
@@ -2228,6 +2537,9 @@ class AllInXEnsemble(VolumeEnsemble):
             # print "Rev UnTrusted"
             return self(trajectory)  # in this case, order wouldn't matter
 
+    def _frame_automaton(self):
+        return _AllInXAutomaton(self._volume)
+
     def __invert__(self):
         return PartOutXEnsemble(self.volume, self.trusted)
 
@@ -2276,6 +2588,9 @@ class PartInXEnsemble(VolumeEnsemble):
     def __invert__(self):
         return AllOutXEnsemble(self.volume, self.trusted)
 
+    def _frame_automaton(self):
+        return _PartInXAutomaton(self._volume)
+
 
 class PartOutXEnsemble(PartInXEnsemble):
     """
@@ -2346,6 +2661,28 @@ class WrappedEnsemble(Ensemble):
         return self._new_ensemble.strict_can_prepend(self._alter(trajectory),
                                                      trusted)
 
+    def _unaltered_ensemble(self):
+        """The wrapped ensemble, if this wrapper doesn't change its results.
+
+        Returns
+        -------
+        :class:`.Ensemble` or None
+            `_new_ensemble` if neither the trajectory nor any of the checks
+            are changed by a subclass; None otherwise
+        """
+        cls = type(self)
+        for name in ['_alter', '__call__', 'can_append', 'can_prepend',
+                     'strict_can_append', 'strict_can_prepend']:
+            if getattr(cls, name) is not getattr(WrappedEnsemble, name):
+                return None
+        return self._new_ensemble
+
+    def _frame_automaton(self):
+        ensemble = self._unaltered_ensemble()
+        if ensemble is None:
+            return None
+        return ensemble._frame_automaton()
+
     def _str(self):
         return str(self._new_ensemble)
 
@@ -2867,6 +3204,10 @@ class TISEnsemble(WrappedEnsemble):
             # it still works fine if we use the slower algorithm
             return super(TISEnsemble, self).__call__(trajectory, trusted)
 
+    def _unaltered_ensemble(self):
+        # __call__ only differs for candidate trajectories
+        return self._new_ensemble
+
     def trajectory_summary(self, trajectory):
         initial_state_i = None
         final_state_i = None
@@ -1 +1,2 @@
 from .visit_all_states import VisitAllStatesEnsemble
+from .compiled import CompiledEnsemble, compile_ensemble
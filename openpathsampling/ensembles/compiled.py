@@ -0,0 +1,707 @@
+"""
+Compile ensembles into plans that check trajectories with array operations.
+
+Ensembles built with ``&``, ``|``, and ``~`` are normally evaluated by
+recursing through the ensemble objects, and each volume ensemble calls its
+volume on every frame. When many trajectories are checked against the same
+ensembles (e.g., when analyzing stored TIS simulations), most of that time
+is overhead. :func:`.compile_ensemble` turns the ensemble tree into a plan:
+
+* each distinct (leaf) volume is evaluated once per trajectory with
+  :meth:`.Volume.mask`, giving a boolean array for all frames; combinations
+  of volumes become array operations on these
+* volume ensembles become range queries on the cumulative sums of these
+  arrays, so that checking any subtrajectory takes constant time
+* sequential ensembles find their subtrajectories with array operations
+
+Ensembles that can't be compiled (e.g., those that alter the trajectory) are
+called as usual on the (sub)trajectory, so any ensemble can be compiled.
+"""
+import numpy as np
+
+from openpathsampling.ensemble import (
+    EmptyEnsemble, FullEnsemble, NegatedEnsemble,
+    EnsembleCombination, IntersectionEnsemble, UnionEnsemble,
+    SequentialEnsemble, LengthEnsemble, AllInXEnsemble, AllOutXEnsemble,
+    PartInXEnsemble, PartOutXEnsemble, WrappedEnsemble
+)
+from openpathsampling.volume import (
+    EmptyVolume, FullVolume, NegatedVolume, UnionVolume, IntersectionVolume,
+    SymmetricDifferenceVolume, RelativeComplementVolume
+)
+
+
+class _Evaluation(object):
+    """Per-trajectory state of a plan: volume masks and their cumsums"""
+    def __init__(self, trajectory):
+        self.trajectory = trajectory
+        self.n_frames = len(trajectory)
+        self._masks = {}
+        self._counts = {}
+
+    def mask(self, volume_node):
+        try:
+            return self._masks[volume_node]
+        except KeyError:
+            mask = volume_node.evaluate(self)
+            self._masks[volume_node] = mask
+            return mask
+
+    def counts(self, volume_node):
+        """counts[i] is the number of frames before frame i in the volume"""
+        try:
+            return self._counts[volume_node]
+        except KeyError:
+            counts = np.zeros(self.n_frames + 1, dtype=int)
+            np.cumsum(self.mask(volume_node), out=counts[1:])
+            self._counts[volume_node] = counts
+            return counts
+
+    def subtrajectory(self, start, end):
+        if start == 0 and end == self.n_frames:
+            return self.trajectory
+        return self.trajectory[start:end]
+
+
+# VOLUMES ################################################################
+
+class _VolumeLeaf(object):
+    def __init__(self, volume):
+        self.volume = volume
+
+    def evaluate(self, evaluation):
+        return self.volume.mask(evaluation.trajectory)
+
+
+class _VolumeConstant(object):
+    def __init__(self, value):
+        self.value = value
+
+    def evaluate(self, evaluation):
+        return np.full(evaluation.n_frames, self.value, dtype=bool)
+
+
+class _VolumeNegation(object):
+    def __init__(self, node):
+        self.node = node
+
+    def evaluate(self, evaluation):
+        return ~evaluation.mask(self.node)
+
+
+class _VolumeOperation(object):
+    def __init__(self, operation, node1, node2):
+        self.operation = operation
+        self.node1 = node1
+        self.node2 = node2
+
+    def evaluate(self, evaluation):
+        return self.operation(evaluation.mask(self.node1),
+                              evaluation.mask(self.node2))
+
+
+_VOLUME_OPERATIONS = {
+    UnionVolume: np.logical_or,
+    IntersectionVolume: np.logical_and,
+    SymmetricDifferenceVolume: np.logical_xor,
+    RelativeComplementVolume: lambda a, b: a & ~b,
+}
+
+
+# ENSEMBLES ##############################################################
+# Each node answers the ensemble's questions for the subtrajectory
+# trajectory[start:end]. The *_extents methods answer them for all
+# subtrajectories that share one end (``fixed``) and grow up to ``bound``,
+# as an array: for direction +1 these are trajectory[fixed:k] with
+# fixed < k <= bound, for direction -1 trajectory[k:fixed] with
+# fixed > k >= bound (in that order). Extending uses can_append (+1) or
+# can_prepend (-1).
+
+def _extent_ranges(fixed, bound, direction):
+    if direction > 0:
+        return [(fixed, k) for k in range(fixed + 1, bound + 1)]
+    else:
+        return [(k, fixed) for k in range(fixed - 1, bound - 1, -1)]
+
+
+def _extent_mask(evaluation, volume_node, fixed, bound, direction):
+    if direction > 0:
+        return evaluation.mask(volume_node)[fixed:bound]
+    else:
+        return evaluation.mask(volume_node)[bound:fixed][::-1]
+
+
+class _Node(object):
+    def call(self, evaluation, start, end):
+        raise NotImplementedError
+
+    def can_append(self, evaluation, start, end):
+        raise NotImplementedError
+
+    def can_prepend(self, evaluation, start, end):
+        return self.can_append(evaluation, start, end)
+
+    def strict_can_append(self, evaluation, start, end):
+        return self.can_append(evaluation, start, end)
+
+    def strict_can_prepend(self, evaluation, start, end):
+        return self.can_prepend(evaluation, start, end)
+
+    def call_extents(self, evaluation, fixed, bound, direction):
+        return np.array([self.call(evaluation, start, end)
+                         for (start, end) in _extent_ranges(fixed, bound,
+                                                            direction)],
+                        dtype=bool)
+
+    def can_extend_extents(self, evaluation, fixed, bound, direction):
+        can_extend = self.can_append if direction > 0 else self.can_prepend
+        return np.array([can_extend(evaluation, start, end)
+                         for (start, end) in _extent_ranges(fixed, bound,
+                                                            direction)],
+                        dtype=bool)
+
+
+class _EnsembleNode(_Node):
+    """Fallback: call the ensemble itself on the subtrajectory"""
+    def __init__(self, ensemble):
+        self.ensemble = ensemble
+
+    def call(self, evaluation, start, end):
+        return self.ensemble(evaluation.subtrajectory(start, end))
+
+    def can_append(self, evaluation, start, end):
+        return self.ensemble.can_append(
+            evaluation.subtrajectory(start, end))
+
+    def can_prepend(self, evaluation, start, end):
+        return self.ensemble.can_prepend(
+            evaluation.subtrajectory(start, end))
+
+    def strict_can_append(self, evaluation, start, end):
+        return self.ensemble.strict_can_append(
+            evaluation.subtrajectory(start, end))
+
+    def strict_can_prepend(self, evaluation, start, end):
+        return self.ensemble.strict_can_prepend(
+            evaluation.subtrajectory(start, end))
+
+
+class _ConstantNode(_Node):
+    """EmptyEnsemble (False) or FullEnsemble (True)"""
+    def __init__(self, value):
+        self.value = value
+
+    def call(self, evaluation, start, end):
+        return self.value
+
+    def can_append(self, evaluation, start, end):
+        return self.value
+
+    def call_extents(self, evaluation, fixed, bound, direction):
+        return np.full(abs(bound - fixed), self.value, dtype=bool)
+
+    can_extend_extents = call_extents
+
+
+class _LengthNode(_Node):
+    def __init__(self, ensemble):
+        self.ensemble = ensemble
+
+    def call(self, evaluation, start, end):
+        return self.ensemble._allows_length(end - start)
+
+    def can_append(self, evaluation, start, end):
+        return self.ensemble._can_append_length(end - start)
+
+    def call_extents(self, evaluation, fixed, bound, direction):
+        lengths = np.arange(1, abs(bound - fixed) + 1)
+        length = self.ensemble.length
+        if type(length) is int:
+            return lengths == length
+        result = lengths >= length.start
+        if length.stop is not None:
+            result &= lengths < length.stop
+        return result
+
+    def can_extend_extents(self, evaluation, fixed, bound, direction):
+        lengths = np.arange(1, abs(bound - fixed) + 1)
+        length = self.ensemble.length
+        if type(length) is int:
+            return lengths < length
+        elif length.stop is None:
+            return np.ones(len(lengths), dtype=bool)
+        else:
+            return lengths < length.stop - 1
+
+
+class _AllInNode(_Node):
+    """AllInXEnsemble (inside=True) or AllOutXEnsemble (inside=False)"""
+    def __init__(self, volume_node, inside):
+        self.volume_node = volume_node
+        self.inside = inside
+
+    def _all(self, evaluation, start, end):
+        counts = evaluation.counts(self.volume_node)
+        n_in = counts[end] - counts[start]
+        return n_in == (end - start if self.inside else 0)
+
+    def call(self, evaluation, start, end):
+        return end > start and self._all(evaluation, start, end)
+
+    def can_append(self, evaluation, start, end):
+        return end == start or self._all(evaluation, start, end)
+
+    def call_extents(self, evaluation, fixed, bound, direction):
+        mask = _extent_mask(evaluation, self.volume_node, fixed, bound,
+                            direction)
+        if not self.inside:
+            mask = ~mask
+        return np.logical_and.accumulate(mask)
+
+    can_extend_extents = call_extents
+
+
+class _PartInNode(_Node):
+    """PartInXEnsemble (inside=True) or PartOutXEnsemble (inside=False)"""
+    def __init__(self, volume_node, inside):
+        self.volume_node = volume_node
+        self.inside = inside
+
+    def call(self, evaluation, start, end):
+        counts = evaluation.counts(self.volume_node)
+        n_in = counts[end] - counts[start]
+        return n_in > 0 if self.inside else n_in < end - start
+
+    def can_append(self, evaluation, start, end):
+        return True
+
+    def call_extents(self, evaluation, fixed, bound, direction):
+        mask = _extent_mask(evaluation, self.volume_node, fixed, bound,
+                            direction)
+        if not self.inside:
+            mask = ~mask
+        return np.logical_or.accumulate(mask)
+
+    def can_extend_extents(self, evaluation, fixed, bound, direction):
+        return np.ones(abs(bound - fixed), dtype=bool)
+
+
+class _NegatedNode(_Node):
+    def __init__(self, node):
+        self.node = node
+
+    def call(self, evaluation, start, end):
+        return not self.node.call(evaluation, start, end)
+
+    def can_append(self, evaluation, start, end):
+        return True
+
+    def call_extents(self, evaluation, fixed, bound, direction):
+        return ~self.node.call_extents(evaluation, fixed, bound, direction)
+
+    def can_extend_extents(self, evaluation, fixed, bound, direction):
+        return np.ones(abs(bound - fixed), dtype=bool)
+
+
+class _CombinationNode(_Node):
+    """Combination of two nodes, with the same short-circuit logic as
+    :class:`.EnsembleCombination`"""
+    def __init__(self, fnc, node1, node2, operation=None):
+        self.fnc = fnc
+        self.node1 = node1
+        self.node2 = node2
+        self.operation = operation
+
+    def _combine(self, name, evaluation, start, end):
+        a = getattr(self.node1, name)(evaluation, start, end)
+        res_true = self.fnc(a, True)
+        if res_true == self.fnc(a, False):
+            return res_true
+        b = getattr(self.node2, name)(evaluation, start, end)
+        return self.fnc(a, b)
+
+    def call(self, evaluation, start, end):
+        return self._combine('call', evaluation, start, end)
+
+    def can_append(self, evaluation, start, end):
+        return self._combine('can_append', evaluation, start, end)
+
+    def can_prepend(self, evaluation, start, end):
+        return self._combine('can_prepend', evaluation, start, end)
+
+    def strict_can_append(self, evaluation, start, end):
+        return self._combine('strict_can_append', evaluation, start, end)
+
+    def strict_can_prepend(self, evaluation, start, end):
+        return self._combine('strict_can_prepend', evaluation, start, end)
+
+    def call_extents(self, evaluation, fixed, bound, direction):
+        if self.operation is None:
+            return super(_CombinationNode, self).call_extents(
+                evaluation, fixed, bound, direction)
+        return self.operation(
+            self.node1.call_extents(evaluation, fixed, bound, direction),
+            self.node2.call_extents(evaluation, fixed, bound, direction)
+        )
+
+    def can_extend_extents(self, evaluation, fixed, bound, direction):
+        if self.operation is None:
+            return super(_CombinationNode, self).can_extend_extents(
+                evaluation, fixed, bound, direction)
+        return self.operation(
+            self.node1.can_extend_extents(evaluation, fixed, bound,
+                                          direction),
+            self.node2.can_extend_extents(evaluation, fixed, bound,
+                                          direction)
+        )
+
+
+class _SequentialNode(_EnsembleNode):
+    """SequentialEnsemble, with the same decisions as its streaming
+    evaluation (see :class:`.SequentialEnsemble`)"""
+    def __init__(self, ensemble, nodes):
+        super(_SequentialNode, self).__init__(ensemble)
+        self.nodes = nodes
+
+    @staticmethod
+    def _subtraj_final(node, evaluation, fixed, bound, direction):
+        # same as SequentialEnsemble._find_subtraj_final: extend while the
+        # subtrajectory can be extended or is in the ensemble; returns the
+        # number of frames in the subtrajectory
+        if fixed == bound:
+            return 0
+        grows = (node.can_extend_extents(evaluation, fixed, bound, direction)
+                 | node.call_extents(evaluation, fixed, bound, direction))
+        stops = np.flatnonzero(~grows)
+        return stops[0] if len(stops) else abs(bound - fixed)
+
+    def transition_frames(self, evaluation, start, end):
+        transitions = []
+        subtraj_first = start
+        for node in self.nodes:
+            subtraj_final = subtraj_first + self._subtraj_final(
+                node, evaluation, subtraj_first, end, +1
+            )
+            if subtraj_final > subtraj_first:
+                transitions.append(subtraj_final)
+                subtraj_first = subtraj_final
+            elif node.call(evaluation, subtraj_first, subtraj_first):
+                transitions.append(subtraj_final)
+            else:
+                break
+        return transitions
+
+    def call(self, evaluation, start, end):
+        transitions = self.transition_frames(evaluation, start, end)
+        if len(transitions) != len(self.nodes) or transitions[-1] != end:
+            return False
+        subtraj_first = start
+        for (node, subtraj_final) in zip(self.nodes, transitions):
+            if not node.call(evaluation, subtraj_first, subtraj_final):
+                return False
+            subtraj_first = subtraj_final
+        return True
+
+    def _can_extend(self, evaluation, start, end, direction, strict):
+        """Decision tree of _SequentialStream.advance, on the whole range.
+
+        Positions count frames in processing order: from ``start`` for
+        direction +1, from ``end`` backwards for direction -1.
+        """
+        if direction > 0:
+            nodes = self.nodes
+            fixed = lambda pos: start + pos
+            frames = lambda first, final: (start + first, start + final)
+            bound = end
+            can_extend = 'can_append'
+        else:
+            nodes = self.nodes[::-1]
+            fixed = lambda pos: end - pos
+            frames = lambda first, final: (end - final, end - first)
+            bound = start
+            can_extend = 'can_prepend'
+        n_frames = end - start
+        final_ens = len(nodes) - 1
+        ens_first = ens_num = first = 0
+        while True:
+            node = nodes[ens_num]
+            final = first + self._subtraj_final(node, evaluation,
+                                                fixed(first), bound,
+                                                direction)
+            if final > first:
+                if ens_num == final_ens:
+                    return (final == n_frames
+                            and getattr(node, can_extend)(
+                                evaluation, *frames(first, final)
+                            ))
+                elif final == n_frames:
+                    return True
+                ens_num += 1
+                first = final
+            elif final == n_frames:
+                return True
+            elif (ens_num < final_ens
+                  and node.call(evaluation, *frames(first, first))):
+                ens_num += 1
+            elif ens_first == final_ens or strict:
+                return False
+            else:
+                ens_first += 1
+                ens_num = ens_first
+                first = 0
+
+    def _compiled(self, start, end):
+        # results for the empty trajectory and for sequences that are not
+        # evaluated with the streaming algorithm come from the ensemble
+        return end > start and self.ensemble._use_streaming
+
+    def can_append(self, evaluation, start, end):
+        if not self._compiled(start, end):
+            return super(_SequentialNode, self).can_append(evaluation,
+                                                           start, end)
+        return self._can_extend(evaluation, start, end, +1, False)
+
+    def can_prepend(self, evaluation, start, end):
+        if not self._compiled(start, end):
+            return super(_SequentialNode, self).can_prepend(evaluation,
+                                                            start, end)
+        return self._can_extend(evaluation, start, end, -1, False)
+
+    def strict_can_append(self, evaluation, start, end):
+        if not self._compiled(start, end):
+            return super(_SequentialNode, self).strict_can_append(
+                evaluation, start, end)
+        return self._can_extend(evaluation, start, end, +1, True)
+
+    def strict_can_prepend(self, evaluation, start, end):
+        if not self._compiled(start, end):
+            return super(_SequentialNode, self).strict_can_prepend(
+                evaluation, start, end)
+        return self._can_extend(evaluation, start, end, -1, True)
+
+
+_ALL_IN_ENSEMBLES = {AllInXEnsemble: True, AllOutXEnsemble: False}
+_PART_IN_ENSEMBLES = {PartInXEnsemble: True, PartOutXEnsemble: False}
+_ENSEMBLE_OPERATIONS = {IntersectionEnsemble: np.logical_and,
+                        UnionEnsemble: np.logical_or}
+
+
+class _Compiler(object):
+    """Builds the nodes of a plan, sharing nodes for repeated objects"""
+    def __init__(self):
+        self.volumes = []
+        self._volume_nodes = {}
+        self._nodes = {}
+
+    def volume_node(self, volume):
+        try:
+            return self._volume_nodes[id(volume)][1]
+        except KeyError:
+            pass
+        cls = type(volume)
+        if cls is EmptyVolume or cls is FullVolume:
+            node = _VolumeConstant(cls is FullVolume)
+        elif cls is NegatedVolume:
+            node = _VolumeNegation(self.volume_node(volume.volume))
+        elif cls in _VOLUME_OPERATIONS:
+            node = _VolumeOperation(_VOLUME_OPERATIONS[cls],
+                                    self.volume_node(volume.volume1),
+                                    self.volume_node(volume.volume2))
+        else:
+            node = _VolumeLeaf(volume)
+            self.volumes.append(volume)
+        # keep the volume, so that its id can't be reused
+        self._volume_nodes[id(volume)] = (volume, node)
+        return node
+
+    def node(self, ensemble):
+        try:
+            return self._nodes[id(ensemble)][1]
+        except KeyError:
+            pass
+        node = self._make_node(ensemble)
+        self._nodes[id(ensemble)] = (ensemble, node)
+        return node
+
+    def _make_node(self, ensemble):
+        cls = type(ensemble)
+        if cls in _ALL_IN_ENSEMBLES:
+            return _AllInNode(self.volume_node(ensemble.volume),
+                              _ALL_IN_ENSEMBLES[cls])
+        elif cls in _PART_IN_ENSEMBLES:
+            return _PartInNode(self.volume_node(ensemble.volume),
+                               _PART_IN_ENSEMBLES[cls])
+        elif cls is LengthEnsemble:
+            return _LengthNode(ensemble)
+        elif cls is EmptyEnsemble or cls is FullEnsemble:
+            return _ConstantNode(cls is FullEnsemble)
+        elif cls is NegatedEnsemble:
+            return _NegatedNode(self.node(ensemble.ensemble))
+        elif cls in _ENSEMBLE_OPERATIONS or cls is EnsembleCombination:
+            return _CombinationNode(ensemble.fnc,
+                                    self.node(ensemble.ensemble1),
+                                    self.node(ensemble.ensemble2),
+                                    _ENSEMBLE_OPERATIONS.get(cls))
+        elif cls is SequentialEnsemble:
+            return _SequentialNode(ensemble, [self.node(ens)
+                                              for ens in ensemble.ensembles])
+        elif isinstance(ensemble, WrappedEnsemble):
+            wrapped = ensemble._unaltered_ensemble()
+            if wrapped is not None:
+                return self.node(wrapped)
+        return _EnsembleNode(ensemble)
+
+
+class CompiledEnsemble(object):
+    """Plan to check trajectories against an ensemble with array operations.
+
+    Gives the same results as the ensemble itself (for
+    :class:`.TISEnsemble`, as with ``candidate=False``), but evaluates each
+    distinct volume only once per trajectory. Create it with
+    :func:`.compile_ensemble`.
+
+    Parameters
+    ----------
+    ensemble : :class:`.Ensemble`
+        the ensemble to compile
+
+    Attributes
+    ----------
+    ensemble : :class:`.Ensemble`
+        the compiled ensemble
+    volumes : list of :class:`.Volume`
+        the distinct volumes evaluated for each trajectory
+    """
+    def __init__(self, ensemble):
+        self.ensemble = ensemble
+        compiler = _Compiler()
+        self._root = compiler.node(ensemble)
+        self.volumes = compiler.volumes
+
+    def __call__(self, trajectory):
+        """Whether the trajectory is in the ensemble"""
+        evaluation = _Evaluation(trajectory)
+        return self._root.call(evaluation, 0, evaluation.n_frames)
+
+    def can_append(self, trajectory):
+        """See :meth:`.Ensemble.can_append`"""
+        evaluation = _Evaluation(trajectory)
+        return self._root.can_append(evaluation, 0, evaluation.n_frames)
+
+    def can_prepend(self, trajectory):
+        """See :meth:`.Ensemble.can_prepend`"""
+        evaluation = _Evaluation(trajectory)
+        return self._root.can_prepend(evaluation, 0, evaluation.n_frames)
+
+    def strict_can_append(self, trajectory):
+        """See :meth:`.Ensemble.strict_can_append`"""
+        evaluation = _Evaluation(trajectory)
+        return self._root.strict_can_append(evaluation, 0,
+                                            evaluation.n_frames)
+
+    def strict_can_prepend(self, trajectory):
+        """See :meth:`.Ensemble.strict_can_prepend`"""
+        evaluation = _Evaluation(trajectory)
+        return self._root.strict_can_prepend(evaluation, 0,
+                                             evaluation.n_frames)
+
+    def iter_valid_slices(self, trajectory, max_length=None, min_length=1,
+                          overlap=1, reverse=False):
+        """Iterate over slices of subtrajectories in the ensemble.
+
+        Same algorithm and results as :meth:`.Ensemble.iter_valid_slices`;
+        the volumes are only evaluated once for the whole trajectory.
+
+        Parameters
+        ----------
+        trajectory : :class:`.Trajectory`
+            the trajectory to search
+        max_length : int > 0, optional
+            maximal length of the subtrajectories
+        min_length : int > 0, optional
+            minimal length of the subtrajectories
+        overlap : int >= 0, optional
+            number of frames two subtrajectories may share at their ends
+        reverse : bool
+            if `True` search from the end of the trajectory
+
+        Yields
+        ------
+        slice
+            slices of subtrajectories that are in the ensemble
+        """
+        evaluation = _Evaluation(trajectory)
+        root = self._root
+        length = evaluation.n_frames
+        if max_length is None:
+            max_length = length
+        max_length = min(length, max_length)
+        min_length = max(1, min_length)
+
+        if not reverse:
+            start = 0
+            end = start + min_length
+            while start <= length - min_length and end <= length:
+                if (end < length
+                        and root.strict_can_append(evaluation, start, end)):
+                    end += 1
+                    if end - start > max_length + 1:
+                        start += 1
+                        end = start + min_length
+                else:
+                    if (end - start <= max_length
+                            and root.call(evaluation, start, end)):
+                        yield slice(start, end)
+                        pad = min(overlap, end - start - 1)
+                        start = end - pad
+                        if end == length:
+                            start = length
+                    elif (end - start >= min_length + 1
+                          and root.call(evaluation, start, end - 1)):
+                        yield slice(start, end - 1)
+                        pad = min(overlap + 1, end - start - 2)
+                        start = end - pad
+                    else:
+                        start += 1
+                    end = start + min_length
+        else:
+            end = length
+            start = end - min_length
+            while start >= 0 and end >= min_length:
+                if start > 0 and root.can_prepend(evaluation, start, end):
+                    start -= 1
+                    if end - start > max_length + 1:
+                        end -= 1
+                        start = end - min_length
+                else:
+                    if (end - start <= max_length
+                            and root.call(evaluation, start, end)):
+                        yield slice(start, end)
+                        pad = min(overlap, end - start - 1)
+                        end = start + pad
+                        if start == 0:
+                            end = 0
+                    elif (end - start >= min_length + 1
+                          and root.call(evaluation, start + 1, end)):
+                        yield slice(start + 1, end)
+                        pad = min(overlap + 1, end - start - 2)
+                        end = start + pad
+                    else:
+                        end -= 1
+                    start = end - min_length
+
+
+def compile_ensemble(ensemble):
+    """Compile an ensemble into a :class:`.CompiledEnsemble`.
+
+    Parameters
+    ----------
+    ensemble : :class:`.Ensemble`
+        the ensemble to compile
+
+    Returns
+    -------
+    :class:`.CompiledEnsemble`
+        plan that checks trajectories with array operations
+    """
+    return CompiledEnsemble(ensemble)
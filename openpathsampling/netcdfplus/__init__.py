@@ -1,6 +1,9 @@
 from .base import StorableNamedObject, StorableObject, create_to_dict
 from .cache import WeakKeyCache, WeakLRUCache, WeakValueCache, MaxCache, \
-    NoCache, Cache, LRUCache, LRUChunkLoadingCache
+    NoCache, Cache, LRUCache, LRUChunkLoadingCache, BoundedValueCache
+from .shared_cache import SharedValueCache
+from .prefetch import ChunkPrefetcher
+from .uuid_index import IndexFile, IndexFileHashedList
 from .dictify import ObjectJSON, StorableObjectJSON, UUIDObjectJSON
 from .netcdfplus import NetCDFPlus
 
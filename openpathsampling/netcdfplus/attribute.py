@@ -71,6 +71,7 @@ class PseudoAttribute(cd.Wrap, StorableNamedObject):
             WeakKeyCache()
         )
         self._store_dict = None
+        self._shared_dict = None
         self._eval_dict = None
         self.stores = []
 
@@ -123,10 +124,75 @@ class PseudoAttribute(cd.Wrap, StorableNamedObject):
 
             self._update_store_dict()
 
+    @property
+    def memory_cache(self):
+        """
+        :class:`openpathsampling.netcdfplus.Cache` : the in-memory cache of
+        values of this attribute
+        """
+        return self._cache_dict.cache
+
+    def set_memory_cache(self, cache):
+        """
+        Replace the in-memory cache of values, e.g. to bound its size
+
+        By default, values are kept as long as the objects they belong to
+        exist. With a :class:`openpathsampling.netcdfplus.BoundedValueCache`
+        the memory used can be limited, and its counters show how well the
+        cache works. Values already cached are transferred to the new cache.
+
+        Parameters
+        ----------
+        cache : :class:`openpathsampling.netcdfplus.Cache`
+            the new cache
+
+        Returns
+        -------
+        :class:`PseudoAttribute`
+            self
+        """
+        self._cache_dict.cache = cache.transfer(self._cache_dict.cache)
+        return self
+
+    def set_shared_cache(self, shared_cache):
+        """
+        Use a cache shared with other processes before evaluating values
+
+        Values that are not in the local cache or an attached store are
+        looked up in the shared cache, and values that have to be computed
+        are added to it, so that they are only computed once for all
+        processes that share the cache. Values are kept under the UUID of
+        this attribute, so one cache can be used by several attributes.
+        Values of reversed objects are only used if the local cache does so
+        (e.g., for time-reversible CVs).
+
+        Parameters
+        ----------
+        shared_cache : :class:`openpathsampling.netcdfplus.SharedValueCache`
+            the shared cache, or None to stop using one
+
+        Returns
+        -------
+        :class:`PseudoAttribute`
+            self
+        """
+        if shared_cache is None:
+            self._shared_dict = None
+        else:
+            self._shared_dict = cd.SharedCacheChainDict(
+                shared_cache, self,
+                reversible=getattr(self._cache_dict, 'reversible', False))
+        self._update_store_dict()
+        return self
+
     def _update_store_dict(self):
         cv_stores = list(map(cd.StoredDict, self.stores))
 
         last_cv = self._eval_dict
+        if self._shared_dict is not None:
+            self._shared_dict._post = last_cv
+            last_cv = self._shared_dict
+
         for s in reversed(cv_stores):
             s._post = last_cv
             last_cv = s
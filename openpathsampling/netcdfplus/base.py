@@ -38,6 +38,26 @@ class StorableObject(object):
             )
         ))
 
+    @staticmethod
+    def initialize_uuid():
+        """
+        Start a new range of UUIDs for objects created from now on
+
+        This is needed in a forked process: it inherits the UUID counter of
+        its parent, so without this, objects created in the parent and in
+        the child (or in two children) would share UUIDs. The new range is
+        random (from :func:`uuid.uuid4`), since forked processes also share
+        the state of the :mod:`random` module used by :func:`uuid.uuid1`.
+        """
+        StorableObject.INSTANCE_UUID = list(uuid.uuid4().fields[:-1])
+        StorableObject.CREATION_COUNT = 0
+        StorableObject.ACTIVE_LONG = int(uuid.UUID(
+                fields=tuple(
+                    StorableObject.INSTANCE_UUID +
+                    [StorableObject.CREATION_COUNT]
+                )
+            ))
+
     @staticmethod
     def get_uuid():
         StorableObject.ACTIVE_LONG += 2
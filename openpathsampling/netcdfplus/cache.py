@@ -1,8 +1,12 @@
 from collections import OrderedDict
+import logging
+import sys
 import weakref
 
 __author__ = 'Jan-Hendrik Prinz'
 
+logger = logging.getLogger(__name__)
+
 
 class Cache(object):
     """
@@ -207,6 +211,211 @@ class LRUCache(Cache):
         return len(self._cache)
 
 
+class BoundedValueCache(Cache):
+    """
+    Least Recently Used cache of values, bounded by entries and/or bytes
+
+    Meant for the values of collective variables: entries are evicted when
+    there are more than ``max_entries`` of them, or when their values take
+    more than ``max_bytes`` (``nbytes`` of numpy values, ``sys.getsizeof``
+    of other values). Values of pinned keys (e.g., the snapshots of the
+    current samples) are never evicted and do not count against the limits.
+
+    Parameters
+    ----------
+    max_entries : int or None
+        maximal number of (unpinned) entries, None for no limit
+    max_bytes : int or None
+        maximal total size of the (unpinned) values in bytes, None for no
+        limit
+
+    Attributes
+    ----------
+    n_hits : int
+        number of lookups that found a value
+    n_misses : int
+        number of lookups that did not find a value
+    n_evicted : int
+        number of values evicted because of the limits
+    n_bytes : int
+        total size of all cached values in bytes
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None):
+        super(BoundedValueCache, self).__init__()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._cache = OrderedDict()  # key: (value, nbytes)
+        self._pinned = {}
+        self._pinned_keys = set()
+        self._lru_bytes = 0
+        self._pinned_bytes = 0
+        self.reset_statistics()
+
+    @staticmethod
+    def value_bytes(value):
+        """Size of a value in bytes"""
+        try:
+            return int(value.nbytes)
+        except AttributeError:
+            return sys.getsizeof(value)
+
+    @property
+    def n_bytes(self):
+        return self._lru_bytes + self._pinned_bytes
+
+    @property
+    def count(self):
+        return len(self), 0
+
+    @property
+    def size(self):
+        return -1 if self.max_entries is None else self.max_entries, 0
+
+    @property
+    def statistics(self):
+        """
+        dict : counters of lookups, evictions, entries, and bytes
+        """
+        return {
+            'hits': self.n_hits,
+            'misses': self.n_misses,
+            'evicted': self.n_evicted,
+            'entries': len(self),
+            'pinned': len(self._pinned),
+            'bytes': self.n_bytes
+        }
+
+    def reset_statistics(self):
+        """Set the counters of hits, misses, and evictions to zero"""
+        self.n_hits = 0
+        self.n_misses = 0
+        self.n_evicted = 0
+
+    def __getitem__(self, item):
+        try:
+            value = self._pinned[item][0]
+        except KeyError:
+            try:
+                entry = self._cache.pop(item)
+            except KeyError:
+                self.n_misses += 1
+                raise
+            self._cache[item] = entry
+            value = entry[0]
+        self.n_hits += 1
+        return value
+
+    def get_silent(self, item):
+        """
+        Return a value without counting the lookup or reordering the LRU
+
+        Parameters
+        ----------
+        item : object
+            the key
+
+        Returns
+        -------
+        `object` or `None`
+            the value if it exists else `None`
+        """
+        try:
+            return self._pinned[item][0]
+        except KeyError:
+            try:
+                return self._cache[item][0]
+            except KeyError:
+                return None
+
+    def __setitem__(self, key, value):
+        nbytes = self.value_bytes(value)
+        if key in self._pinned_keys:
+            old = self._pinned.get(key)
+            if old is not None:
+                self._pinned_bytes -= old[1]
+            self._pinned[key] = (value, nbytes)
+            self._pinned_bytes += nbytes
+        else:
+            old = self._cache.pop(key, None)
+            if old is not None:
+                self._lru_bytes -= old[1]
+            self._cache[key] = (value, nbytes)
+            self._lru_bytes += nbytes
+            self._check_limits()
+
+    def _check_limits(self):
+        while self._cache and (
+                (self.max_entries is not None
+                 and len(self._cache) > self.max_entries)
+                or (self.max_bytes is not None
+                    and self._lru_bytes > self.max_bytes)):
+            _, (_, nbytes) = self._cache.popitem(last=False)
+            self._lru_bytes -= nbytes
+            self.n_evicted += 1
+
+    def pin(self, keys):
+        """
+        Keep the values of these keys, regardless of the limits
+
+        Parameters
+        ----------
+        keys : iterable
+            the keys to pin, e.g. the snapshots of a trajectory
+        """
+        for key in keys:
+            self._pinned_keys.add(key)
+            entry = self._cache.pop(key, None)
+            if entry is not None:
+                self._lru_bytes -= entry[1]
+                self._pinned[key] = entry
+                self._pinned_bytes += entry[1]
+
+    def unpin(self, keys=None):
+        """
+        Return the values of these keys to the LRU cache
+
+        Parameters
+        ----------
+        keys : iterable or None
+            the keys to unpin; if None, all keys are unpinned
+        """
+        if keys is None:
+            keys = list(self._pinned_keys)
+        for key in keys:
+            self._pinned_keys.discard(key)
+            entry = self._pinned.pop(key, None)
+            if entry is not None:
+                self._pinned_bytes -= entry[1]
+                self._cache[key] = entry
+                self._lru_bytes += entry[1]
+        self._check_limits()
+
+    def __contains__(self, item):
+        return item in self._pinned or item in self._cache
+
+    def __len__(self):
+        return len(self._pinned) + len(self._cache)
+
+    def __iter__(self):
+        for key in self._pinned:
+            yield key
+        for key in self._cache:
+            yield key
+
+    def __reversed__(self):
+        for key in reversed(self._cache):
+            yield key
+        for key in self._pinned:
+            yield key
+
+    def clear(self):
+        self._cache.clear()
+        self._pinned.clear()
+        self._lru_bytes = 0
+        self._pinned_bytes = 0
+
+
 class WeakLRUCache(Cache):
     """
     Implements a cache that keeps weak references to all elements
@@ -374,6 +583,11 @@ class LRUChunkLoadingCache(Cache):
     """
     Implements a cache that keeps references loaded in chunks
 
+    With read-ahead enabled (see :meth:`set_prefetch`), loading chunks in
+    order makes the cache request the following chunks from a
+    :class:`.ChunkPrefetcher`, so that they are read while the current ones
+    are used.
+
     """
 
     def __init__(self, chunksize=256, max_chunks=4*8192, variable=None):
@@ -385,6 +599,10 @@ class LRUChunkLoadingCache(Cache):
         self._chunkdict = OrderedDict()
         self._firstchunk = 0
         self._lastchunk = []
+
+        self.prefetch = 0
+        self.prefetcher = None
+        self._last_loaded = None
         if variable is not None:
             self._size = len(self.variable)
         else:
@@ -404,6 +622,58 @@ class LRUChunkLoadingCache(Cache):
         self._chunkdict.clear()
         self._firstchunk = 0
         self._lastchunk = []
+        self._last_loaded = None
+
+    @property
+    def _netcdf_variable(self):
+        # the netCDF variable behind a variable delegate
+        return getattr(self.variable, 'variable', self.variable)
+
+    def set_prefetch(self, n_chunks, prefetcher=None):
+        """
+        Read chunks ahead when chunks are loaded in order
+
+        Parameters
+        ----------
+        n_chunks : int
+            the number of chunks to read ahead once two consecutive chunks
+            were loaded. `0` switches read-ahead off
+        prefetcher : :class:`openpathsampling.netcdfplus.ChunkPrefetcher`
+            reads the chunks in the background; it needs to read from the
+            file of the attached variable
+
+        """
+        if n_chunks > 0 and prefetcher is None:
+            raise ValueError('Read-ahead needs a ChunkPrefetcher')
+
+        self.prefetch = n_chunks
+        self.prefetcher = prefetcher if n_chunks > 0 else None
+
+    def _read(self, left, right):
+        # read a slice of the variable, using a slice read ahead if there is
+        if self.prefetcher is not None:
+            data = self.prefetcher.take(self._netcdf_variable, left, right)
+            if data is not None:
+                getter = getattr(self.variable, 'getter', None)
+                return data if getter is None else getter(data)
+
+        return self.variable[left:right]
+
+    def _read_ahead(self, chunk_idx):
+        # request the chunks after `chunk_idx` if the chunks are loaded in
+        # order
+        sequential = self._last_loaded == chunk_idx - 1
+        self._last_loaded = chunk_idx
+
+        if not sequential or not self.prefetcher.running:
+            return
+
+        last = min(chunk_idx + self.prefetch, self._lastchunk_idx)
+        for idx in range(chunk_idx + 1, last + 1):
+            if idx not in self._chunkdict:
+                left = idx * self.chunksize
+                right = min(self._size, left + self.chunksize)
+                self.prefetcher.request(self._netcdf_variable, left, right)
 
     def update_size(self, size=None):
         """
@@ -444,10 +714,13 @@ class LRUChunkLoadingCache(Cache):
                 left = chunk_idx * self.chunksize
                 right = min(self._size, left + self.chunksize)
                 self._chunkdict[chunk_idx] = []
-                self._chunkdict[chunk_idx].extend(self.variable[left:right])
+                self._chunkdict[chunk_idx].extend(self._read(left, right))
 
                 self._check_size_limit()
 
+                if self.prefetch:
+                    self._read_ahead(chunk_idx)
+
             elif len(self._chunkdict[chunk_idx]) < self.chunksize:
                 # incomplete chunk, load rest
                 chunk = self._chunkdict[chunk_idx]
@@ -487,13 +760,48 @@ class LRUChunkLoadingCache(Cache):
         """
         Fill the cache with as many chunks as possible
 
+        The missing chunks are read with a single slice of the attached
+        variable, which is then split into chunks. At most `max_chunks`
+        chunks, starting with the first one, are loaded.
+
+        Returns
+        -------
+        int
+            the number of bytes read from the variable
+
         """
         self.update_size()
-        map(self.load_chunk,
-            range(0, min(
-                1 + (self._size - 1) // self.chunksize,
-                self.max_chunks
-            )))
+        if self._size == 0:
+            return 0
+
+        n_chunks = min(1 + (self._size - 1) // self.chunksize,
+                       self.max_chunks)
+
+        missing = [
+            chunk_idx for chunk_idx in range(n_chunks)
+            if len(self._chunkdict.get(chunk_idx, [])) < min(
+                self.chunksize, self._size - chunk_idx * self.chunksize)
+        ]
+        if not missing:
+            return 0
+
+        left = missing[0] * self.chunksize
+        right = min(self._size, n_chunks * self.chunksize)
+
+        data = self._netcdf_variable[left:right]
+        getter = getattr(self.variable, 'getter', None)
+        values = data if getter is None else getter(data)
+
+        for chunk_idx in missing:
+            start = chunk_idx * self.chunksize - left
+            self._chunkdict[chunk_idx] = list(
+                values[start:start + self.chunksize])
+            self._check_size_limit()
+
+        n_bytes = getattr(data, 'nbytes', 0)
+        logger.debug('Loaded %d chunks (%d bytes) at once',
+                     len(missing), n_bytes)
+        return n_bytes
 
     def __setitem__(self, key, value, **kwargs):
         chunk_idx = key // self.chunksize
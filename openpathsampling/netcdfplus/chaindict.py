@@ -6,6 +6,30 @@ from .proxy import LoaderProxy
 __author__ = 'Jan-Hendrik Prinz'
 
 
+def _has_buffers(items):
+    """
+    True for containers that keep the data of all keys in arrays
+
+    These (like :class:`openpathsampling.engines.ArrayTrajectory`) are
+    passed on as they are, so that functions can use the arrays.
+    """
+    return hasattr(type(items), 'buffers')
+
+
+def _select(items, indices):
+    """
+    The keys at `indices`, keeping containers with buffers
+    """
+    if len(indices) == len(items):
+        # indices are increasing, so these are all keys
+        return items
+    elif _has_buffers(items):
+        return items[indices]
+    else:
+        items = list(items)
+        return [items[idx] for idx in indices]
+
+
 class ChainDict(object):
     """
     A dict-like structure with a logic to fill missing values from other dicts
@@ -67,11 +91,17 @@ class ChainDict(object):
         results = self._get_list(items)
 
         if self._post is not None:
-            nones = [obj[0] for obj in zip(items, results) if obj[1] is None]
-            if len(nones) == 0:
+            missing = [pos for pos, result in enumerate(results)
+                       if result is None]
+            if len(missing) == 0:
                 return results
             else:
-                rep = list(self._post[nones])
+                nones = _select(items, missing)
+                # gather the distinct missing keys, get them with a single
+                # request and scatter the values to all missing keys
+                unique, positions = self._gather(nones)
+                values = list(self._post[unique])
+                rep = [values[pos] for pos in positions]
                 self._set_list(nones, rep)
 
                 it = iter(rep)
@@ -129,6 +159,45 @@ class ChainDict(object):
         """
         return [self._get(item) for item in items]
 
+    def _same_value_key(self, item):
+        """
+        Key that is equal for all keys known to have the same value
+
+        Default is the key itself
+        """
+        return item
+
+    def _gather(self, items):
+        """
+        Find the distinct keys that need to be passed on
+
+        Returns
+        -------
+        list of object
+            the first key for each distinct value in `items`
+        list of int
+            for each key in `items` the position of its representative in
+            the first list
+        """
+        firsts = []
+        positions = []
+        first = {}
+        try:
+            for idx, item in enumerate(items):
+                key = self._same_value_key(item)
+                pos = first.get(key)
+                if pos is None:
+                    pos = len(firsts)
+                    first[key] = pos
+                    firsts.append(idx)
+                positions.append(pos)
+        except TypeError:
+            # unhashable keys are all passed on
+            return _select(items, list(range(len(items)))), \
+                list(range(len(items)))
+
+        return _select(items, firsts), positions
+
     def __gt__(self, other):
         """
         Combine two ChainDicts first > next into a new one.
@@ -269,6 +338,8 @@ class ExpandSingle(ChainDict):
                     'Iterators that do not have __len__ implemented are not '
                     'supported. You can wrap your iterator in list() if you '
                     'know that it will finish.')
+            if _has_buffers(items):
+                return self._post[items]
             try:
                 return self._post[items.as_proxies()]
             except AttributeError:
@@ -364,7 +435,7 @@ class Function(ChainDict):
         else:
             results = [self._eval(obj) for obj in items]
             if self.scalarize_numpy_singletons and results[0].shape[-1] == 1:
-                results = map(lambda x: x.reshape(x.shape[:-1]), results)
+                results = [x.reshape(x.shape[:-1]) for x in results]
 
         return results
 
@@ -396,15 +467,39 @@ class CacheChainDict(ChainDict):
     def _contains(self, item):
         return item in self.cache
 
+    def _cached_key(self, item):
+        # the key under which a value of item would be in the cache
+        return item
+
     def _get(self, item):
         if item is None:
             return None
 
+        # a single lookup, so caches that count lookups count each once
         try:
-            return self.cache[item]
+            return self.cache[self._cached_key(item)]
         except KeyError:
             return None
 
+    def _get_silent(self, item):
+        """
+        Return the cached value of an item without counting the lookup
+
+        Parameters
+        ----------
+        item : object
+            the key
+
+        Returns
+        -------
+        `object` or `None`
+            the cached value, or `None` if there is none
+        """
+        if item is None:
+            return None
+
+        return self.cache.get_silent(self._cached_key(item))
+
     def _set(self, item, value):
         self.cache[item] = value
 
@@ -423,22 +518,62 @@ class ReversibleCacheChainDict(CacheChainDict):
         super(ReversibleCacheChainDict, self).__init__(cache)
         self.reversible = reversible
 
+    def _same_value_key(self, item):
+        # an object and its reversed object differ only in the last bit of
+        # their UUIDs
+        if self.reversible and hasattr(item, '__uuid__'):
+            return item.__uuid__ >> 1
+
+        return item
+
+    def _cached_key(self, item):
+        # use the value of the reversed object if only that one is cached
+        if self.reversible and type(item) is not LoaderProxy:
+            reversed_item = item._reversed
+            if reversed_item is not None and item not in self.cache \
+                    and reversed_item in self.cache:
+                return reversed_item
+
+        return item
+
+
+class SharedCacheChainDict(ChainDict):
+    """
+    Return values from a cache shared between processes
+
+    Values computed by the underlying CDs are written to the shared cache
+    in one batch. Values are kept under the UUID of the owner, so several
+    attributes can share one cache.
+    """
+    def __init__(self, shared_cache, owner, reversible=False):
+        """
+        Parameters
+        ----------
+        shared_cache : :class:`openpathsampling.netcdfplus.SharedValueCache`
+            the cache shared between processes
+        owner : :class:`openpathsampling.netcdfplus.StorableObject`
+            the object (e.g. the CV) the values belong to
+        reversible : bool
+            if `True`, the value of the reversed object is used, too
+        """
+        super(SharedCacheChainDict, self).__init__()
+        self.shared_cache = shared_cache
+        self.owner = owner
+        self.reversible = reversible
+
     def _get(self, item):
         if item is None:
             return None
 
         try:
-            return self.cache[item]
+            return self.shared_cache.get_value(item, self.owner,
+                                               self.reversible)
         except KeyError:
-            if type(item) is not LoaderProxy:
-                if self.reversible and item._reversed is not None:
-                    try:
-                        return self.cache[item._reversed]
-                    except KeyError:
-                        return None
-
             return None
 
+    def _set_list(self, items, values):
+        self.shared_cache.set_many(items, values, self.owner)
+
 
 class StoredDict(ChainDict):
     """
@@ -462,10 +597,12 @@ class StoredDict(ChainDict):
         return
 
     def _get(self, item):
-        return self.value_store.get(item)
+        with self.value_store.storage.lock:
+            return self.value_store.get(item)
 
     def _get_list(self, items):
-        return list(map(self._get, items))
+        with self.value_store.storage.lock:
+            return list(map(self.value_store.get, items))
 
     def sync(self):
         pass
@@ -5,14 +5,19 @@ author
 import abc
 import logging
 import os.path
+import shutil
+import threading
 from collections import OrderedDict
 from uuid import UUID
 
 import netCDF4
 import numpy as np
 from .dictify import UUIDObjectJSON
-from .stores import NamedObjectStore, ObjectStore, PseudoAttributeStore
+from .stores import (NamedObjectStore, ObjectStore, PseudoAttributeStore,
+                     ValueStore)
+from .prefetch import ChunkPrefetcher
 from .proxy import LoaderProxy
+from .uuid_index import IndexFile
 
 import sys
 if sys.version_info > (3, ):
@@ -98,6 +103,7 @@ class NetCDFPlus(netCDF4.Dataset):
         def __init__(self, variable, getter=None, setter=None, store=None):
             self.variable = variable
             self.store = store
+            self.converts = setter is not None
 
             if setter is None:
                 # None should not be used
@@ -119,6 +125,35 @@ class NetCDFPlus(netCDF4.Dataset):
         def __setitem__(self, key, value):
             self.variable[key] = self.setter(value)
 
+        def set_many(self, idx, values):
+            """
+            Set consecutive entries with a single write to the variable
+
+            Each value is converted by the setter on its own, so this also
+            works for types that are converted differently if given as a list.
+            Variables without conversion take an array with all values as it
+            is.
+
+            Parameters
+            ----------
+            idx : int
+                the index of the first entry to be set
+            values : list or numpy.ndarray
+                the values to be set for the entries `idx`, `idx + 1`, ...
+            """
+            if len(values) == 0:
+                return
+
+            if not self.converts and isinstance(values, np.ndarray):
+                self.variable[idx:idx + len(values)] = values
+                return
+
+            values = [self.setter(value) for value in values]
+            if isinstance(values[0], str):
+                values = np.array(values, dtype=object)
+
+            self.variable[idx:idx + len(values)] = values
+
         def __getitem__(self, key):
             # print(self.variable[key])
             # print(type(self.variable[key]))
@@ -189,7 +224,8 @@ class NetCDFPlus(netCDF4.Dataset):
         # todo: add CVStore, rename to attribute
         pass
 
-    def __init__(self, filename, mode=None, fallback=None):
+    def __init__(self, filename, mode=None, fallback=None, index_files=None,
+                 lazy=False):
         """
         Create a storage for complex objects in a netCDF file
 
@@ -206,6 +242,19 @@ class NetCDFPlus(netCDF4.Dataset):
             in this storage. By default you will not try to resave objects
             that could be found in the fallback. Note that the fall back does
             only work if `use_uuid` is enabled
+        index_files : bool or None
+            if `True` the indices of the stores are kept in hash tables in
+            the directory `filename + '.index'`, so opening the file does not
+            need to read the uuids of all stored objects. Missing tables are
+            built when the file is opened. If `None` (default), index files
+            are used if the directory exists. Opening with mode 'w' removes
+            an existing directory.
+        lazy : bool
+            if `True` an existing file is opened without loading the indices
+            of the stores. Each store loads them when they are first used,
+            the stores of attributes (e.g. CVs) are added when the first
+            attribute store is looked up. This makes opening fast if only a
+            few stores are used.
 
         Notes
         -----
@@ -248,6 +297,31 @@ class NetCDFPlus(netCDF4.Dataset):
 
         self._filename = os.path.abspath(filename)
         self.fallback = fallback
+        self._prefetcher = None
+
+        # held while the file is accessed, so objects can be saved from
+        # another thread while this one keeps loading
+        self.lock = threading.RLock()
+        # objects saving to this file in the background; they are closed
+        # before the file is closed
+        self.writers = []
+
+        self.lazy = lazy
+        self._attributes_pending = False
+
+        # keep the indices of stores in index files next to the netCDF file
+        self._index_dir = self._filename + '.index'
+        self._index_files = {}
+        if mode == 'w' and os.path.isdir(self._index_dir):
+            shutil.rmtree(self._index_dir)
+
+        if index_files is None:
+            index_files = os.path.isdir(self._index_dir)
+
+        self.index_files = bool(index_files)
+        if self.index_files and mode != 'r' and \
+                not os.path.isdir(self._index_dir):
+            os.makedirs(self._index_dir)
 
         # this can be set to false to re-store objects present in the fallback
         self.exclude_from_fallback = True
@@ -348,13 +422,10 @@ class NetCDFPlus(netCDF4.Dataset):
 
             # only if we have a new style file
             if hasattr(self, 'attributes'):
-                for attribute, store in zip(
-                        self.attributes,
-                        self.attributes.vars['cache']
-                ):
-                    if store is not None:
-                        key_store = self.attributes.key_store(attribute)
-                        key_store.attribute_list[attribute] = store
+                if lazy:
+                    self._attributes_pending = True
+                else:
+                    self.restore_attributes()
 
             # call the subclass specific restore in case there is more stuff
             # to prepare
@@ -386,6 +457,102 @@ class NetCDFPlus(netCDF4.Dataset):
                 current /= 1024.0
         return "{0:.2f}{1}B".format(current, output_prefix)
 
+    @property
+    def prefetcher(self):
+        """
+        :class:`openpathsampling.netcdfplus.ChunkPrefetcher` : reads chunks
+        of this file ahead; it is started on first use and only available
+        if the file is opened read-only
+        """
+        if self._prefetcher is None:
+            if self.mode != 'r':
+                raise RuntimeError(
+                    "Read-ahead is only possible for files opened "
+                    "read-only, but '%s' is opened with mode '%s'"
+                    % (self.filename, self.mode))
+            self._prefetcher = ChunkPrefetcher(self.filename)
+
+        return self._prefetcher
+
+    def set_prefetch(self, n_chunks):
+        """
+        Read chunks of stored values ahead in sequential scans
+
+        This applies to all stores that load their values in chunks, like
+        the stores of collective variables. Once two consecutive chunks of
+        a store are loaded, the next `n_chunks` chunks are read in the
+        background.
+
+        Parameters
+        ----------
+        n_chunks : int
+            the number of chunks to read ahead. `0` switches read-ahead off.
+
+        """
+        for store in self._stores.values():
+            if isinstance(store, ValueStore):
+                store.set_prefetch(n_chunks)
+
+    def index_file(self, store):
+        """
+        Return the index file for a store
+
+        Parameters
+        ----------
+        store : :class:`openpathsampling.netcdfplus.ObjectStore`
+            the store to get the index file for
+
+        Returns
+        -------
+        :class:`openpathsampling.netcdfplus.uuid_index.IndexFile` or None
+            the index file or `None` if this storage does not use index files
+            or the store does not keep its index in one
+        """
+        if not self.index_files or not store.persistent_index:
+            return None
+
+        name = store.prefix
+        if name not in self._index_files:
+            filename = os.path.join(self._index_dir, name + '.npy')
+            # a file opened for reading never changes its index files,
+            # missing ones are built in memory
+            self._index_files[name] = IndexFile(
+                filename, readonly=self.mode == 'r')
+
+        return self._index_files[name]
+
+    def _flush_index_files(self):
+        for store in self._stores.values():
+            if store.index is not None and hasattr(store.index, 'flush'):
+                store.index.flush()
+
+    def sync(self):
+        super(NetCDFPlus, self).sync()
+        self._flush_index_files()
+
+    def close(self):
+        # the writers need the lock to save what they still have, so they
+        # are closed before the lock is taken
+        error = None
+        for writer in list(self.writers):
+            try:
+                writer.close()
+            except Exception as e:
+                error = e
+
+        with self.lock:
+            if self._prefetcher is not None:
+                self._prefetcher.close()
+                self._prefetcher = None
+
+            if self.index_files and self.isopen():
+                self._flush_index_files()
+
+            super(NetCDFPlus, self).close()
+
+        if error is not None:
+            raise error
+
     @staticmethod
     def _cmp_version(v1, v2):
         # we only look at x.y.z parts
@@ -581,9 +748,36 @@ class NetCDFPlus(netCDF4.Dataset):
         """
 
         for storage in self._stores.values():
-            storage.restore()
+            if not self.lazy:
+                storage.restore()
+            elif storage is not self.stores:
+                # the store of stores has been restored already, the others
+                # load their indices when these are first used
+                storage.restore_state()
+                storage._restore_pending = True
+
             storage._created = True
 
+    def restore_attributes(self):
+        """
+        Add the stores of all stored attributes to the stores of their keys
+
+        Notes
+        -----
+        Only runs when an existing storage is opened. This loads all stored
+        attributes, so if the storage is opened lazily it is deferred until
+        the stores of attributes are used.
+        """
+        with self.lock:
+            self._attributes_pending = False
+            for attribute, store in zip(
+                    self.attributes,
+                    self.attributes.vars['cache']
+            ):
+                if store is not None:
+                    key_store = self.attributes.key_store(attribute)
+                    key_store.attribute_list[attribute] = store
+
     def list_stores(self):
         """
         Return a list of registered stores
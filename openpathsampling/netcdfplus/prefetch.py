@@ -0,0 +1,249 @@
+"""
+Read-ahead of chunks of netCDF variables for sequential scans.
+
+An :class:`.LRUChunkLoadingCache` loads a chunk of a variable only when one
+of its entries is requested, so a scan over a whole store waits for the
+disk at every chunk boundary. A :class:`.ChunkPrefetcher` reads the next
+chunks while the current ones are being used.
+
+The netCDF library is not thread-safe: a file must not be accessed from
+two threads at the same time. The reads are therefore done by a single
+worker process with its own read-only handle to the file. A background
+thread in this process receives the chunks, so they are ready when the
+cache asks for them. Since the worker does not see changes made through
+another handle, read-ahead is only available for files opened read-only.
+
+The worker is this module run as a script in a new interpreter, so it only
+needs to import netCDF4 and never re-runs the script that started it.
+"""
+
+import logging
+import pickle
+import subprocess
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def _read_chunks(filename, requests, results):
+    """Worker: read the requested slices until `None` is received"""
+    import netCDF4
+    with netCDF4.Dataset(filename, 'r') as dataset:
+        while True:
+            request = pickle.load(requests)
+            if request is None:
+                break
+            (path, left, right), auto_mask = request
+            try:
+                variable = dataset[path]
+                variable.set_auto_mask(auto_mask)
+                data = variable[left:right]
+            except Exception as exc:
+                logger.warning("Reading %s[%d:%d] ahead failed: %s",
+                               path, left, right, exc)
+                data = None
+            pickle.dump(((path, left, right), data), results,
+                        pickle.HIGHEST_PROTOCOL)
+            results.flush()
+
+
+_RUN_WORKER = ("import runpy, sys; "
+               "runpy.run_path(sys.argv[1], run_name='__main__')")
+
+
+class ChunkPrefetcher(object):
+    """
+    Reads slices of the variables of a netCDF file ahead of their use
+
+    Slices are requested with :meth:`request` and collected with
+    :meth:`take`. All reads for a file go through a single worker process,
+    so they never run concurrently with each other or with the netCDF
+    calls in this process.
+
+    Parameters
+    ----------
+    filename : str
+        the netCDF file to read from; it must not be written to while the
+        prefetcher is running
+    max_ready : int
+        the maximal number of slices that are kept when they are read but not
+        yet taken; the oldest are dropped first
+
+    Attributes
+    ----------
+    n_requested : int
+        number of slices requested
+    n_used : int
+        number of slices that were read ahead and then taken
+    """
+
+    def __init__(self, filename, max_ready=64):
+        self.filename = filename
+        self.max_ready = max_ready
+        self.n_requested = 0
+        self.n_used = 0
+
+        # run this file without putting its directory on the path, where
+        # modules of this package would shadow others
+        self._process = subprocess.Popen(
+            [sys.executable, '-c', _RUN_WORKER, __file__, filename],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE
+        )
+        self._lock = threading.Lock()
+
+        self._condition = threading.Condition()
+        self._pending = set()
+        self._ready = OrderedDict()
+        self._receiver = threading.Thread(target=self._receive)
+        self._receiver.daemon = True
+        self._receiver.start()
+
+    @staticmethod
+    def variable_path(variable):
+        """
+        The path of a netCDF variable inside its file
+
+        Parameters
+        ----------
+        variable : :class:`netCDF4.Variable`
+
+        Returns
+        -------
+        str
+        """
+        return variable.group().path.rstrip('/') + '/' + variable.name
+
+    @property
+    def running(self):
+        """bool : whether the worker process is still running"""
+        return self._process is not None and self._process.poll() is None
+
+    def _send(self, request):
+        with self._lock:
+            pickle.dump(request, self._process.stdin,
+                        pickle.HIGHEST_PROTOCOL)
+            self._process.stdin.flush()
+
+    def _receive(self):
+        results = self._process.stdout
+        while True:
+            try:
+                key, data = pickle.load(results)
+            except (EOFError, IOError, OSError, pickle.UnpicklingError):
+                break
+            with self._condition:
+                if key in self._pending:
+                    self._pending.discard(key)
+                    if data is not None:
+                        self._ready[key] = data
+                        while len(self._ready) > self.max_ready:
+                            self._ready.popitem(last=False)
+                self._condition.notify_all()
+
+        # the worker stopped: nothing pending will arrive anymore
+        with self._condition:
+            self._pending.clear()
+            self._condition.notify_all()
+
+    def request(self, variable, left, right):
+        """
+        Ask for a slice to be read in the background
+
+        Parameters
+        ----------
+        variable : :class:`netCDF4.Variable`
+            the variable to read from
+        left : int
+            the first index of the slice
+        right : int
+            the index after the last one of the slice
+        """
+        key = (self.variable_path(variable), left, right)
+        with self._condition:
+            if key in self._pending or key in self._ready:
+                return
+            self._pending.add(key)
+        try:
+            self._send((key, variable.mask))
+        except (IOError, OSError, ValueError):
+            # the worker stopped; the slice will be read when it is used
+            with self._condition:
+                self._pending.discard(key)
+            return
+        self.n_requested += 1
+
+    def take(self, variable, left, right, timeout=60.0):
+        """
+        Return a slice that was requested before
+
+        If the slice is still being read, this waits for it.
+
+        Parameters
+        ----------
+        variable : :class:`netCDF4.Variable`
+            the variable the slice was requested for
+        left : int
+            the first index of the slice
+        right : int
+            the index after the last one of the slice
+        timeout : float
+            the maximal time in seconds to wait for a pending slice
+
+        Returns
+        -------
+        numpy.ndarray or None
+            the raw values of the variable, as `variable[left:right]` would
+            return them, or `None` if the slice was not requested or could
+            not be read; the caller then needs to read it itself
+        """
+        key = (self.variable_path(variable), left, right)
+        with self._condition:
+            if key in self._pending:
+                deadline = time.time() + timeout
+                while key in self._pending:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                # a slice that did not arrive in time is not used anymore
+                self._pending.discard(key)
+            data = self._ready.pop(key, None)
+
+        if data is not None:
+            self.n_used += 1
+
+        return data
+
+    def close(self):
+        """Stop the worker process and drop all slices not taken"""
+        if self._process is None:
+            return
+        try:
+            self._send(None)
+            self._process.stdin.close()
+        except (IOError, OSError, ValueError):
+            pass
+
+        # Popen.wait has no timeout in Python 2
+        deadline = time.time() + 10.0
+        while self._process.poll() is None and time.time() < deadline:
+            time.sleep(0.01)
+        if self._process.poll() is None:
+            self._process.kill()
+            self._process.wait()
+        self._receiver.join(10.0)
+        self._process.stdout.close()
+        self._process = None
+        with self._condition:
+            self._pending.clear()
+            self._ready.clear()
+
+
+if __name__ == '__main__':
+    # binary streams; Python 2 has no separate text layer
+    _read_chunks(sys.argv[2], getattr(sys.stdin, 'buffer', sys.stdin),
+                 getattr(sys.stdout, 'buffer', sys.stdout))
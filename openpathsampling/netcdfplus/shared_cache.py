@@ -0,0 +1,378 @@
+"""
+Cache of values keyed by UUID that is shared between processes.
+
+The values of a :class:`.PseudoAttribute` (e.g., a collective variable) are
+normally cached per process, keyed by the objects themselves. When work is
+spread over several processes, each process computes the same values again.
+A :class:`.SharedValueCache` keeps values in a fixed-size hash table in
+shared memory, keyed by the UUID of the object, so that a value computed in
+one process can be read by all others. Each entry also has the UUID of its
+owner (the attribute it is a value of), so that one table can hold the
+values of several attributes.
+
+The table is either an anonymous shared memory map, which is inherited by
+processes forked after the cache was created (as in
+:class:`.WorkerPool`), or a memory mapped file that unrelated processes can
+open.
+
+Reading never takes a lock: each slot has a sequence number that is odd
+while the slot is being written, and a read is only accepted if the
+sequence number was even and unchanged while the key and value were
+copied. Writes are serialized with a lock. When all slots a key may occupy
+are taken, the oldest entry among them is evicted.
+"""
+
+import mmap
+import multiprocessing
+import os
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    # no fcntl on Windows: only anonymous maps can be used there
+    fcntl = None
+
+from .cache import Cache
+
+_MAGIC = 0x4f505344  # 'OPSD'
+_HEADER = np.dtype([('magic', '<u8'), ('capacity', '<u8'),
+                    ('n_probe', '<u8'), ('value_size', '<u8'),
+                    ('stamp', '<u8')])
+_HEADER_SIZE = 64
+_MASK64 = (1 << 64) - 1
+
+
+def _mix(x):
+    """Scramble the bits of a 64-bit integer (the splitmix64 finalizer)"""
+    x = ((x ^ (x >> 30)) * 0xbf58476d1ce4e5b9) & _MASK64
+    x = ((x ^ (x >> 27)) * 0x94d049bb133111eb) & _MASK64
+    return x ^ (x >> 31)
+
+
+class _ProcessLock(object):
+    """Write lock for an anonymous map: a lock inherited by forking"""
+    def __init__(self):
+        self._lock = multiprocessing.Lock()
+
+    def __enter__(self):
+        self._lock.acquire()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._lock.release()
+
+
+class _FileLock(object):
+    """Write lock for a file map: an advisory lock on the file"""
+    def __init__(self, fileno):
+        self._fileno = fileno
+
+    def __enter__(self):
+        fcntl.flock(self._fileno, fcntl.LOCK_EX)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        fcntl.flock(self._fileno, fcntl.LOCK_UN)
+
+
+class SharedValueCache(Cache):
+    """
+    Fixed-size table of values keyed by UUID, shared between processes
+
+    Keys are objects with a ``__uuid__`` (snapshots or their proxies). All
+    values must have the same shape and dtype; they are returned as numpy
+    scalars (for ``value_shape=()``) or as copies of the stored arrays.
+
+    Values can belong to an owner (an object with a ``__uuid__``, such as
+    a CV), given to :meth:`get_value`, :meth:`has_value` and
+    :meth:`set_many`. The values of different owners are kept apart, so
+    several CVs can share one table. Whether a key also finds the value of
+    its reversed object is set for each lookup, so time-reversible and
+    other CVs can share a table as well. Item access (``cache[key]``) uses
+    the values without an owner and the ``reversible`` setting of the table.
+
+    Parameters
+    ----------
+    capacity : int
+        number of slots of the table
+    value_shape : tuple of int
+        shape of each value
+    dtype : numpy dtype
+        dtype of the values
+    filename : str or None
+        if given, the table is kept in this file, and opening an existing
+        file with the same parameters attaches to that table; otherwise the
+        table is shared with processes forked after it was created. Files
+        need fcntl, so they are not available on Windows
+    n_probe : int
+        number of slots a key may occupy; the oldest of these is evicted
+        if they are all taken
+    reversible : bool
+        if `True`, a key also finds the value of its reversed object (UUID
+        with the last bit flipped), as for time-reversible CVs. This is the
+        default for lookups that don't set it.
+
+    Attributes
+    ----------
+    n_hits : int
+        lookups in this process that found a value
+    n_misses : int
+        lookups in this process that did not find a value
+    """
+    _max_read_attempts = 1000
+
+    def __init__(self, capacity, value_shape=(), dtype=float, filename=None,
+                 n_probe=8, reversible=False):
+        super(SharedValueCache, self).__init__()
+        self.capacity = int(capacity)
+        self.value_shape = tuple(value_shape)
+        self.dtype = np.dtype(dtype)
+        self.filename = filename
+        self.n_probe = min(int(n_probe), self.capacity)
+        self.reversible = reversible
+        self.n_hits = 0
+        self.n_misses = 0
+
+        value_size = int(np.prod(self.value_shape)) * self.dtype.itemsize
+        # seq, stamp, owner uuid (hi, lo), uuid (hi, lo), value
+        slot_size = 8 * 6 + value_size
+        total_size = _HEADER_SIZE + self.capacity * slot_size
+
+        if filename is None:
+            self._file = None
+            self._map = mmap.mmap(-1, total_size)
+            self._lock = _ProcessLock()
+            self._setup_table(value_size, new_table=True)
+        else:
+            if fcntl is None:
+                raise RuntimeError(
+                    "Shared cache files need file locking (fcntl), which is "
+                    "not available on this platform. Use a cache without a "
+                    "filename instead.")
+            self._file = open(filename, 'a+b')
+            self._lock = _FileLock(self._file.fileno())
+            try:
+                # the header is written and checked under the lock, so a
+                # process attaching at the same time sees a complete header
+                with self._lock:
+                    size = os.fstat(self._file.fileno()).st_size
+                    if size == 0:
+                        self._file.truncate(total_size)
+                    elif size < total_size:
+                        raise RuntimeError(
+                            "Shared cache file %s has %d bytes, but the "
+                            "table needs %d bytes" % (filename, size,
+                                                      total_size))
+                    self._map = mmap.mmap(self._file.fileno(), total_size)
+                    self._setup_table(value_size, new_table=(size == 0))
+            except Exception:
+                self.close()
+                raise
+
+    def _setup_table(self, value_size, new_table):
+        """Check or write the header and create the views of the map"""
+        if not new_table:
+            # compare a copy, so no view of the map is left if this fails
+            header = np.frombuffer(self._map, dtype=_HEADER, count=1).copy()
+            if (header['magic'][0], header['capacity'][0],
+                    header['n_probe'][0], header['value_size'][0]) \
+                    != (_MAGIC, self.capacity, self.n_probe, value_size):
+                raise RuntimeError("Shared cache file %s was created with "
+                                   "different parameters" % self.filename)
+
+        self._header = np.frombuffer(self._map, dtype=_HEADER, count=1)
+        offset = _HEADER_SIZE
+        self._seq = self._array(offset, np.uint64, ())
+        offset += 8 * self.capacity
+        self._stamps = self._array(offset, np.uint64, ())
+        offset += 8 * self.capacity
+        self._keys = self._array(offset, np.uint64, (4,))
+        offset += 32 * self.capacity
+        self._values = self._array(offset, self.dtype, self.value_shape)
+
+        if new_table:
+            header = self._header[0]
+            header['magic'] = _MAGIC
+            header['capacity'] = self.capacity
+            header['n_probe'] = self.n_probe
+            header['value_size'] = value_size
+
+    def _array(self, offset, dtype, shape):
+        return np.frombuffer(
+            self._map, dtype=dtype, count=self.capacity * int(np.prod(shape)),
+            offset=offset
+        ).reshape((self.capacity,) + tuple(shape))
+
+    @property
+    def count(self):
+        return int(np.count_nonzero(self._keys.any(axis=1))), 0
+
+    @property
+    def size(self):
+        return self.capacity, 0
+
+    def __len__(self):
+        return self.count[0]
+
+    def _slots(self, key):
+        """The slots that may hold ``key``"""
+        # UUIDs are counters, so their bits are mixed before taking slots
+        start = _mix(key[3] ^ _mix(key[1] ^ _mix(key[0]))) % self.capacity
+        return [(start + i) % self.capacity for i in range(self.n_probe)]
+
+    @staticmethod
+    def _key(uuid, owner_uuid):
+        return ((owner_uuid >> 64) & _MASK64, owner_uuid & _MASK64,
+                (uuid >> 64) & _MASK64, uuid & _MASK64)
+
+    @staticmethod
+    def _owner_uuid(owner):
+        return 0 if owner is None else owner.__uuid__
+
+    def _lookup(self, uuid, owner_uuid):
+        """Lock-free read; returns None if the key is not in the table"""
+        key = self._key(uuid, owner_uuid)
+        for slot in self._slots(key):
+            for _ in range(self._max_read_attempts):
+                seq = int(self._seq[slot])
+                if seq % 2:
+                    continue  # being written
+                slot_key = tuple(int(part) for part in self._keys[slot])
+                value = self._values[slot].copy()
+                if int(self._seq[slot]) == seq:
+                    break
+            else:
+                return None  # slot is busy: treat as a miss
+            if slot_key == key:
+                return value
+            elif slot_key == (0, 0, 0, 0):
+                return None  # entries are never removed: not in the table
+        return None
+
+    def _find(self, uuid, owner_uuid, reversible):
+        if reversible is None:
+            reversible = self.reversible
+        value = self._lookup(uuid, owner_uuid)
+        if value is None and reversible:
+            value = self._lookup(uuid ^ 1, owner_uuid)
+        return value
+
+    def get_value(self, item, owner=None, reversible=None):
+        """
+        The value of ``item`` for ``owner``
+
+        Parameters
+        ----------
+        item : object with ``__uuid__``
+            the key
+        owner : object with ``__uuid__`` or None
+            the owner of the value
+        reversible : bool or None
+            if `True`, the value of the reversed object is found, too;
+            `None` uses the setting of the table
+
+        Returns
+        -------
+        numpy scalar or numpy.ndarray
+            the value
+
+        Raises
+        ------
+        KeyError
+            if there is no value for the item and owner
+        """
+        value = self._find(item.__uuid__, self._owner_uuid(owner),
+                           reversible)
+        if value is None:
+            self.n_misses += 1
+            raise KeyError(item.__uuid__)
+        self.n_hits += 1
+        return value[()] if value.ndim == 0 else value
+
+    def has_value(self, item, owner=None, reversible=None):
+        """Whether there is a value of ``item`` for ``owner``
+
+        See :meth:`get_value` for the parameters.
+        """
+        return self._find(item.__uuid__, self._owner_uuid(owner),
+                          reversible) is not None
+
+    def __getitem__(self, item):
+        return self.get_value(item)
+
+    def __contains__(self, item):
+        return self.has_value(item)
+
+    def _store(self, key, value):
+        """Write one entry; the write lock must be held"""
+        slots = self._slots(key)
+        target = None
+        for slot in slots:
+            slot_key = tuple(int(part) for part in self._keys[slot])
+            if slot_key == key or slot_key == (0, 0, 0, 0):
+                target = slot
+                break
+        if target is None:
+            # evict the oldest entry of the slots for this key
+            target = min(slots, key=lambda slot: int(self._stamps[slot]))
+
+        header = self._header[0]
+        stamp = int(header['stamp']) + 1
+        header['stamp'] = stamp
+        self._seq[target] += 1
+        self._keys[target] = key
+        self._values[target] = value
+        self._stamps[target] = stamp
+        self._seq[target] += 1
+
+    def _convert(self, value):
+        return np.asarray(value, dtype=self.dtype).reshape(self.value_shape)
+
+    def __setitem__(self, key, value):
+        self.set_many([key], [value])
+
+    def set_many(self, keys, values, owner=None):
+        """
+        Store several values, taking the write lock only once
+
+        Parameters
+        ----------
+        keys : list of objects with ``__uuid__``
+            the keys
+        values : list
+            the values, in the order of the keys; `None` values are skipped
+        owner : object with ``__uuid__`` or None
+            the owner of the values
+        """
+        owner_uuid = self._owner_uuid(owner)
+        entries = [(self._key(key.__uuid__, owner_uuid), self._convert(value))
+                   for (key, value) in zip(keys, values)
+                   if value is not None]
+        if not entries:
+            return
+        with self._lock:
+            for (key, value) in entries:
+                self._store(key, value)
+
+    def clear(self):
+        """Remove all entries (for all processes)"""
+        with self._lock:
+            self._seq += 1
+            self._keys[:] = 0
+            self._stamps[:] = 0
+            self._seq += 1
+
+    def close(self):
+        """Unmap the table (and close the file, if any)"""
+        self._header = self._seq = self._stamps = None
+        self._keys = self._values = None
+        if getattr(self, '_map', None) is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __getstate__(self):
+        raise TypeError("SharedValueCache can't be pickled; it is shared "
+                        "with forked processes or through its file")
@@ -96,7 +96,7 @@ class DictStore(NamedObjectStore):
 
         return obj
 
-    def restore(self):
+    def load_indices(self):
         self.update_name_cache()
 
     def save(self, obj, idx=None):
@@ -1,4 +1,5 @@
 from .object import ObjectStore
+from ..uuid_index import IndexFileHashedList
 
 import logging
 
@@ -14,6 +15,8 @@ class IndexedObjectStore(ObjectStore):
     index is stored. This way you can circumvent holes and keep the file smaller
     """
 
+    index_variable = 'index'
+
     # ==========================================================================
     # LOAD/SAVE DECORATORS FOR CACHE HANDLING
     # ==========================================================================
@@ -109,7 +112,11 @@ class IndexedObjectStore(ObjectStore):
 
         return idx
 
-    def restore(self):
+    def load_indices(self):
+        if isinstance(self.index, IndexFileHashedList):
+            self.index.restore()
+            return
+
         self.index.clear()
         self.index.extend(self.vars['index'][:])
 
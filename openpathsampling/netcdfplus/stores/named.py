@@ -13,6 +13,9 @@ if sys.version_info > (3, ):
 
 
 class NamedObjectStore(ObjectStore):
+    # named objects are few and their names are read at opening anyway
+    persistent_index = False
+
     def __init__(self, content_class, json=True, nestable=False):
         super(NamedObjectStore, self).__init__(
             content_class=content_class,
@@ -61,6 +64,9 @@ class NamedObjectStore(ObjectStore):
         # if not self._names_loaded:
         #     self.update_name_cache()
 
+        if self._restore_pending:
+            self.restore_pending()
+
         return self._name_idx
 
     def load_indices(self):
@@ -172,11 +178,11 @@ class NamedObjectStore(ObjectStore):
             can be empty [] if no objects with that name exist
 
         """
-        return sorted(list(self._name_idx[name]))
+        return sorted(list(self.name_idx[name]))
 
     def find_all(self, name):
-        if len(self._name_idx[name]) > 0:
-            return self[sorted(list(self._name_idx[name]))]
+        if len(self.name_idx[name]) > 0:
+            return self[sorted(list(self.name_idx[name]))]
 
     # ==========================================================================
     # LOAD/SAVE DECORATORS FOR CACHE HANDLING
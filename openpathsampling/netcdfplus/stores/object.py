@@ -6,6 +6,7 @@ from openpathsampling.netcdfplus.base import StorableNamedObject, StorableObject
 from openpathsampling.netcdfplus.cache import MaxCache, Cache, NoCache, \
     WeakLRUCache
 from openpathsampling.netcdfplus.proxy import LoaderProxy
+from openpathsampling.netcdfplus.uuid_index import IndexFileHashedList
 
 from future.utils import iteritems
 
@@ -78,10 +79,17 @@ class ObjectStore(StorableNamedObject):
         or string for named objects. This is only used for cached access
         if caching is not `False`. Must be of type
         :obj:`openpathsampling.netcdfplus.base.StorableObject` or subclassed.
+    persistent_index : bool
+        if `True` the index of this store is kept in an index file if the
+        storage uses index files. See
+        :class:`openpathsampling.netcdfplus.uuid_index.IndexFile`.
 
     """
     _restore_non_initial_attr = False
 
+    persistent_index = True
+    index_variable = 'uuid'
+
     allowed_types = [
         'int', 'float', 'long', 'str', 'bool',
         'numpy.float32', 'numpy.float64',
@@ -171,6 +179,7 @@ class ObjectStore(StorableNamedObject):
         self._cached_all = False
         self.nestable = nestable
         self._created = False
+        self._restore_pending = False
 
         self.attribute_list = {}
         self.cv = {}
@@ -205,6 +214,47 @@ class ObjectStore(StorableNamedObject):
     def is_created(self):
         return self._created
 
+    @property
+    def index(self):
+        """
+        :class:`HashedList` : the indices of all stored objects by uuid. If
+        the storage was opened lazily, the first access loads the indices.
+        """
+        if self._restore_pending:
+            self.restore_pending()
+
+        return self._index
+
+    @index.setter
+    def index(self, value):
+        self._index = value
+
+    @property
+    def attribute_list(self):
+        """
+        dict : the stores of the attributes (e.g. CVs) of the objects in this
+        store. If the storage was opened lazily, the first access adds the
+        stored attributes.
+        """
+        storage = self._storage
+        if storage is not None and storage._attributes_pending:
+            storage.restore_attributes()
+
+        return self._attribute_list
+
+    @attribute_list.setter
+    def attribute_list(self, value):
+        self._attribute_list = value
+
+    def restore_pending(self):
+        """
+        Load the indices if this was deferred when the storage was opened
+        """
+        with self.storage.lock:
+            if self._restore_pending:
+                self._restore_pending = False
+                self.load_indices()
+
     def to_dict(self):
         return {
             'content_class': self.content_class,
@@ -237,12 +287,36 @@ class ObjectStore(StorableNamedObject):
         self.index = self.create_uuid_index()
 
     def create_uuid_index(self):
+        index_file = self.storage.index_file(self)
+        if index_file is not None:
+            return IndexFileHashedList(index_file, self, self.index_variable)
+
         return HashedList()
 
     def restore(self):
+        """
+        Restore the store of an existing file
+
+        This calls :meth:`restore_state` and :meth:`load_indices`.
+        """
+        self.restore_state()
         self.load_indices()
 
+    def restore_state(self):
+        """
+        Restore everything except the indices of the stored objects
+
+        If the storage is opened lazily, only this is run when it is opened
+        and the indices are loaded when they are first used. So this should
+        not read all stored objects.
+        """
+        pass
+
     def load_indices(self):
+        if isinstance(self.index, IndexFileHashedList):
+            self.index.restore()
+            return
+
         self.index.clear()
         self.index.extend(self.vars['uuid'][:])
 
@@ -366,6 +440,43 @@ class ObjectStore(StorableNamedObject):
             else:
                 setattr(obj, attribute, proxy)
 
+    def write_many(self, variable, idx, objs, attribute=None, values=None):
+        """
+        Write an attribute of objects stored at consecutive indices at once
+
+        Parameters
+        ----------
+        variable : str
+            the name of the variable to be written
+        idx : int
+            the index of the first object
+        objs : list of :py:class:`openpathsampling.netcdfplus.base.StorableObject`
+            the objects stored at `idx`, `idx + 1`, ...
+        attribute : str or None
+            the attribute of the objects to be written. If `None` the name
+            of the variable is used
+        values : list or numpy.ndarray or None
+            the values of the attribute of all objects, e.g., as one array
+            with the objects along the first axis. If `None` the values are
+            taken from the objects
+        """
+        if attribute is None:
+            attribute = variable
+
+        var = self.vars[variable]
+        if values is None:
+            values = [getattr(obj, attribute) for obj in objs]
+
+        var.set_many(int(idx), values)
+
+        if var.var_type.startswith('lazy'):
+            for obj, val in zip(objs, values):
+                proxy = var.store.proxy(val)
+                if isinstance(obj, LoaderProxy):
+                    setattr(obj.__subject__, attribute, proxy)
+                else:
+                    setattr(obj, attribute, proxy)
+
     def proxy(self, item):
         """
         Return a proxy of a object for this store
@@ -116,13 +116,29 @@ class ValueStore(ObjectStore):
         self._len = max(self._len, n_idx + 1)
 
     def fill_cache(self):
-        self.cache.load_max()
+        return self.cache.load_max()
 
-    def restore(self):
+    def set_prefetch(self, n_chunks):
+        """
+        Read chunks of values ahead when they are loaded in order
+
+        Parameters
+        ----------
+        n_chunks : int
+            the number of chunks to read ahead. `0` switches read-ahead off.
+
+        """
+        self.cache.set_prefetch(
+            n_chunks,
+            self.storage.prefetcher if n_chunks > 0 else None
+        )
+
+    def load_indices(self):
         if self.allow_incomplete:  # only if partial storage is used
             for pos, idx in enumerate(self.vars['index'][:]):
                 self.index[idx] = pos
 
+    def restore_state(self):
         self._len = len(self)
         self.initialize_cache()
 
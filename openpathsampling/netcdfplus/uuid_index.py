@@ -0,0 +1,459 @@
+"""
+Hash tables on disk that map the UUIDs of stored objects to their indices.
+
+When a file is opened, each store usually reads the UUIDs of all its
+objects to build the index used by ``in``, :meth:`ObjectStore.idx` and
+loading by UUID. For large files this dominates the time to open them. An
+:class:`IndexFile` keeps this mapping in a memory mapped hash table next to
+the netCDF file. It is updated with every saved object, and opening it only
+maps the file, so entries are read from disk when they are looked up.
+
+An :class:`IndexFileHashedList` gives such a table the interface of the
+in-memory index of a store. If the netCDF file was extended without
+updating the table, only the new entries are added when the store is
+restored.
+"""
+
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = 0x4f505349  # 'OPSI'
+_MASK64 = (1 << 64) - 1
+_GOLDEN = 0x9E3779B97F4A7C15
+
+# rows of the table are (uuid high bits, uuid low bits, value code)
+_EMPTY = 0
+_DELETED = 1
+_OFFSET = 2  # value codes of entries are the stored value + _OFFSET
+_HEADER_ROWS = 2  # (magic, count, used), (extent, 0, 0)
+
+
+class IndexFile(object):
+    """
+    Hash table from integer keys of up to 128 bits to non-negative integers
+
+    The table uses open addressing with linear probing and is kept in a
+    numpy ``.npy`` file that is memory mapped, so the file can be opened
+    without reading it. It is resized to twice its capacity once half of the
+    slots are used.
+
+    Parameters
+    ----------
+    filename : str
+        the file to keep the table in. It is created if it does not exist.
+    readonly : bool
+        if `True`, the file is never changed. Changes are kept in memory
+        only.
+    capacity : int
+        the initial number of slots of a new table, a power of 2
+
+    Attributes
+    ----------
+    extent : int
+        one more than the largest position of an entry in the indexed
+        variable, set by the user of the table
+    """
+    def __init__(self, filename, readonly=False, capacity=1024):
+        self.filename = filename
+        self.readonly = readonly
+        self._data = None
+
+        if os.path.exists(filename):
+            data = np.load(
+                filename, mmap_mode='c' if readonly else 'r+')
+            if data.dtype == np.uint64 and data.ndim == 2 and \
+                    data.shape[1] == 3 and int(data[0, 0]) == _MAGIC:
+                self._data = data
+            else:
+                logger.warning(
+                    'Ignoring invalid index file %s' % filename)
+                del data
+
+        if self._data is None:
+            self._data = self._create(capacity)
+
+        self._set_capacity()
+
+    def _create(self, capacity):
+        shape = (capacity + _HEADER_ROWS, 3)
+        if self.readonly:
+            data = np.zeros(shape, dtype=np.uint64)
+        else:
+            data = np.lib.format.open_memmap(
+                self.filename, mode='w+', dtype=np.uint64, shape=shape)
+        data[0, 0] = _MAGIC
+        return data
+
+    def _set_capacity(self):
+        self.capacity = len(self._data) - _HEADER_ROWS
+        self._shift = 64 - (self.capacity.bit_length() - 1)
+
+    @property
+    def count(self):
+        """int : the number of entries"""
+        return int(self._data[0, 1])
+
+    @property
+    def extent(self):
+        return int(self._data[1, 0])
+
+    @extent.setter
+    def extent(self, value):
+        self._data[1, 0] = value
+
+    def __len__(self):
+        return self.count
+
+    def _probe(self, data, hi, lo):
+        """Row holding the key or, if it is missing, the row to put it"""
+        mask = len(data) - _HEADER_ROWS - 1
+        slot = (((hi ^ lo) * _GOLDEN) & _MASK64) >> self._shift
+        free = None
+        while True:
+            row = slot + _HEADER_ROWS
+            r_hi, r_lo, code = data[row].tolist()
+            if code == _EMPTY:
+                return False, row if free is None else free
+            elif code == _DELETED:
+                if free is None:
+                    free = row
+            elif r_hi == hi and r_lo == lo:
+                return True, row
+            slot = (slot + 1) & mask
+
+    @staticmethod
+    def _split(key):
+        key = int(key)
+        return (key >> 64) & _MASK64, key & _MASK64
+
+    def get(self, key, d=None):
+        """
+        Return the value of a key or `d` if the key is not in the table
+        """
+        hi, lo = self._split(key)
+        found, row = self._probe(self._data, hi, lo)
+        if found:
+            return int(self._data[row, 2]) - _OFFSET
+        else:
+            return d
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def set(self, key, value):
+        """
+        Set the value of a key
+
+        Parameters
+        ----------
+        key : int
+            the key, a non-negative integer of up to 128 bits
+        value : int
+            the value, a non-negative integer
+        """
+        hi, lo = self._split(key)
+        data = self._data
+        found, row = self._probe(data, hi, lo)
+        if not found:
+            if int(data[0, 2]) + 1 > self.capacity // 2:
+                self._resize()
+                data = self._data
+                found, row = self._probe(data, hi, lo)
+
+            if int(data[row, 2]) == _EMPTY:
+                data[0, 2] += 1
+            data[0, 1] += 1
+            data[row, 0] = hi
+            data[row, 1] = lo
+
+        data[row, 2] = value + _OFFSET
+
+    def delete(self, key):
+        """
+        Remove a key from the table
+
+        Returns
+        -------
+        int
+            the value the key had
+
+        Raises
+        ------
+        KeyError
+            if the key is not in the table
+        """
+        hi, lo = self._split(key)
+        found, row = self._probe(self._data, hi, lo)
+        if not found:
+            raise KeyError(key)
+
+        value = int(self._data[row, 2]) - _OFFSET
+        self._data[row, 2] = _DELETED
+        self._data[0, 1] -= 1
+        return value
+
+    def clear(self):
+        """
+        Remove all entries
+        """
+        self._data[0, 1:] = 0
+        self._data[1:] = 0
+
+    def _resize(self):
+        # grow if the table is filled with entries, otherwise only remove
+        # the slots of deleted entries
+        capacity = self.capacity
+        if 2 * (self.count + 1) > capacity // 2:
+            capacity *= 2
+
+        old = self._data
+        rows = old[_HEADER_ROWS:]
+        live = rows[rows[:, 2] >= _OFFSET]
+
+        if self.readonly:
+            tmp_filename = None
+            data = np.zeros((capacity + _HEADER_ROWS, 3), dtype=np.uint64)
+        else:
+            tmp_filename = self.filename + '.tmp'
+            data = np.lib.format.open_memmap(
+                tmp_filename, mode='w+', dtype=np.uint64,
+                shape=(capacity + _HEADER_ROWS, 3))
+
+        data[0] = (_MAGIC, len(live), len(live))
+        data[1] = old[1]
+
+        self._data = data
+        self._set_capacity()
+        for hi, lo, code in live.tolist():
+            _, row = self._probe(data, hi, lo)
+            data[row] = (hi, lo, code)
+
+        if tmp_filename is not None:
+            data.flush()
+            del data, old, rows, live
+            self._data = None
+            try:
+                os.rename(tmp_filename, self.filename)
+            except OSError:
+                # on Windows an existing file is not replaced
+                os.remove(self.filename)
+                os.rename(tmp_filename, self.filename)
+
+            self._data = np.load(self.filename, mmap_mode='r+')
+
+        logger.debug('Resized index file %s to %d slots' %
+                     (self.filename, capacity))
+
+    def flush(self):
+        """
+        Write all changes to disk
+        """
+        if not self.readonly and isinstance(self._data, np.memmap):
+            self._data.flush()
+
+
+class IndexFileHashedList(object):
+    """
+    The index of a store kept in an :class:`IndexFile`
+
+    This is used in place of a
+    :class:`openpathsampling.netcdfplus.stores.object.HashedList`. Keys are
+    looked up in the table and the key at a position is read from the
+    variable of the store that holds the keys, so nothing is loaded when
+    the store is opened.
+
+    Parameters
+    ----------
+    index_file : :class:`IndexFile`
+        the table to use
+    store : :class:`openpathsampling.netcdfplus.ObjectStore`
+        the store that is indexed
+    variable : str
+        the name of the variable of the store that holds the keys, usually
+        `uuid`
+    """
+    def __init__(self, index_file, store, variable='uuid'):
+        self._file = index_file
+        self._store = store
+        self._variable = variable
+
+        # marks are not stored, keys saved since the last flush are kept
+        # in case they are not yet written to the variable
+        self._marks = {}
+        self._new = {}
+
+    @property
+    def variable(self):
+        return self._store.vars[self._variable]
+
+    def _read(self, pos):
+        """The key stored at position `pos` in the variable"""
+        return self.variable[pos:pos + 1][0]
+
+    # the following methods are different if keys are stored in pairs
+
+    def _key(self, key):
+        """The key used in the table"""
+        return int(key)
+
+    def _code(self, key, value):
+        """The value in the table for a key and its value and vice versa"""
+        return value
+
+    def _value(self, pos):
+        """The value of the key stored at position `pos`"""
+        return pos
+
+    def _position(self, key, value):
+        """The position and the key stored there for a key and its value"""
+        return value, key
+
+    # interface of the HashedList
+
+    def __len__(self):
+        return self._value(self._file.extent)
+
+    def __contains__(self, key):
+        key = self._key(key)
+        return key in self._marks or key in self._file
+
+    def __getitem__(self, key):
+        k = self._key(key)
+        value = self._file.get(k)
+        if value is None:
+            try:
+                value = self._marks[k]
+            except KeyError:
+                raise KeyError(key)
+
+        return self._code(key, value)
+
+    def get(self, key, d=None):
+        try:
+            return self[key]
+        except KeyError:
+            return d
+
+    def __setitem__(self, key, value):
+        k = self._key(key)
+        if value < 0:
+            self._marks[k] = self._code(key, value)
+            return
+
+        self._file.set(k, self._code(key, value))
+        pos, stored_key = self._position(key, value)
+        self._new[pos] = stored_key
+        if pos >= self._file.extent:
+            self._file.extent = pos + 1
+
+    def __delitem__(self, key):
+        k = self._key(key)
+        if k in self._marks:
+            del self._marks[k]
+            return
+
+        value = self._code(key, self._file.delete(k))
+        pos, _ = self._position(key, value)
+        self._new.pop(pos, None)
+        if pos == self._file.extent - 1:
+            self._file.extent = pos
+
+    def append(self, key):
+        self[key] = self._value(self._file.extent)
+
+    def extend(self, t):
+        for key in t:
+            self.append(key)
+
+    def index(self, value):
+        pos, _ = self._position(0, value)
+        key = self._new.get(pos)
+        if key is None:
+            key = self._read(pos)
+
+        return self._position(key, value)[1]
+
+    def mark(self, key):
+        k = self._key(key)
+        if k not in self:
+            self._marks[k] = -2
+
+    def unmark(self, key):
+        self._marks.pop(self._key(key), None)
+
+    def clear(self):
+        self._file.clear()
+        self._marks = {}
+        self._new = {}
+
+    @property
+    def list(self):
+        """list : the keys by position, read from the variable"""
+        extent = self._file.extent
+        keys = list(self.variable[:extent]) if extent > 0 else []
+        keys.extend(self._new.get(pos) for pos in range(len(keys), extent))
+        for pos, key in self._new.items():
+            if pos < extent:
+                keys[pos] = key
+
+        return keys
+
+    _list = list
+
+    def items(self):
+        for pos, key in enumerate(self.list):
+            if key is not None:
+                yield self._key(key), self._code(key, self._value(pos))
+
+        for item in self._marks.items():
+            yield item
+
+    def __iter__(self):
+        for key, _ in self.items():
+            yield key
+
+    def flush(self):
+        """
+        Write the table to disk
+
+        All saved keys must have been written to the variable before.
+        """
+        self._file.flush()
+        self._new = {}
+
+    def restore(self):
+        """
+        Update the table with all keys in the variable
+
+        Only keys after the last one in the table are read. If the table
+        does not match the variable, it is built again.
+        """
+        length = len(self.variable)
+        extent = self._file.extent
+
+        if extent > length or not self._check(extent - 1):
+            logger.info('Rebuilding index file %s' % self._file.filename)
+            self.clear()
+            extent = 0
+
+        if extent < length:
+            keys = self.variable[extent:length]
+            for pos, key in enumerate(keys, extent):
+                if key is not None:
+                    self[key] = self._value(pos)
+
+            self._file.extent = length
+
+        self._new = {}
+
+    def _check(self, pos):
+        """Is the key at position `pos` in the table at this position"""
+        if pos < 0:
+            return True
+
+        key = self._read(pos)
+        return key is None or self.get(key) == self._value(pos)
@@ -14,6 +14,16 @@ try:
 except NameError:
     xrange = range
 
+
+def _fill_forward(values, mask, initial):
+    """For each index, the value at the most recent index where mask is True
+
+    Indices before the first True of mask get ``initial``.
+    """
+    last = np.maximum.accumulate(np.where(mask, np.arange(len(mask)), -1))
+    return np.where(last >= 0, np.asarray(values)[last], initial)
+
+
 class DirectSimulation(PathSimulator):
     """
     Direct simulation to calculate rates and fluxes.
@@ -77,7 +87,25 @@ class DirectSimulation(PathSimulator):
         self.transition_count = results['transition_count']
         self.flux_events = results['flux_events']
 
-    def run(self, n_steps):
+    def run(self, n_steps, chunk_size=None):
+        """Run the simulation.
+
+        Parameters
+        ----------
+        n_steps : int
+            number of frames to generate
+        chunk_size : int or None
+            if given, frames are generated in chunks of this many frames,
+            and the transitions and flux events of each chunk are found with
+            array operations on the volumes of all frames in the chunk. If
+            there is storage, the frames of each chunk are saved when the
+            chunk is done. Default (None) analyzes every frame as soon as it
+            has been generated.
+        """
+        if chunk_size is not None:
+            self._run_chunked(n_steps, chunk_size)
+            return
+
         most_recent_state = None
         first_interface_exit = {p: -1 for p in self.flux_pairs}
         last_state_visit = {s: -1 for s in self.states}
@@ -134,6 +162,88 @@ class DirectSimulation(PathSimulator):
         if self.storage is not None:
             self.storage.save(local_traj)
 
+    def _run_chunked(self, n_steps, chunk_size):
+        n_states = len(self.states)
+        # state of the bookkeeping at the end of the previous chunk
+        most_recent = -1  # index in self.states
+        last_visit = np.full(n_states, -1)
+        last_entry = np.full(n_states, -1)
+        was_in_interface = {p: False for p in self.flux_pairs}
+        first_interface_exit = {p: -1 for p in self.flux_pairs}
+        state_index = {}
+        for (i, s) in enumerate(self.states):
+            state_index.setdefault(s, i)
+
+        local_traj = paths.Trajectory([self.initial_snapshot])
+        self.engine.current_snapshot = self.initial_snapshot
+        for start in xrange(0, n_steps, chunk_size):
+            n_frames = min(chunk_size, n_steps - start)
+            frames = [self.engine.generate_next_frame()
+                      for _ in xrange(n_frames)]
+            steps = np.arange(start, start + n_frames)
+
+            # the state of each frame is the last of self.states it is in
+            state = np.full(n_frames, -1)
+            for s in self.states:
+                state[s.mask(frames)] = state_index[s]
+            in_state = state >= 0
+
+            # most recent state before / after each frame
+            recent = _fill_forward(state, in_state, most_recent)
+            previous = np.concatenate([[most_recent], recent[:-1]])
+            entry = in_state & (state != previous)
+            for t in np.flatnonzero(entry & (previous >= 0)):
+                self.transition_count.append((self.states[state[t]],
+                                              int(steps[t])))
+
+            visits = {}
+            entries = {}
+            for p in self.flux_pairs:
+                k = state_index[p[0]]
+                if k not in visits:
+                    is_k = state == k
+                    visits[k] = _fill_forward(steps, is_k, last_visit[k])
+                    entries[k] = _fill_forward(steps, is_k & entry,
+                                               last_entry[k])
+                in_interface = p[1].mask(frames)
+                was_in = np.concatenate([[was_in_interface[p]],
+                                         in_interface[:-1]])
+                crossing = was_in & ~in_interface & (recent == k)
+                # only the first crossing after each visit to the state
+                # counts as an exit
+                candidates = np.flatnonzero(crossing)
+                visit = visits[k][candidates]
+                first = np.concatenate([[True], visit[1:] != visit[:-1]])
+                exits = candidates[first & (visit > first_interface_exit[p])]
+                prev_exit = first_interface_exit[p]
+                for t in exits:
+                    if entries[k][t] > prev_exit:
+                        prev_exit = -1  # entered the state since last exit
+                    if prev_exit > 0:
+                        self.flux_events[p].append((int(steps[t]),
+                                                    int(prev_exit)))
+                    prev_exit = steps[t]
+                if entries[k][-1] > prev_exit:
+                    prev_exit = -1
+                first_interface_exit[p] = prev_exit
+                was_in_interface[p] = in_interface[-1]
+
+            for k in range(n_states):
+                is_k = state == k
+                if is_k.any():
+                    last_visit[k] = steps[is_k][-1]
+                    if (is_k & entry).any():
+                        last_entry[k] = steps[is_k & entry][-1]
+            most_recent = recent[-1]
+
+            if self.storage is not None:
+                for frame in frames:
+                    self.storage.snapshots.save(frame)
+                local_traj.extend(frames)
+
+        if self.storage is not None:
+            self.storage.save(local_traj)
+
     @property
     def transitions(self):
         prev_state = None
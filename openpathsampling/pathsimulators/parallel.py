@@ -0,0 +1,314 @@
+"""
+Run independent tasks of a simulation in a pool of worker processes.
+
+The workers are forked from the main process, so they start with copies of
+the simulation and of everything it references (engines, movers, ensembles,
+collective variables), including objects that cannot be pickled, such as
+CVs defined by a lambda. Results are sent back pickled: objects that
+already existed when the pool was started are sent as their UUID and
+replaced by the original object in the main process, so only the new
+objects (snapshots, trajectories, samples, move changes) are transferred.
+
+Workers never touch storage; the main process remains the only writer.
+"""
+
+import io
+import logging
+import multiprocessing
+import os
+import pickle
+import random
+import sys
+
+import numpy as np
+
+try:
+    import copyreg
+except ImportError:  # Python 2
+    import copy_reg as copyreg
+
+from openpathsampling.netcdfplus import (
+    StorableObject, ObjectStore, NetCDFPlus, PseudoAttribute, LoaderProxy,
+    DelayedLoader
+)
+
+logger = logging.getLogger(__name__)
+
+try:
+    _fork_context = multiprocessing.get_context('fork')
+except AttributeError:  # pragma: no cover
+    # Python 2 always forks on POSIX platforms
+    _fork_context = multiprocessing if os.name == 'posix' else None
+except ValueError:  # pragma: no cover
+    _fork_context = None
+
+# state of the pool, set in the main process before forking
+_pool_state = {}
+# state of a worker process, set by the pool initializer
+_worker_state = {}
+
+
+def fork_available():
+    """Whether worker processes can be forked on this platform"""
+    return _fork_context is not None
+
+
+def collect_storable_objects(roots):
+    """Find all storable objects reachable from ``roots``.
+
+    This follows the attributes of storable objects and the contents of
+    lists, tuples, sets, and dicts. Stores and storage files are skipped,
+    as are proxies of objects that have not been loaded.
+
+    Parameters
+    ----------
+    roots : list
+        the objects to start from
+
+    Returns
+    -------
+    dict
+        mapping of UUID to object
+    """
+    found = {}
+    seen = set()
+    stack = list(roots)
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, (ObjectStore, NetCDFPlus, LoaderProxy)):
+            continue
+        if isinstance(obj, StorableObject):
+            found[obj.__uuid__] = obj
+            stack.extend(getattr(obj, '__dict__', {}).values())
+            stack.extend(getattr(obj, '_lazy', {}).values())
+        if isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+    return found
+
+
+def _lazy_attribute_names(cls):
+    """Map the :class:`.DelayedLoader` descriptors of ``cls`` to names"""
+    names = {}
+    for klass in reversed(cls.__mro__):
+        for name, value in vars(klass).items():
+            if isinstance(value, DelayedLoader):
+                names[value] = name
+    return names
+
+
+def _new_object(cls, uuid):
+    # the UUID is set right away, so that the object can be hashed (e.g.,
+    # as a dict key) before its state is restored
+    obj = cls.__new__(cls)
+    obj.__dict__['__uuid__'] = uuid
+    return obj
+
+
+def _set_object_state(obj, state):
+    lazy = state.pop('_lazy', None)
+    obj.__dict__.update(state)
+    if lazy is not None:
+        obj._lazy = {}
+        for (name, value) in lazy.items():
+            setattr(obj, name, value)
+    return obj
+
+
+class _StorableDispatch(dict):
+    """Dispatch table of a pickler that also reduces storable objects.
+
+    Pickler dispatch tables are looked up by the exact class, so the
+    reducer for the subclasses of :class:`.StorableObject` is added when a
+    class is first looked up.
+    """
+    def __init__(self, reduce):
+        super(_StorableDispatch, self).__init__(copyreg.dispatch_table)
+        self._reduce = reduce
+
+    def __missing__(self, cls):
+        if isinstance(cls, type) and issubclass(cls, StorableObject):
+            self[cls] = self._reduce
+            return self._reduce
+        raise KeyError(cls)
+
+    def get(self, cls, d=None):
+        try:
+            return self[cls]
+        except KeyError:
+            return d
+
+
+class _ResultPickler(pickle.Pickler):
+    """Pickler that sends known storable objects by UUID.
+
+    New storable objects are created empty and their ``__dict__`` is sent
+    after the result, in further pickles on the same stream. This restores
+    them without calling ``__setstate__``, which several OPS classes forward
+    to ``__getattr__`` and which breaks the default unpickling.
+    """
+    def __init__(self, file, known):
+        pickle.Pickler.__init__(self, file, pickle.HIGHEST_PROTOCOL)
+        self.known = known
+        self.pending = []
+        self.dispatch_table = _StorableDispatch(self._reduce_storable)
+
+    def persistent_id(self, obj):
+        if isinstance(obj, StorableObject):
+            uuid = obj.__uuid__
+            if self.known.get(uuid) is obj:
+                return uuid
+        return None
+
+    def _reduce_storable(self, obj):
+        state = dict(obj.__dict__)
+        lazy = state.get('_lazy')
+        if lazy is not None:
+            names = _lazy_attribute_names(obj.__class__)
+            state['_lazy'] = {names[desc]: value
+                              for (desc, value) in lazy.items()}
+        self.pending.append((obj, state))
+        items = iter(obj) if isinstance(obj, list) else None
+        return _new_object, (obj.__class__, obj.__uuid__), None, items
+
+    if sys.version_info[0] < 3:  # pragma: no cover
+        # the pure Python pickler of Python 2 has no dispatch_table
+        def save(self, obj):
+            if isinstance(obj, StorableObject) \
+                    and id(obj) not in self.memo \
+                    and self.persistent_id(obj) is None:
+                self.save_reduce(obj=obj, *self._reduce_storable(obj))
+            else:
+                pickle.Pickler.save(self, obj)
+
+    def dump_all(self, obj):
+        """Pickle ``obj`` followed by the states of new storable objects"""
+        self.dump(obj)
+        while self.pending:
+            # objects in the states are only pickled once, as the memo is
+            # kept between the pickles
+            pending, self.pending = self.pending, []
+            self.dump(pending)
+        self.dump(None)
+
+
+class _ResultUnpickler(pickle.Unpickler):
+    def __init__(self, file, known):
+        pickle.Unpickler.__init__(self, file)
+        self.known = known
+
+    def persistent_load(self, pid):
+        return self.known[pid]
+
+    def load_all(self):
+        """Unpickle an object pickled with :meth:`_ResultPickler.dump_all`"""
+        obj = self.load()
+        pending = self.load()
+        while pending is not None:
+            for (new_obj, state) in pending:
+                _set_object_state(new_obj, state)
+            pending = self.load()
+        return obj
+
+
+def dumps_result(result, known):
+    """Pickle ``result``, referring to objects in ``known`` by UUID"""
+    buf = io.BytesIO()
+    _ResultPickler(buf, known).dump_all(result)
+    return buf.getvalue()
+
+
+def loads_result(data, known):
+    """Unpickle data from :func:`.dumps_result`"""
+    return _ResultUnpickler(io.BytesIO(data), known).load_all()
+
+
+def _detach_stores(known):
+    # CVs in a forked process must not read from the (shared) storage file
+    for obj in known.values():
+        if isinstance(obj, PseudoAttribute) and obj.stores:
+            obj.stores = []
+            obj._update_store_dict()
+
+
+def _init_worker(counter):
+    with counter.get_lock():
+        worker_index = counter.value
+        counter.value += 1
+    StorableObject.initialize_uuid()
+    _worker_state.update(_pool_state)
+    _worker_state['index'] = worker_index
+    _detach_stores(_worker_state['known'])
+    setup = _worker_state['setup']
+    if setup is not None:
+        setup(worker_index)
+
+
+def _run_task(seeded_task):
+    seed, task = seeded_task
+    random.seed(seed)
+    np.random.seed(seed)
+    result = _worker_state['function'](task)
+    return dumps_result(result, _worker_state['known'])
+
+
+class WorkerPool(object):
+    """Pool of forked processes that run the tasks of a simulation.
+
+    Each task gets its own random seed, drawn in the main process, which
+    seeds both :mod:`random` and :mod:`numpy.random` in the worker.
+
+    Parameters
+    ----------
+    function : callable
+        function run in the workers; takes one task and returns the result.
+        This is not pickled, so it can be, e.g., a bound method.
+    roots : list
+        objects the results may refer to; everything reachable from these
+        is sent back by UUID instead of being copied
+    n_workers : int
+        number of worker processes
+    setup : callable or None
+        called in each worker process as ``setup(worker_index)`` before it
+        runs any tasks, where ``worker_index`` counts from 0
+    """
+    def __init__(self, function, roots, n_workers, setup=None):
+        if not fork_available():
+            raise RuntimeError("Parallel runs need a platform that "
+                               "supports fork")
+        self.function = function
+        self.n_workers = n_workers
+        self.setup = setup
+        self.known = collect_storable_objects(roots)
+
+    def imap(self, tasks):
+        """Run the tasks; yields the results in the order of the tasks.
+
+        Parameters
+        ----------
+        tasks : list
+            the tasks; must be picklable
+
+        Yields
+        ------
+        the results of ``function(task)``
+        """
+        seeded_tasks = [(random.getrandbits(32), task) for task in tasks]
+        _pool_state.update(function=self.function, known=self.known,
+                           setup=self.setup)
+        counter = _fork_context.Value('i', 0)
+        pool = _fork_context.Pool(self.n_workers, _init_worker, (counter,))
+        _pool_state.clear()
+        logger.info("Started %d worker processes", self.n_workers)
+        try:
+            for data in pool.imap(_run_task, seeded_tasks):
+                yield loads_result(data, self.known)
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
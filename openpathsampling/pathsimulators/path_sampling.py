@@ -49,6 +49,8 @@ class PathSampling(PathSimulator):
                                ['move_scheme', 'sample_set'])
         self.live_visualizer = None
         self.status_update_frequency = 1
+        self._write_behind = None
+        self._storage_writer = None
 
         if initialize:
             samples = []
@@ -104,13 +106,69 @@ class PathSampling(PathSimulator):
     def current_step(self):
         return self._current_step
 
+    def sync_storage(self):
+        """
+        Will sync all collective variables and the storage to disk
+
+        With write-behind, the sync is done after all steps saved before.
+        """
+        if self.storage is not None and self._storage_writer is not None:
+            self._storage_writer.sync()
+        else:
+            super(PathSampling, self).sync_storage()
+
+    def set_write_behind(self, max_queued=4):
+        """
+        Save steps in a background thread while the simulation goes on
+
+        During :meth:`run`, the MC steps are handed to a
+        :class:`openpathsampling.storage.StorageWriter` that saves them in
+        order. If more than `max_queued` steps are waiting, the simulation
+        waits for the writer. All other access to the storage must hold the
+        lock of the storage while the writer is used. The writer is closed,
+        after saving all waiting steps, when :meth:`run` returns.
+
+        Parameters
+        ----------
+        max_queued : int or None
+            the maximal number of steps waiting to be saved. `None` saves
+            all waiting steps and switches back to saving each step
+            immediately.
+        """
+        running = self._storage_writer is not None
+        self._close_storage_writer()
+        self._write_behind = max_queued
+        if running:
+            self._open_storage_writer()
+
+    def _open_storage_writer(self):
+        if self._write_behind is not None and self.storage is not None:
+            self._storage_writer = paths.storage.StorageWriter(
+                self.storage, self._write_behind)
+
+    def _close_storage_writer(self):
+        if self._storage_writer is not None:
+            writer = self._storage_writer
+            self._storage_writer = None
+            writer.close()
+
+    def flush_storage(self):
+        """
+        Wait until all steps handed to the storage are saved
+        """
+        if self._storage_writer is not None:
+            self._storage_writer.flush()
+
     def save_current_step(self):
         """
         Save the current step to the storage
 
         """
         if self.storage is not None and self._current_step is not None:
-            self.storage.steps.save(self._current_step)
+            if self._storage_writer is not None:
+                self._storage_writer.save(self._current_step)
+            else:
+                self.storage.steps.save(self._current_step)
 
     @classmethod
     def from_step(cls, storage, step, initialize=True):
@@ -172,7 +230,13 @@ class PathSampling(PathSimulator):
                 'instead.')
 
         if storage is not None:
-            self.storage = storage
+            if self._storage_writer is not None:
+                # keep writing behind, but to the new storage
+                self._close_storage_writer()
+                self.storage = storage
+                self._open_storage_writer()
+            else:
+                self.storage = storage
 
         self.step = step.mccycle
         self.sample_set = step.active
@@ -230,6 +294,23 @@ class PathSampling(PathSimulator):
         self.output_stream = original_output_stream
 
     def run(self, n_steps):
+        # with write-behind, the steps handed over so far are saved even if
+        # the simulation fails or is interrupted
+        self._open_storage_writer()
+        completed = False
+        try:
+            self._run(n_steps)
+            completed = True
+        finally:
+            try:
+                self._close_storage_writer()
+            except Exception as e:
+                if completed:
+                    raise
+                # the error of the simulation is the one to report
+                logger.error("Saving the steps failed as well: %s" % e)
+
+    def _run(self, n_steps):
         mcstep = None
 
         # cvs = list()
@@ -3,6 +3,7 @@ import openpathsampling as paths
 
 logger = logging.getLogger(__name__)
 from .path_simulator import PathSimulator, MCStep
+from .parallel import WorkerPool
 
 class ShootFromSnapshotsSimulation(PathSimulator):
     """
@@ -94,7 +95,8 @@ class ShootFromSnapshotsSimulation(PathSimulator):
         return obj
 
 
-    def run(self, n_per_snapshot, as_chain=False):
+    def run(self, n_per_snapshot, as_chain=False, n_workers=1,
+            engines=None):
         """Run the simulation.
 
         Parameters
@@ -107,54 +109,133 @@ class ShootFromSnapshotsSimulation(PathSimulator):
             input to the modifier is the previous (modified) snapshot.
             Useful for modifications that can't cover the whole range from a
             given snapshot.
+        n_workers : int
+            number of processes to run shots in. If greater than 1, the
+            shots are run in parallel in forked worker processes (see
+            Notes).
+        engines : list of :class:`.DynamicsEngine` or None
+            engines for the worker processes; worker ``i`` uses
+            ``engines[i % len(engines)]``. Default (None) uses
+            ``self.engine`` in all workers.
+
+        Notes
+        -----
+        In a parallel run, each shot (or, with ``as_chain``, each initial
+        snapshot) is an independent task. The steps are saved by the main
+        process in the same order, and with the same MC cycle numbers, as in
+        a serial run, but each task uses its own random seed, so the
+        trajectories themselves differ from those of a serial run with
+        stochastic dynamics or randomizers. Worker processes do not use the
+        storage: initial snapshots must be loaded, and CV values cached on
+        disk are recalculated in the workers when needed.
         """
         self.step = 0
-        snap_num = 0
         self.output_stream.write("\n")
-        for snapshot in self.initial_snapshots:
-            start_snap = snapshot
-            # do what we need to get the snapshot set up
-            for step in range(n_per_snapshot):
-                paths.tools.refresh_output(
-                    "Working on snapshot %d / %d; shot %d / %d\n" % (
-                        snap_num+1, len(self.initial_snapshots),
-                        step+1, n_per_snapshot
-                    ),
-                    output_stream=self.output_stream,
-                    refresh=self.allow_refresh
-                )
-
-                if as_chain:
-                    start_snap = self.randomizer(start_snap)
-                else:
-                    start_snap = self.randomizer(snapshot)
-
-                sample_set = paths.SampleSet([
-                    paths.Sample(replica=0,
-                                 trajectory=paths.Trajectory([start_snap]),
-                                 ensemble=self.starting_ensemble)
-                ])
-                sample_set.sanity_check()
-                new_pmc = self.mover.move(sample_set)
-                samples = new_pmc.results
-                new_sample_set = sample_set.apply_samples(samples)
-
-                mcstep = MCStep(
-                    simulation=self,
-                    mccycle=self.step,
-                    previous=sample_set,
-                    active=new_sample_set,
-                    change=new_pmc
-                )
-
-                if self.storage is not None:
-                    self.storage.steps.save(mcstep)
-                    if self.step % self.save_frequency == 0:
-                        self.sync_storage()
-
-                self.step += 1
-            snap_num += 1
+        if n_workers > 1:
+            steps = self._parallel_shots(n_per_snapshot, as_chain,
+                                         n_workers, engines)
+        else:
+            steps = self._serial_shots(n_per_snapshot, as_chain)
+
+        for (snap_num, shot_num, sample_set, new_pmc) in steps:
+            paths.tools.refresh_output(
+                "Working on snapshot %d / %d; shot %d / %d\n" % (
+                    snap_num+1, len(self.initial_snapshots),
+                    shot_num+1, n_per_snapshot
+                ),
+                output_stream=self.output_stream,
+                refresh=self.allow_refresh
+            )
+
+            mcstep = MCStep(
+                simulation=self,
+                mccycle=self.step,
+                previous=sample_set,
+                active=sample_set.apply_samples(new_pmc.results),
+                change=new_pmc
+            )
+
+            if self.storage is not None:
+                self.storage.steps.save(mcstep)
+                if self.step % self.save_frequency == 0:
+                    self.sync_storage()
+
+            self.step += 1
+
+    def _shoot(self, start_snap):
+        """Run a single shot from ``start_snap``.
+
+        Returns
+        -------
+        sample_set : :class:`.SampleSet`
+            the sample set with the initial snapshot
+        change : :class:`.MoveChange`
+            the result of the move
+        """
+        sample_set = paths.SampleSet([
+            paths.Sample(replica=0,
+                         trajectory=paths.Trajectory([start_snap]),
+                         ensemble=self.starting_ensemble)
+        ])
+        sample_set.sanity_check()
+        return sample_set, self.mover.move(sample_set)
+
+    def _shots_from_snapshot(self, snap_num, shot_nums, as_chain):
+        """Run shots from one initial snapshot.
 
+        Yields tuples (snap_num, shot_num, sample_set, change).
+        """
+        snapshot = self.initial_snapshots[snap_num]
+        start_snap = snapshot
+        for shot_num in shot_nums:
+            if as_chain:
+                start_snap = self.randomizer(start_snap)
+            else:
+                start_snap = self.randomizer(snapshot)
+            yield (snap_num, shot_num) + self._shoot(start_snap)
+
+    def _serial_shots(self, n_per_snapshot, as_chain):
+        for snap_num in range(len(self.initial_snapshots)):
+            for shot in self._shots_from_snapshot(
+                    snap_num, range(n_per_snapshot), as_chain):
+                yield shot
+
+    def _run_task(self, task):
+        # run in the worker processes
+        (snap_num, shot_nums, as_chain) = task
+        return list(self._shots_from_snapshot(snap_num, shot_nums,
+                                              as_chain))
+
+    def _setup_worker(self, worker_index, engines):
+        # run in each worker process before its first task
+        engine = engines[worker_index % len(engines)]
+        self.engine = engine
+        paths.EngineMover.default_engine = engine
+        for mover in self.mover:
+            if isinstance(mover, paths.EngineMover):
+                mover.engine = engine
+
+    def _parallel_shots(self, n_per_snapshot, as_chain, n_workers, engines):
+        if engines is None:
+            engines = [self.engine]
+        if as_chain:
+            # shots in a chain depend on each other: one task per snapshot
+            tasks = [(snap_num, list(range(n_per_snapshot)), True)
+                     for snap_num in range(len(self.initial_snapshots))]
+        else:
+            tasks = [(snap_num, [shot_num], False)
+                     for snap_num in range(len(self.initial_snapshots))
+                     for shot_num in range(n_per_snapshot)]
+
+        pool = WorkerPool(
+            function=self._run_task,
+            roots=[self, engines],
+            n_workers=n_workers,
+            setup=lambda index: self._setup_worker(index, engines)
+        )
+        for shots in pool.imap(tasks):
+            for shot in shots:
+                yield shot
 
 
 class CommittorSimulation(ShootFromSnapshotsSimulation):
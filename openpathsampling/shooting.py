@@ -1,3 +1,4 @@
+import collections
 import math
 import logging
 
@@ -10,6 +11,26 @@ init_log = logging.getLogger('openpathsampling.initialization')
 
 
 class ShootingPointSelector(StorableNamedObject):
+    """
+    Selects the shooting point of a trajectory with a given bias
+
+    The bias of each snapshot is given by :meth:`f`. The generic
+    implementations of :meth:`pick`, :meth:`sum_bias` and
+    :meth:`probability` use the cumulative biases of the trajectory, which
+    are kept for the last trajectories used, so that the biases are not
+    recomputed when the same trajectory is used again (as in a shooting
+    move, which picks from the old trajectory and then compares the
+    probabilities for the old and the new one). Subclasses with biases
+    that depend on parameters must return these from :meth:`_bias_key`.
+    """
+
+    # number of trajectories whose cumulative biases are kept
+    _max_cached_trajectories = 2
+
+    def __init__(self):
+        super(ShootingPointSelector, self).__init__()
+        self._cumulative_cache = collections.OrderedDict()
+
     def f(self, snapshot, trajectory):
         """
         Returns the unnormalized proposal probability of a snapshot
@@ -37,9 +58,38 @@ class ShootingPointSelector(StorableNamedObject):
         """
         Returns a list of unnormalized proposal probabilities for all
         snapshots in trajectory
+
+        Subclasses can override this to compute all biases at once
         """
         return [self.f(s, trajectory) for s in trajectory]
 
+    def _bias_key(self):
+        """
+        Returns the parameters the biases depend on
+
+        Cached cumulative biases are only used while these are unchanged.
+        """
+        return ()
+
+    def _cumulative_biases(self, trajectory):
+        """
+        Returns the cumulative sum of the biases of all snapshots in
+        trajectory as a numpy array
+        """
+        cache = self._cumulative_cache
+        key = (self._bias_key(),
+               tuple(snapshot.__uuid__ for snapshot in trajectory))
+        cumulative = cache.pop(key, None)
+        if cumulative is None:
+            cumulative = np.cumsum(
+                np.asarray(self._biases(trajectory), dtype=float))
+            while len(cache) >= self._max_cached_trajectories:
+                cache.popitem(last=False)
+
+        # the most recently used trajectory is last
+        cache[key] = cumulative
+        return cumulative
+
     def sum_bias(self, trajectory):
         """
         Returns the unnormalized probability probability of a trajectory.
@@ -56,7 +106,10 @@ class ShootingPointSelector(StorableNamedObject):
         by `probability(old_trajectory) / probability(new_trajectory)`
         """
 
-        return sum(self._biases(trajectory))
+        if len(trajectory) == 0:
+            return 0.0
+
+        return float(self._cumulative_biases(trajectory)[-1])
 
     def pick(self, trajectory):
         """
@@ -64,21 +117,16 @@ class ShootingPointSelector(StorableNamedObject):
 
         Notes
         -----
-        The native implementation is very slow. Simple picking algorithm
-        should override this function.
+        The snapshot is found by a binary search in the cumulative biases.
+        Simple picking algorithms should still override this function.
         """
 
-        prob_list = self._biases(trajectory)
-        sum_bias = sum(prob_list)
+        cumulative = self._cumulative_biases(trajectory)
 
-        rand = np.random.random() * sum_bias
-        idx = 0
-        prob = prob_list[0]
-        while prob <= rand and idx < len(prob_list):
-            idx += 1
-            prob += prob_list[idx]
+        rand = np.random.random() * cumulative[-1]
+        idx = int(np.searchsorted(cumulative, rand, side='right'))
 
-        return idx
+        return min(idx, len(cumulative) - 1)
 
 
 class GaussianBiasSelector(ShootingPointSelector):
@@ -119,6 +167,15 @@ class GaussianBiasSelector(ShootingPointSelector):
         l_s = self.collectivevariable(snapshot)
         return math.exp(-self.alpha * (l_s - self.l_0) ** 2)
 
+    def _bias_key(self):
+        return (self.collectivevariable.__uuid__, self.alpha, self.l_0)
+
+    def _biases(self, trajectory):
+        # a single call of the CV for all snapshots
+        l_s = np.asarray(self.collectivevariable(trajectory), dtype=float)
+        return np.exp(-self.alpha * (l_s.reshape(len(trajectory))
+                                     - self.l_0) ** 2)
+
 
 class UniformSelector(ShootingPointSelector):
     """
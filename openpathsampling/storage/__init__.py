@@ -7,4 +7,6 @@ from .stores import (
 
 from .storage import Storage, AnalysisStorage
 
+from .writer import StorageWriter
+
 from .util import join_md_storage, split_md_storage
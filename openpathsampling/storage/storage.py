@@ -41,7 +41,9 @@ class Storage(NetCDFPlus):
             filename,
             mode=None,
             template=None,
-            fallback=None):
+            fallback=None,
+            index_files=None,
+            lazy=False):
         """
         Create a netCDF+ storage for OPS Objects
 
@@ -55,13 +57,23 @@ class Storage(NetCDFPlus):
         template : :class:`openpathsampling.Snapshot`
             a Snapshot instance that contains a reference to a Topology, the
             number of atoms and used units
+        index_files : bool or None
+            if `True` keep the indices of stores in files next to the storage
+            so it opens without reading all uuids. If `None` (default) these
+            are used if they exist. See
+            :class:`openpathsampling.netcdfplus.NetCDFPlus`.
+        lazy : bool
+            if `True` load the indices of the stores of an existing file
+            only when they are first used. Default is `False`.
         """
 
         self._template = template
         super(Storage, self).__init__(
             filename,
             mode,
-            fallback=fallback)
+            fallback=fallback,
+            index_files=index_files,
+            lazy=lazy)
 
     def _create_simplifier(self):
         super(Storage, self)._create_simplifier()
@@ -1,4 +1,5 @@
-from openpathsampling.netcdfplus import VariableStore
+from openpathsampling.engines import ArrayTrajectory
+from openpathsampling.netcdfplus import VariableStore, LoaderProxy
 from openpathsampling.pathsimulators import MCStep
 
 
@@ -9,6 +10,37 @@ class MCStepStore(VariableStore):
             ['simulation', 'mccycle', 'previous', 'active', 'change']
         )
 
+    def save(self, obj, idx=None):
+        if obj.__uuid__ not in self.index and \
+                not isinstance(obj, LoaderProxy):
+            self._save_snapshots(obj)
+
+        return super(MCStepStore, self).save(obj, idx)
+
+    def _save_snapshots(self, step):
+        # write the snapshots of all new trajectories in the step at once
+        # before the step is saved trajectory by trajectory
+        samples = []
+        if step.active is not None:
+            samples.extend(step.active)
+        if step.change is not None:
+            samples.extend(step.change.trials)
+
+        index = self.storage.trajectories.index
+        trajectories = [sample.trajectory for sample in samples
+                        if sample.trajectory.__uuid__ not in index]
+
+        # an ArrayTrajectory is written from its buffers
+        snapshots = []
+        for trajectory in trajectories:
+            if isinstance(trajectory, ArrayTrajectory):
+                self.storage.snapshots.save_many(trajectory)
+            else:
+                snapshots.extend(trajectory.iter_proxies())
+
+        if snapshots:
+            self.storage.snapshots.save_many(snapshots)
+
     def initialize(self, units=None):
         super(MCStepStore, self).initialize()
 
@@ -154,6 +154,54 @@ class BaseSnapshotStore(IndexedObjectStore):
 
         return idx
 
+    def save_many(self, objs, idxs):
+        """
+        Save snapshots that are not in this store yet with single writes
+
+        All snapshots get consecutive positions in this store, so every
+        variable is written only once for all of them.
+
+        Parameters
+        ----------
+        objs : list of :obj:`openpathsampling.engines.BaseSnapshot`
+            the snapshots to be saved
+        idxs : list of int
+            the indices of the snapshots in the
+            :class:`openpathsampling.storage.stores.SnapshotWrapperStore`
+
+        Returns
+        -------
+        list of int
+            the given indices
+        """
+        positions = [idx // 2 for idx in idxs]
+
+        n_idx = len(self.index)
+
+        # mark as saved so circular dependencies will not cause infinite loops
+        self.index.extend(positions)
+
+        logger.debug('Saving %d snapshots using IDX #%d to #%d' %
+                     (len(objs), n_idx, n_idx + len(objs) - 1))
+
+        try:
+            self._set_many(n_idx, objs)
+            self.vars['index'].set_many(n_idx, positions)
+
+        except:
+            logger.debug('Problem saving from %d !' % n_idx)
+            # in case we did not succeed remove the marks as being saved
+            for pos in positions:
+                del self.index[pos]
+            raise
+
+        for pos, obj in enumerate(objs):
+            self.cache[n_idx + pos] = obj
+
+        self.vars['uuid'].set_many(n_idx, [obj.__uuid__ for obj in objs])
+
+        return idxs
+
     def _save(self, snapshot, idx):
         """
         Add the current state of the snapshot in the database.
@@ -182,8 +230,9 @@ class BaseSnapshotStore(IndexedObjectStore):
     def _set(self, idx, snapshot):
         pass
 
-    def load_indices(self):
-        self.index.extend(self.vars['index'])
+    def _set_many(self, idx, snapshots):
+        for pos, snapshot in enumerate(snapshots):
+            self._set(idx + pos, snapshot)
 
     def all(self):
         return peng.Trajectory(map(self.proxy, self.index.list))
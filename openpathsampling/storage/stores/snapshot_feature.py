@@ -1,5 +1,7 @@
 import logging
 
+from openpathsampling.engines import ArrayTrajectory
+
 from .snapshot_base import BaseSnapshotStore
 
 logger = logging.getLogger(__name__)
@@ -25,6 +27,16 @@ class FeatureSnapshotStore(BaseSnapshotStore):
     def _set(self, idx, snapshot):
         [self.write(attr, idx, snapshot) for attr in self.storables]
 
+    def _set_many(self, idx, snapshots):
+        # features in the buffers of an ArrayTrajectory are written from
+        # these instead of the arrays of the single snapshots
+        buffers = {}
+        if isinstance(snapshots, ArrayTrajectory):
+            buffers = snapshots.buffers
+
+        [self.write_many(attr, idx, snapshots, values=buffers.get(attr))
+         for attr in self.storables]
+
     def _get(self, idx, snapshot):
         [setattr(snapshot, attr, self.vars[attr][idx])
          for attr in self.storables]
@@ -1,9 +1,11 @@
 import logging
+from collections import OrderedDict
 from uuid import UUID
 
 import openpathsampling.engines as peng
 from openpathsampling.netcdfplus import ObjectStore, \
     NetCDFPlus, LoaderProxy
+from openpathsampling.netcdfplus.uuid_index import IndexFileHashedList
 
 from .snapshot_feature import FeatureSnapshotStore
 from .snapshot_value import SnapshotValueStore
@@ -17,6 +19,17 @@ logger = logging.getLogger(__name__)
 init_log = logging.getLogger('openpathsampling.initialization')
 
 
+def _frames(trajectory, frames):
+    """
+    Frames of an ArrayTrajectory, using views of its buffers if possible
+    """
+    first, last = frames[0], frames[-1] + 1
+    if frames == list(range(first, last)):
+        return trajectory[first:last]
+    else:
+        return trajectory[frames]
+
+
 class ReversalHashedList(dict):
     def __init__(self):
         dict.__init__(self)
@@ -78,6 +91,26 @@ class ReversalHashedList(dict):
         return self._list
 
 
+class IndexFileReversalHashedList(IndexFileHashedList):
+    """
+    The index of snapshot pairs kept in an index file
+
+    Like :class:`ReversalHashedList` only one entry is stored per pair of a
+    snapshot and its reversed copy.
+    """
+    def _key(self, key):
+        return int(key) & ~1
+
+    def _code(self, key, value):
+        return value ^ (key & 1)
+
+    def _value(self, pos):
+        return pos * 2
+
+    def _position(self, key, value):
+        return value // 2, key ^ (value & 1)
+
+
 class SnapshotWrapperStore(ObjectStore):
     """
     A Store to store arbitrary snapshots
@@ -292,8 +325,8 @@ class SnapshotWrapperStore(ObjectStore):
 
         return description
 
-    def restore(self):
-        super(SnapshotWrapperStore, self).restore()
+    def restore_state(self):
+        super(SnapshotWrapperStore, self).restore_state()
 
         for idx, store in enumerate(self.storage.vars['snapshottype']):
             self.type_list[store.descriptor] = (store, idx)
@@ -379,6 +412,133 @@ class SnapshotWrapperStore(ObjectStore):
 
         return self.reference(obj)
 
+    def save_many(self, snapshots):
+        """
+        Save several snapshots, writing all new ones at once
+
+        Snapshots that are not in the storage yet are written to their
+        snapshot stores with a single write per variable, the same holds for
+        their uuids and store indices and the values of CVs that are stored
+        for all snapshots. All other snapshots, like proxies or mentioned
+        snapshots, are saved one by one using :meth:`save`.
+
+        Parameters
+        ----------
+        snapshots : iterable of :obj:`openpathsampling.engines.BaseSnapshot`
+            the snapshots to be saved. The new snapshots of an
+            :obj:`openpathsampling.engines.ArrayTrajectory` are written from
+            its buffers.
+
+        Returns
+        -------
+        list of int
+            the references of the snapshots in the given order
+
+        """
+        trajectory = None
+        if isinstance(snapshots, peng.ArrayTrajectory):
+            trajectory = snapshots
+            snapshots = snapshots.as_proxies()
+        else:
+            snapshots = list(snapshots)
+
+        if self.only_mention:
+            return [self.save(snapshot) for snapshot in snapshots]
+
+        seen = set()
+        new = []
+        frames = []
+        indexed = []
+        for frame, snapshot in enumerate(snapshots):
+            if isinstance(snapshot, LoaderProxy) or \
+                    not isinstance(snapshot, self.content_class):
+                continue
+
+            # a snapshot and its reversed copy share one place in the store
+            key = snapshot.__uuid__ & ~1
+            if key in seen:
+                continue
+
+            seen.add(key)
+            n_idx = self.index.get(snapshot.__uuid__)
+
+            if n_idx is not None:
+                if n_idx >= 0:
+                    indexed.append(n_idx // 2)
+            elif snapshot.engine.descriptor in self.type_list:
+                new.append(snapshot)
+                frames.append(frame)
+            else:
+                # the first snapshot of a new type creates its store
+                self.save(snapshot)
+
+        # check with a single read which of the known snapshots are stored
+        # and not only mentioned
+        stored = set()
+        if indexed:
+            indexed = sorted(indexed)
+            store_idxs = self.variables['store'][indexed]
+            stored.update(
+                pos for pos, store_idx in zip(indexed, store_idxs)
+                if store_idx >= 0
+            )
+
+        if new:
+            n_idx = len(self.index)
+            if trajectory is not None:
+                new = _frames(trajectory, frames)
+            self._save_many(new, n_idx)
+            stored.update(range(n_idx // 2, n_idx // 2 + len(new)))
+
+        references = []
+        for snapshot in snapshots:
+            n_idx = None
+            if not isinstance(snapshot, LoaderProxy):
+                n_idx = self.index.get(snapshot.__uuid__)
+
+            if n_idx is not None and n_idx // 2 in stored:
+                references.append(self.reference(snapshot))
+            else:
+                references.append(self.save(snapshot))
+
+        return references
+
+    def _save_many(self, snapshots, n_idx):
+        # snapshots of the same type are put next to each other so that
+        # each snapshot store writes a single block
+        groups = OrderedDict()
+        for pos, snapshot in enumerate(snapshots):
+            groups.setdefault(snapshot.engine.descriptor, []).append(pos)
+
+        if len(groups) == 1:
+            # keep the buffers of an ArrayTrajectory
+            groups = OrderedDict((descriptor, snapshots)
+                                 for descriptor in groups)
+        else:
+            snapshots = list(snapshots)
+            groups = OrderedDict(
+                (descriptor, [snapshots[pos] for pos in group])
+                for (descriptor, group) in groups.items())
+            snapshots = sum(groups.values(), [])
+
+        uuids = [snapshot.__uuid__ for snapshot in snapshots]
+        self.index.extend(uuids)
+
+        store_idxs = []
+        idx = n_idx
+        for descriptor, group in groups.items():
+            store, store_idx = self.type_list[descriptor]
+            store.save_many(group, range(idx, idx + 2 * len(group), 2))
+            store_idxs.extend([store_idx] * len(group))
+            idx += 2 * len(group)
+
+        self.vars['store'].set_many(n_idx // 2, store_idxs)
+        self._auto_complete_snapshots(snapshots, n_idx)
+        self.vars['uuid'].set_many(n_idx // 2, uuids)
+
+        for pos, snapshot in enumerate(snapshots):
+            self.cache[n_idx + 2 * pos] = snapshot
+
     def _save(self, obj, n_idx):
         try:
             store, store_idx = self.type_list[obj.engine.descriptor]
@@ -420,7 +580,7 @@ class SnapshotWrapperStore(ObjectStore):
     def _auto_complete_single_snapshot(self, obj, pos):
         for cv, cv_store in self.attribute_list.items():
             if not cv_store.allow_incomplete:
-                value = cv._cache_dict._get(obj)
+                value = cv._cache_dict._get_silent(obj)
                 if value is None:
                     # not in cache so compute it if possible
                     if cv._eval_dict:
@@ -438,6 +598,41 @@ class SnapshotWrapperStore(ObjectStore):
                         cv_store.vars['value'][n_idx] = value
                         cv_store.cache[n_idx] = value
 
+    def _auto_complete_snapshots(self, objs, pos):
+        # objs are stored at consecutive positions starting at pos
+        for cv, cv_store in self.attribute_list.items():
+            if cv_store.allow_incomplete:
+                continue
+
+            values = [cv._cache_dict._get_silent(obj) for obj in objs]
+            missing = [idx for idx, value in enumerate(values)
+                       if value is None]
+
+            if len(missing) == len(objs):
+                # all of them, so CVs can use the buffers of the snapshots
+                missing = objs
+            else:
+                missing = [objs[idx] for idx in missing]
+
+            if missing and cv._eval_dict:
+                # not in cache so compute all of them at once
+                computed = iter(cv._eval_dict(missing))
+                values = [next(computed) if value is None else value
+                          for value in values]
+
+            # complete stores are always time reversible and have one value
+            # per pair of snapshots
+            n_idx = pos // 2
+            if all(value is not None for value in values):
+                cv_store.vars['value'].set_many(n_idx, values)
+                for idx, value in enumerate(values):
+                    cv_store.cache[n_idx + idx] = value
+            else:
+                for idx, value in enumerate(values):
+                    if value is not None:
+                        cv_store.vars['value'][n_idx + idx] = value
+                        cv_store.cache[n_idx + idx] = value
+
     def complete_cv(self, cv):
         """
         Compute all missing values of a CV and store them
@@ -474,7 +669,7 @@ class SnapshotWrapperStore(ObjectStore):
                     proxy = self.storage.snapshots[idx]
 
                     # get from cache first, this is fastest
-                    value = cv._cache_dict._get(proxy)
+                    value = cv._cache_dict._get_silent(proxy)
 
                     if value is None:
                         # not in cache so compute it if possible
@@ -503,7 +698,7 @@ class SnapshotWrapperStore(ObjectStore):
                             proxy = proxy.reversed
 
                         # get from cache first, this is fastest
-                        value = cv._cache_dict._get(proxy)
+                        value = cv._cache_dict._get_silent(proxy)
 
                         if value is None:
                             # not in cache so compute it if possible
@@ -691,7 +886,7 @@ class SnapshotWrapperStore(ObjectStore):
             for pos, idx in enumerate(indices):
 
                 proxy = LoaderProxy.new(self.storage.snapshots, idx)
-                value = cv._cache_dict._get(proxy)
+                value = cv._cache_dict._get_silent(proxy)
 
                 if value is None:
                     # not in cache so compute it if possible
@@ -708,6 +903,10 @@ class SnapshotWrapperStore(ObjectStore):
         return store
 
     def create_uuid_index(self):
+        index_file = self.storage.index_file(self)
+        if index_file is not None:
+            return IndexFileReversalHashedList(index_file, self)
+
         return ReversalHashedList()
 
     def _get_id(self, idx, obj):
@@ -1,23 +1,338 @@
-from openpathsampling.engines.trajectory import Trajectory
-from openpathsampling.netcdfplus import ObjectStore, LoaderProxy
+from collections import OrderedDict
+from uuid import UUID
+
+import numpy as np
+
+from openpathsampling.engines.trajectory import Trajectory, ArrayTrajectory
+from openpathsampling.netcdfplus import ObjectStore, LoaderProxy, NetCDFPlus
 
 
 class TrajectoryStore(ObjectStore):
+    """
+    ObjectStore for trajectories
+
+    A trajectory is stored as the list of the uuids of its snapshots. With
+    delta encoding, a trajectory that shares frames with a stored trajectory
+    (its parent), like the trial of a shooting move, is stored as ranges of
+    frames of the parent and the new frames only. Such trajectories are
+    reconstructed from the uuids of their parents when loaded; snapshots
+    are only loaded when used.
+
+    Attributes
+    ----------
+    delta_encoding : bool
+        if `True` new trajectories are stored relative to a parent, if that
+        is smaller. Default is `False`, which gives files that can be read
+        by older versions.
+    max_delta_depth : int
+        the maximal number of parents that need to be read to reconstruct a
+        trajectory. A trajectory whose parent has this depth is stored in
+        full.
+    """
     def __init__(self):
         super(TrajectoryStore, self).__init__(Trajectory)
+        self.delta_encoding = False
+        self.max_delta_depth = 16
+
+        # the last trajectories that start or end with a snapshot, these
+        # are tried as parents of new trajectories
+        self._ends = {}
+        self._candidates_per_frame = 4
+        # uuids of the snapshots and depth of recently used trajectories
+        self._references = OrderedDict()
+        self._references_size = 64
 
     def to_dict(self):
         return {}
 
     def _save(self, trajectory, idx):
-        self.vars['snapshots'][idx] = trajectory
         store = self.storage.snapshots
 
+        # save all new snapshots at once and write the references directly
+        # instead of saving each snapshot through the variable's setter
+        if isinstance(trajectory, ArrayTrajectory):
+            references = store.save_many(trajectory)
+        else:
+            references = store.save_many(trajectory.iter_proxies())
+
+        delta = None
+        if self.delta_encoding and None not in references:
+            delta = self._encode(idx, references)
+
+        self._write(idx, references, delta)
+
         for frame, snapshot in enumerate(trajectory.iter_proxies()):
             if type(snapshot) is not LoaderProxy:
                 loader = store.proxy(snapshot)
                 trajectory[frame] = loader
 
+    def _write(self, idx, references, delta):
+        if delta is None:
+            frames = references
+            depth = 0
+        else:
+            parent, segments, frames, depth = delta
+            self.vars['parent'][idx] = parent
+            self.vars['segments'][idx] = np.array(segments, dtype=np.int32)
+
+        self.vars['snapshots'].variable[idx] = ''.join(
+            '-' * 36 if ref is None else str(UUID(int=ref))
+            for ref in frames)
+
+        self._remember(idx, references, depth)
+
+    @property
+    def _has_delta_variables(self):
+        return 'segments' in self.variables
+
+    def _remember(self, idx, references, depth):
+        for ref in references[:1] + references[-1:]:
+            if ref is not None:
+                candidates = self._ends.setdefault(ref & ~1, [])
+                if idx not in candidates:
+                    candidates.append(idx)
+                    del candidates[:-self._candidates_per_frame]
+
+        # re-insert to make it the most recently used one
+        self._references.pop(idx, None)
+        self._references[idx] = (references, depth)
+        if len(self._references) > self._references_size:
+            self._references.popitem(last=False)
+
+    def _encode(self, idx, references):
+        """
+        Encode a trajectory relative to a stored trajectory if possible
+
+        Parameters
+        ----------
+        idx : int
+            the index of the trajectory. Only trajectories stored before
+            can be parents.
+        references : list of int
+            the uuids of the snapshots of the trajectory
+
+        Returns
+        -------
+        tuple (int, list of int, list of int, int) or None
+            the index of the parent, the segments, the uuids of the new
+            frames and the depth, or `None` if the trajectory should be
+            stored in full
+        """
+        if not references or not self._has_delta_variables:
+            return None
+
+        candidates = set(
+            self._ends.get(references[0] & ~1, []) +
+            self._ends.get(references[-1] & ~1, []))
+
+        best = None
+        for parent in sorted(candidates, reverse=True):
+            if parent >= idx:
+                continue
+
+            parent_references, depth = self.snapshot_uuids(parent)
+            if depth >= self.max_delta_depth:
+                continue
+
+            # frames of the parent without a uuid can't be referenced
+            if None in parent_references:
+                continue
+
+            segments, frames = self.segments(parent_references, references)
+            shared = len(references) - len(frames)
+
+            # only use segments if these take less space than the uuids
+            if shared * 36 > len(segments) * 4 and \
+                    (best is None or len(frames) < len(best[2])):
+                best = (parent, segments, frames, depth + 1)
+
+        return best
+
+    @staticmethod
+    def segments(parent, references):
+        """
+        Describe a list of snapshot uuids by ranges of a parent list
+
+        Parameters
+        ----------
+        parent : list of int
+            the uuids of the snapshots of the parent trajectory
+        references : list of int
+            the uuids of the snapshots to be described
+
+        Returns
+        -------
+        segments : list of int
+            pairs of `start, length`. A positive `length` means the frames
+            `parent[start:start + length]`, a negative one the reversed
+            snapshots of `parent[start]`, `parent[start - 1]`, ... and a
+            `start` of `-1` means the next `length` new frames.
+        frames : list of int
+            the uuids of the new frames
+
+        See Also
+        --------
+        apply_segments
+        """
+        positions = {}
+        for pos, ref in enumerate(parent):
+            positions.setdefault(ref & ~1, pos)
+
+        n_parent = len(parent)
+        n_frames = len(references)
+        segments = []
+        frames = []
+        frame = 0
+        while frame < n_frames:
+            ref = references[frame]
+            start = positions.get(ref & ~1)
+            if start is None:
+                frames.append(ref)
+                if segments and segments[-2] == -1:
+                    segments[-1] += 1
+                else:
+                    segments.extend([-1, 1])
+                frame += 1
+                continue
+
+            if parent[start] == ref:
+                step, flip = 1, 0
+            else:
+                step, flip = -1, 1
+
+            length = 1
+            pos = start + step
+            while frame + length < n_frames and 0 <= pos < n_parent and \
+                    parent[pos] ^ flip == references[frame + length]:
+                length += 1
+                pos += step
+
+            segments.extend([start, length * step])
+            frame += length
+
+        return segments, frames
+
+    @staticmethod
+    def apply_segments(parent, segments, frames):
+        """
+        Reconstruct a list of snapshot uuids from its segments
+
+        Parameters
+        ----------
+        parent : list of int
+            the uuids of the snapshots of the parent trajectory
+        segments : list of int
+            the segments as returned by :meth:`segments`
+        frames : list of int
+            the uuids of the new frames
+
+        Returns
+        -------
+        list of int
+            the uuids of the snapshots
+        """
+        references = []
+        frame = 0
+        for start, length in zip(segments[0::2], segments[1::2]):
+            if start == -1:
+                references.extend(frames[frame:frame + length])
+                frame += length
+            elif length > 0:
+                references.extend(parent[start:start + length])
+            else:
+                references.extend(
+                    parent[pos] ^ 1
+                    for pos in range(start, start + length, -1))
+
+        return references
+
+    def snapshot_uuids(self, idx):
+        """
+        Return the uuids of the snapshots of a stored trajectory
+
+        Parameters
+        ----------
+        idx : int
+            the index of the trajectory
+
+        Returns
+        -------
+        list of int
+            the uuids of the snapshots, `None` for missing snapshots
+        int
+            the number of parents that were needed to reconstruct it
+        """
+        references = self._references.pop(idx, None)
+        if references is not None:
+            self._references[idx] = references
+            return references
+
+        references, depth = self._read(idx)
+        self._remember(idx, references, depth)
+
+        return references, depth
+
+    def _read(self, idx):
+        frames = [
+            None if u[0] == '-' else int(UUID(u))
+            for u in NetCDFPlus.to_uuid_chunks(
+                self.variables['snapshots'][idx])
+        ]
+
+        parent = None
+        if self._has_delta_variables:
+            parent = self.vars['parent'][idx]
+
+        if parent is None:
+            references, depth = frames, 0
+        else:
+            parent_references, depth = self.snapshot_uuids(parent)
+            references = self.apply_segments(
+                parent_references, self.vars['segments'][idx].tolist(),
+                frames)
+            depth += 1
+
+        return references, depth
+
+    def convert(self, delta_encoding):
+        """
+        Rewrite all stored trajectories with or without delta encoding
+
+        Without delta encoding, all trajectories are stored as the full list
+        of their snapshots as in files written without delta encoding.
+
+        Parameters
+        ----------
+        delta_encoding : bool
+            if `True` store trajectories relative to a parent where that is
+            smaller, otherwise store all in full
+
+        Notes
+        -----
+        The space used by the old entries is not freed. To get a smaller
+        file copy it afterwards, e.g. with `nccopy`.
+        """
+        if not self._has_delta_variables:
+            if delta_encoding:
+                raise RuntimeError(
+                    'This file was created without the variables needed '
+                    'for delta encoding of trajectories.')
+            return
+
+        self._ends = {}
+        self._references.clear()
+        for idx in range(len(self)):
+            references, _ = self._read(idx)
+            delta = None
+            if delta_encoding and None not in references:
+                delta = self._encode(idx, references)
+
+            if delta is None and self.vars['parent'][idx] is not None:
+                self.vars['parent'][idx] = None
+                self.vars['segments'][idx] = np.array([], dtype=np.int32)
+
+            self._write(idx, references, delta)
+
     def mention(self, trajectory):
         """
         Save a trajectory and store its snapshots only shallow
@@ -38,7 +353,12 @@ class TrajectoryStore(ObjectStore):
         snap_store.only_mention = current_mention
 
     def _load(self, idx):
-        trajectory = Trajectory(self.vars['snapshots'][idx])
+        store = self.storage.snapshots
+        references, _ = self.snapshot_uuids(idx)
+        trajectory = Trajectory([
+            None if ref is None else LoaderProxy.new(store, ref)
+            for ref in references
+        ])
         return trajectory
 
     def cache_all(self):
@@ -49,6 +369,14 @@ class TrajectoryStore(ObjectStore):
             idxs = range(len(self))
             snaps = self.vars['snapshots'][:]
 
+            if self._has_delta_variables:
+                # trajectories stored relative to a parent
+                snaps = [
+                    snap if parent is None else self._load(idx)
+                    for idx, snap, parent in zip(
+                        idxs, snaps, self.vars['parent'][:])
+                ]
+
             [self.add_single_to_cache(i, j) for i, j in zip(
                 idxs,
                 snaps)]
@@ -125,3 +453,22 @@ class TrajectoryStore(ObjectStore):
                         "'trajectory'.",
             chunksizes=(65536,)
         )
+
+        self.create_variable(
+            'parent',
+            'index',
+            description="the index of the trajectory that the segments of "
+                        "trajectory 'trajectory' refer to or -1 if "
+                        "'snapshots' holds all its frames.",
+            chunksizes=(65536,)
+        )
+
+        self.create_variable(
+            'segments',
+            'numpy.int32',
+            dimensions=('...',),
+            description="pairs of start and length of ranges of frames of "
+                        "the parent of trajectory 'trajectory' and of its "
+                        "new frames in 'snapshots' (start -1).",
+            chunksizes=(65536,)
+        )
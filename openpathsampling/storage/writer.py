@@ -0,0 +1,134 @@
+"""
+Write-behind saving of objects into a storage.
+
+A :class:`StorageWriter` takes objects, usually the MC steps of a running
+simulation, and saves them in a background thread, so the simulation does
+not wait for the disk. All access to the file goes through the lock of the
+storage; the simulation only waits for the writer if it has to load
+something from the file itself or if too many objects are waiting.
+"""
+
+import logging
+import threading
+
+from queue import Queue
+
+logger = logging.getLogger(__name__)
+
+_SYNC = object()
+_STOP = object()
+
+
+class StorageWriter(object):
+    """
+    Saves objects to a storage in a background thread
+
+    Objects are saved in the order they are given. If saving fails, nothing
+    is written anymore, so the file contains all objects up to the last one
+    that was saved completely. The error is raised again in the thread
+    using the writer at the next call.
+
+    Parameters
+    ----------
+    storage : :class:`openpathsampling.storage.Storage`
+        the storage to save to
+    max_queued : int
+        the maximal number of objects waiting to be saved. If this is
+        reached, :meth:`save` blocks until the writer has caught up.
+
+    Attributes
+    ----------
+    n_saved : int
+        the number of objects saved so far
+    """
+
+    def __init__(self, storage, max_queued=4):
+        if max_queued < 1:
+            raise ValueError('max_queued must be at least 1')
+
+        self.storage = storage
+        self.max_queued = max_queued
+        self.n_saved = 0
+
+        self._error = None
+        self._queue = Queue(max_queued)
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        # closing the storage closes the writer first
+        storage.writers.append(self)
+
+    @property
+    def running(self):
+        """bool : whether the writer still accepts objects"""
+        return self._thread.is_alive() and self._error is None
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+
+                if self._error is None:
+                    with self.storage.lock:
+                        if item is _SYNC:
+                            self.storage.sync_all()
+                        else:
+                            self.storage.save(item)
+                            self.n_saved += 1
+
+            except Exception as e:
+                logger.error('Saving to %s failed, nothing will be written '
+                             'anymore: %s' % (self.storage.filename, e))
+                self._error = e
+
+            finally:
+                self._queue.task_done()
+
+    def _check(self):
+        if self._error is not None:
+            raise self._error
+
+        if not self._thread.is_alive():
+            raise RuntimeError('The storage writer is closed.')
+
+    def save(self, obj):
+        """
+        Queue an object to be saved
+
+        Parameters
+        ----------
+        obj : :class:`openpathsampling.netcdfplus.StorableObject`
+            the object to be saved. It must not be changed afterwards.
+        """
+        self._check()
+        self._queue.put(obj)
+
+    def sync(self):
+        """
+        Queue syncing the storage to disk after all objects queued before
+        """
+        self._check()
+        self._queue.put(_SYNC)
+
+    def flush(self):
+        """
+        Wait until all queued objects are saved
+        """
+        self._queue.join()
+        self._check()
+
+    def close(self):
+        """
+        Save all queued objects and stop the writer
+        """
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+
+        if self in self.storage.writers:
+            self.storage.writers.remove(self)
+
+        if self._error is not None:
+            raise self._error
@@ -0,0 +1,55 @@
+"""
+Trivial 1D persistent "engine" to be used for tests of the
+PersistentExternalEngine.
+
+Usage: python persistent_engine.py delay_ms
+
+Commands are read from stdin (see openpathsampling.engines.persistent_engine
+for the protocol). Frames are written in the same format as engine.c.
+"""
+import os
+import select
+import shlex
+import sys
+
+
+def main():
+    delay = int(sys.argv[1]) / 1000.0
+    stdin = sys.stdin.fileno()
+    buffered = ""
+    out_f = None
+    position = velocity = 0.0
+    while True:
+        timeout = delay if out_f is not None else None
+        ready, _, _ = select.select([stdin], [], [], timeout)
+        if ready:
+            data = os.read(stdin, 4096).decode()
+            if not data:
+                break  # stdin closed
+            buffered += data
+            while "\n" in buffered:
+                line, buffered = buffered.split("\n", 1)
+                cmd = shlex.split(line)
+                if not cmd:
+                    continue
+                elif cmd[0] == "run":
+                    with open(cmd[1]) as in_f:
+                        position, velocity = map(float, in_f.read().split())
+                    out_f = open(cmd[2], "w")
+                elif cmd[0] == "stop":
+                    if out_f is not None:
+                        out_f.close()
+                        out_f = None
+                    sys.stdout.write("stopped\n")
+                    sys.stdout.flush()
+                elif cmd[0] == "quit":
+                    return
+
+        if out_f is not None:
+            position += velocity
+            out_f.write("%f %f\n" % (position, velocity))
+            out_f.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+from __future__ import absolute_import
+
+import os
+import tempfile
+
+from nose.tools import (assert_equal, assert_true, assert_false,
+                        assert_is, raises)
+
+import netCDF4
+import numpy as np
+
+import openpathsampling as paths
+from openpathsampling.netcdfplus import (
+    BoundedValueCache, WeakKeyCache, LRUChunkLoadingCache, ChunkPrefetcher,
+    NetCDFPlus
+)
+from .test_helpers import make_1d_traj
+
+
+class TestBoundedValueCache(object):
+    def setup(self):
+        self.keys = ['k' + str(i) for i in range(10)]
+        self.values = [np.full(10, float(i)) for i in range(10)]
+        self.nbytes = self.values[0].nbytes
+
+    def _fill(self, cache):
+        for (key, value) in zip(self.keys, self.values):
+            cache[key] = value
+
+    def test_max_entries(self):
+        cache = BoundedValueCache(max_entries=3)
+        self._fill(cache)
+        assert_equal(list(cache), self.keys[-3:])
+        assert_equal(cache.n_evicted, 7)
+        assert_equal(cache.n_bytes, 3 * self.nbytes)
+        assert_equal(cache.size, (3, 0))
+        # using an entry makes it the most recent one
+        _ = cache['k7']
+        cache['k0'] = self.values[0]
+        assert_equal(list(cache), ['k9', 'k7', 'k0'])
+
+    def test_max_bytes(self):
+        cache = BoundedValueCache(max_bytes=4 * self.nbytes + 1)
+        self._fill(cache)
+        assert_equal(list(cache), self.keys[-4:])
+        assert_equal(cache.n_bytes, 4 * self.nbytes)
+        # replacing a value updates the size
+        cache['k9'] = np.zeros(20)
+        assert_equal(list(cache), ['k7', 'k8', 'k9'])
+        assert_equal(cache.n_bytes, 2 * self.nbytes + 160)
+
+    def test_non_numpy_values(self):
+        cache = BoundedValueCache()
+        cache['a'] = 1.0
+        assert_true(cache.n_bytes > 0)
+        assert_equal(cache.size, (-1, 0))
+
+    def test_statistics(self):
+        cache = BoundedValueCache(max_entries=5)
+        self._fill(cache)
+        assert_equal(cache['k9'][0], 9.0)
+        assert_equal(cache.get('k0'), None)
+        assert_equal(cache.get_silent('k8')[0], 8.0)
+        assert_equal(cache.statistics,
+                     {'hits': 1, 'misses': 1, 'evicted': 5, 'entries': 5,
+                      'pinned': 0, 'bytes': 5 * self.nbytes})
+        cache.reset_statistics()
+        assert_equal((cache.n_hits, cache.n_misses, cache.n_evicted),
+                     (0, 0, 0))
+
+    def test_pinned(self):
+        cache = BoundedValueCache(max_entries=2)
+        cache['k0'] = self.values[0]
+        cache.pin(['k0', 'k1'])
+        self._fill(cache)
+        assert_equal(len(cache), 4)
+        assert_true('k0' in cache)
+        assert_true('k1' in cache)
+        assert_false('k2' in cache)
+        assert_equal(cache.statistics['pinned'], 2)
+        assert_equal(cache.n_bytes, 4 * self.nbytes)
+        # unpinned values become the most recent ones
+        cache.unpin(['k0'])
+        assert_equal(list(cache), ['k1', 'k9', 'k0'])
+        cache.unpin()
+        assert_equal(list(cache), ['k0', 'k1'])
+
+    def test_clear(self):
+        cache = BoundedValueCache()
+        self._fill(cache)
+        cache.clear()
+        assert_equal(len(cache), 0)
+        assert_equal(cache.n_bytes, 0)
+
+
+class TestCVMemoryCache(object):
+    def setup(self):
+        self.n_calls = 0
+
+        def features(snapshot):
+            self.n_calls += 1
+            return np.full(100, snapshot.coordinates[0][0])
+
+        self.cv = paths.FunctionCV("features", features)
+        self.traj = make_1d_traj([float(i) for i in range(20)])
+
+    def test_default_cache(self):
+        assert_true(isinstance(self.cv.memory_cache, WeakKeyCache))
+
+    def test_set_memory_cache(self):
+        self.cv(self.traj[:5])
+        cache = BoundedValueCache(max_entries=10)
+        assert_is(self.cv.set_memory_cache(cache), self.cv)
+        assert_is(self.cv.memory_cache, cache)
+        # values are transferred
+        assert_equal(len(cache), 5)
+        self.cv(self.traj[:5])
+        assert_equal(self.n_calls, 5)
+        assert_equal(cache.n_hits, 5)
+
+    def test_bounded_cv_cache(self):
+        cache = BoundedValueCache(max_bytes=5 * 800)
+        self.cv.set_memory_cache(cache)
+        cache.pin(self.traj[:2])
+        values = self.cv(self.traj)
+        assert_equal(self.n_calls, 20)
+        assert_equal(len(cache), 7)
+        assert_equal(cache.n_bytes, 7 * 800)
+        # pinned and recent values are still cached
+        self.cv(self.traj[:2])
+        self.cv(self.traj[-5:])
+        assert_equal(self.n_calls, 20)
+        # others are recomputed
+        np.testing.assert_array_equal(self.cv(self.traj[5]), values[5])
+        assert_equal(self.n_calls, 21)
+
+
+    def test_reversed_counted_once(self):
+        cv = paths.FunctionCV("x", lambda s: s.coordinates[0][0],
+                              cv_time_reversible=True)
+        cache = BoundedValueCache()
+        cv.set_memory_cache(cache)
+        forward = self.traj[:5]
+        backward = [snap.reversed for snap in forward]
+        cv(forward)
+        assert_equal((cache.n_hits, cache.n_misses), (0, 5))
+        # the value of the reversed snapshot is a single hit
+        assert_equal(list(cv(backward)), [float(i) for i in range(5)])
+        assert_equal((cache.n_hits, cache.n_misses), (5, 5))
+        # lookups of the storage are not counted
+        assert_equal(cv._cache_dict._get_silent(backward[0]), 0.0)
+        assert_equal(cv._cache_dict._get_silent(self.traj[5]), None)
+        assert_equal((cache.n_hits, cache.n_misses), (5, 5))
+
+
+class CountingVariable(object):
+    """Array-like variable that counts the slices read from it"""
+    def __init__(self, values):
+        self.values = values
+        self.n_reads = 0
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, item):
+        self.n_reads += 1
+        return self.values[item]
+
+
+class TestLRUChunkLoadingCache(object):
+    def setup(self):
+        self.variable = CountingVariable(np.arange(1050.0))
+
+    def test_load_max(self):
+        cache = LRUChunkLoadingCache(chunksize=100, variable=self.variable)
+        assert_equal(cache.load_max(), 1050 * 8)
+        assert_equal(self.variable.n_reads, 1)
+        assert_equal(len(cache._chunkdict), 11)
+        assert_equal(cache.count, (1050, 0))
+        assert_equal([cache[idx] for idx in range(1050)],
+                     list(np.arange(1050.0)))
+        assert_equal(self.variable.n_reads, 1)
+        # everything is loaded already
+        assert_equal(cache.load_max(), 0)
+        assert_equal(self.variable.n_reads, 1)
+
+    def test_load_max_partial(self):
+        cache = LRUChunkLoadingCache(chunksize=100, max_chunks=4,
+                                     variable=self.variable)
+        _ = cache[0]
+        assert_equal(cache.load_max(), 300 * 8)
+        assert_equal(list(cache._chunkdict), [0, 1, 2, 3])
+        assert_equal(cache[399], 399.0)
+        assert_equal(self.variable.n_reads, 2)
+
+    def test_load_max_empty(self):
+        cache = LRUChunkLoadingCache(variable=CountingVariable(np.zeros(0)))
+        assert_equal(cache.load_max(), 0)
+
+
+class TestChunkPrefetch(object):
+    def setup(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tempdir, "values.nc")
+        dataset = netCDF4.Dataset(self.filename, 'w')
+        dataset.createDimension('n', None)
+        variable = dataset.createVariable('value', 'f8', ('n',))
+        variable[:] = np.arange(1000.0)
+        dataset.close()
+
+        self.dataset = netCDF4.Dataset(self.filename, 'r')
+        self.variable = self.dataset.variables['value']
+        self.prefetcher = ChunkPrefetcher(self.filename)
+
+    def teardown(self):
+        self.prefetcher.close()
+        self.dataset.close()
+        os.remove(self.filename)
+        os.rmdir(self.tempdir)
+
+    def _cache(self, variable=None, n_chunks=3):
+        if variable is None:
+            variable = self.variable
+        cache = LRUChunkLoadingCache(chunksize=100, variable=variable)
+        cache.update_size()
+        cache.set_prefetch(n_chunks, self.prefetcher)
+        return cache
+
+    def test_sequential_scan(self):
+        cache = self._cache()
+        values = [cache[idx] for idx in range(1000)]
+        assert_equal(values, list(np.arange(1000.0)))
+        # chunks 2 to 9 are requested after chunks 0 and 1 were loaded
+        assert_equal(self.prefetcher.n_requested, 8)
+        assert_equal(self.prefetcher.n_used, 8)
+
+    def test_random_access(self):
+        cache = self._cache()
+        for idx in [550, 120, 830, 0, 420]:
+            assert_equal(cache[idx], float(idx))
+        assert_equal(self.prefetcher.n_requested, 0)
+
+    def test_variable_delegate(self):
+        delegate = NetCDFPlus.ValueDelegate(
+            self.variable, getter=lambda values: [2 * v for v in values])
+        cache = self._cache(delegate)
+        values = [cache[idx] for idx in range(1000)]
+        assert_equal(values, [2.0 * idx for idx in range(1000)])
+        assert_true(self.prefetcher.n_used > 0)
+
+    def test_stopped_prefetcher(self):
+        cache = self._cache()
+        self.prefetcher.close()
+        assert_false(self.prefetcher.running)
+        values = [cache[idx] for idx in range(1000)]
+        assert_equal(values, list(np.arange(1000.0)))
+        assert_equal(self.prefetcher.n_used, 0)
+
+    def test_take_timeout(self):
+        # a slice that never arrives is given up after the timeout
+        key = (ChunkPrefetcher.variable_path(self.variable), 0, 100)
+        self.prefetcher._pending.add(key)
+        assert_is(self.prefetcher.take(self.variable, 0, 100, timeout=0.05),
+                  None)
+        assert_false(key in self.prefetcher._pending)
+
+    def test_switch_off(self):
+        cache = self._cache(n_chunks=0)
+        assert_is(cache.prefetcher, None)
+        _ = [cache[idx] for idx in range(1000)]
+        assert_equal(self.prefetcher.n_requested, 0)
+
+    @raises(ValueError)
+    def test_needs_prefetcher(self):
+        LRUChunkLoadingCache(variable=self.variable).set_prefetch(2)
+
+    @raises(RuntimeError)
+    def test_storage_not_read_only(self):
+        storage = paths.Storage(
+            os.path.join(self.tempdir, "storage.nc"), "w")
+        try:
+            storage.prefetcher
+        finally:
+            storage.close()
+            os.remove(os.path.join(self.tempdir, "storage.nc"))
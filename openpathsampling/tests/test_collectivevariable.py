@@ -8,11 +8,13 @@ from builtins import object
 from .test_helpers import data_filename, assert_close_unit, md
 
 import pytest
+from nose.tools import assert_equal
 from nose.plugins.skip import SkipTest
 
 import numpy as np
 
 import openpathsampling.collectivevariable as op
+import openpathsampling.netcdfplus.chaindict as cd
 import openpathsampling.engines.openmm as peng
 from openpathsampling.netcdfplus import NetCDFPlus
 
@@ -372,3 +374,153 @@ class TestFunctionCV(object):
 
             if os.path.isfile(fname):
                 os.remove(fname)
+
+
+class TestBatchedEvaluation(object):
+    def setup(self):
+        self.calls = []
+
+        def coordinate(snapshots):
+            self.calls.append(list(snapshots))
+            return [snap.coordinates[0][0] for snap in snapshots]
+
+        self.function = coordinate
+        self.traj = make_1d_traj([float(i) for i in range(10)])
+
+    def _cv(self, reversible=False):
+        return paths.FunctionCV("x", self.function,
+                                cv_time_reversible=reversible,
+                                cv_requires_lists=True)
+
+    def test_single_call_for_misses(self):
+        cv = self._cv()
+        cv(self.traj[2:5])
+        values = cv(self.traj)
+        assert_equal(list(values), [float(i) for i in range(10)])
+        assert_equal(len(self.calls), 2)
+        assert_equal(self.calls[1], list(self.traj[:2]) + list(self.traj[5:]))
+
+    def test_repeated_snapshots(self):
+        cv = self._cv()
+        frames = [self.traj[0], self.traj[1], self.traj[0], self.traj[1]]
+        assert_equal(list(cv(frames)), [0.0, 1.0, 0.0, 1.0])
+        assert_equal(self.calls, [list(self.traj[:2])])
+
+    def test_reversed_snapshots(self):
+        frames = list(self.traj) + list(self.traj.reversed)
+        # a reversible CV computes each pair of snapshots once ...
+        cv = self._cv(reversible=True)
+        values = cv(frames)
+        assert_equal(list(values), [float(i) for i in range(10)] +
+                     [float(i) for i in reversed(range(10))])
+        assert_equal(self.calls, [list(self.traj)])
+        # ... otherwise both snapshots are needed
+        self.calls = []
+        self._cv(reversible=False)(frames)
+        assert_equal(len(self.calls), 1)
+        assert_equal(len(self.calls[0]), 20)
+
+    def test_unhashable_keys(self):
+        fnc_calls = []
+
+        def total(items):
+            fnc_calls.append(items)
+            return [sum(item) for item in items]
+
+        chain = cd.ChainDict() > cd.Function(total)
+        assert_equal(chain[[[1, 2], [1, 2], [3]]], [3, 3, 3])
+        # unhashable keys are not merged
+        assert_equal(fnc_calls, [[[1, 2], [1, 2], [3]]])
+        # hashable ones are
+        assert_equal(chain[[(1, 2), (3,), (1, 2)]], [3, 3, 3])
+        assert_equal(fnc_calls[-1], [(1, 2), (3,)])
+
+
+ConversionTestSnapshot = paths.engines.SnapshotFactory(
+    'ConversionTestSnapshot',
+    [paths.engines.features.coordinates, paths.engines.features.box_vectors],
+    'A snapshot with the features needed for mdtraj'
+)
+
+
+class TestMDTrajConversionCache(object):
+    def setup(self):
+        if not md:
+            raise SkipTest("mdtraj not installed")
+        from openpathsampling.engines.openmm.tools import (
+            mdtraj_conversions, MDTrajConversionCache
+        )
+        from openpathsampling.engines.openmm.topology import MDTrajTopology
+
+        md_topology = md.Topology()
+        residue = md_topology.add_residue('A', md_topology.add_chain())
+        for _ in range(2):
+            md_topology.add_atom('C', md.element.carbon, residue)
+        self.topology = MDTrajTopology(md_topology)
+
+        self.traj = paths.Trajectory([
+            ConversionTestSnapshot(
+                coordinates=np.array([[0.0, 0.0, 0.0], [float(i), 0.0, 0.0]]),
+                box_vectors=None)
+            for i in range(5)
+        ])
+        self.conversions = mdtraj_conversions
+        self.conversions.clear()
+        self.cache_class = MDTrajConversionCache
+
+    def _counts(self):
+        return self.conversions.n_hits, self.conversions.n_misses
+
+    def test_shared_conversion(self):
+        hits, misses = self._counts()
+        distance = paths.MDTrajFunctionCV("d", md.compute_distances,
+                                          self.topology,
+                                          atom_pairs=[[0, 1]])
+        x_coord = paths.MDTrajFunctionCV("x", lambda t: t.xyz[:, 1, 0],
+                                         self.topology,
+                                         cv_scalarize_numpy_singletons=False)
+        np.testing.assert_allclose(distance(self.traj), range(5))
+        np.testing.assert_allclose(x_coord(self.traj), range(5))
+        assert_equal(self._counts(), (hits + 1, misses + 1))
+
+    def test_changes_are_not_shared(self):
+        def move(t):
+            t.xyz[:] = 0.0
+            return t.xyz[:, 1, 0]
+
+        moving = paths.MDTrajFunctionCV("move", move, self.topology,
+                                        cv_scalarize_numpy_singletons=False)
+        x_coord = paths.MDTrajFunctionCV("x", lambda t: t.xyz[:, 1, 0],
+                                         self.topology,
+                                         cv_scalarize_numpy_singletons=False)
+        np.testing.assert_allclose(moving(self.traj), [0.0] * 5)
+        np.testing.assert_allclose(x_coord(self.traj), range(5))
+
+    def test_entries(self):
+        cache = self.cache_class(max_entries=2)
+        for snap in self.traj:
+            cache.convert([snap], self.topology.mdtraj)
+        assert_equal(len(cache), 2)
+        assert_equal((cache.n_hits, cache.n_misses), (0, 5))
+        t = cache.convert([self.traj[-1]], self.topology.mdtraj)
+        assert_equal(cache.n_hits, 1)
+        np.testing.assert_allclose(t.xyz, [[[0, 0, 0], [4, 0, 0]]])
+        assert_equal(t.unitcell_vectors, None)
+        # used entries are kept longest
+        cache.convert([self.traj[3]], self.topology.mdtraj)
+        cache.convert([self.traj[0]], self.topology.mdtraj)
+        cache.convert([self.traj[3]], self.topology.mdtraj)
+        assert_equal((cache.n_hits, cache.n_misses), (3, 6))
+
+    def test_max_bytes(self):
+        # one frame of two atoms takes 24 bytes
+        cache = self.cache_class(max_bytes=60)
+        for snap in self.traj:
+            cache.convert([snap], self.topology.mdtraj)
+        assert_equal(len(cache), 2)
+        assert_equal(cache.nbytes, 48)
+        # conversions that are too large are not stored
+        cache.convert(self.traj, self.topology.mdtraj)
+        assert_equal(len(cache), 2)
+        cache.clear()
+        assert_equal(cache.nbytes, 0)
@@ -14,6 +14,7 @@ from .test_helpers import (CallIdentity, prepend_exception_message,
 import openpathsampling as paths
 import openpathsampling.engines.openmm as peng
 from openpathsampling.ensemble import *
+from openpathsampling.ensembles.compiled import compile_ensemble
 
 import logging
 logging.getLogger('openpathsampling.ensemble').setLevel(logging.DEBUG)
@@ -1473,6 +1474,181 @@ class TestSequentialEnsembleCache(EnsembleCacheTest):
 
 
 
+class CountingVolume(paths.Volume):
+    """Volume that counts how often it is evaluated"""
+    def __init__(self, volume):
+        super(CountingVolume, self).__init__()
+        self.volume = volume
+        self.n_calls = 0
+
+    def __call__(self, snapshot):
+        self.n_calls += 1
+        return self.volume(snapshot)
+
+
+class TestSequentialEnsembleStreaming(EnsembleTest):
+    def setup(self):
+        # debug output of the generic algorithm makes these tests slow
+        self.logger = logging.getLogger('openpathsampling.ensemble')
+        self.log_level = self.logger.level
+        self.logger.setLevel(logging.INFO)
+        self.inX = AllInXEnsemble(vol1)
+        self.outX = AllOutXEnsemble(vol1)
+        self.length1 = LengthEnsemble(1)
+        self.sequences = {
+            'pseudo_tis': [self.inX & self.length1, self.outX,
+                           self.inX & self.length1],
+            'pseudo_minus': [self.inX & self.length1, self.outX, self.inX,
+                             self.outX, self.inX & self.length1],
+            'tis': [self.inX & self.length1,
+                    self.outX & PartOutXEnsemble(vol2),
+                    self.inX & self.length1],
+            'optional_middle': [SingleFrameEnsemble(self.inX),
+                                OptionalEnsemble(self.outX),
+                                SingleFrameEnsemble(self.inX)],
+            'optional_start': [LengthEnsemble(slice(0, 2)),
+                               PartInXEnsemble(vol1) | length0,
+                               self.outX]
+        }
+
+    def teardown(self):
+        self.logger.setLevel(self.log_level)
+
+    def test_use_streaming(self):
+        for ensembles in self.sequences.values():
+            assert_true(SequentialEnsemble(ensembles)._use_streaming)
+        optional = SequentialEnsemble([self.inX,
+                                       OptionalEnsemble(self.outX)])
+        assert_true(optional._use_streaming)
+        sliced = SequentialEnsemble([
+            self.inX, SlicedTrajectoryEnsemble(self.outX, slice(1, None))
+        ])
+        assert_false(sliced._use_streaming)
+        nested = SequentialEnsemble([self.inX,
+                                     SequentialEnsemble([self.outX])])
+        assert_false(nested._use_streaming)
+
+    def test_streaming_matches_generic(self):
+        functions = ['can_append', 'strict_can_append', 'can_prepend',
+                     'strict_can_prepend', '__call__']
+        for (name, ensembles) in self.sequences.items():
+            streaming = SequentialEnsemble(ensembles)
+            for test in ttraj.keys():
+                traj = ttraj[test]
+                for fname in functions:
+                    for i in range(1, len(traj) + 1):
+                        if 'prepend' in fname:
+                            subtraj = traj[len(traj) - i:]
+                        else:
+                            subtraj = traj[:i]
+                        generic = SequentialEnsemble(ensembles)
+                        generic._use_streaming = False
+                        failmsg = ("Failure in " + name + "." + fname + "("
+                                   + test + "[" + str(i) + "]): ")
+                        self._single_test(
+                            lambda t: getattr(streaming, fname)(t, True),
+                            subtraj,
+                            getattr(generic, fname)(subtraj, True),
+                            failmsg
+                        )
+
+    def test_each_frame_evaluated_once(self):
+        in_vol = CountingVolume(vol1)
+        ensemble = SequentialEnsemble([
+            AllInXEnsemble(in_vol) & self.length1,
+            AllOutXEnsemble(in_vol),
+            AllInXEnsemble(in_vol) & self.length1
+        ])
+        traj = make_1d_traj(coordinates=[0.3] + [0.9] * 200 + [0.3],
+                            velocities=[1.0] * 202)
+        for i in range(1, len(traj)):
+            assert_true(ensemble.can_append(traj[:i], trusted=True))
+        assert_false(ensemble.can_append(traj, trusted=True))
+        # the frame leaving the state is also checked by the next ensemble
+        assert_equal(in_vol.n_calls, len(traj) + 2)
+
+    def test_cache_reset(self):
+        ensemble = SequentialEnsemble(self.sequences['pseudo_tis'])
+        traj = ttraj['upper_in_out_out_in']
+        assert_true(ensemble.can_append(traj[0:3]))
+        assert_false(ensemble.can_append(traj))
+        # different trajectory: starts over
+        assert_true(ensemble.can_append(ttraj['upper_in_out'], True))
+        assert_equal(ensemble._cache_can_append.contents['ens_num'], 1)
+
+
+class TestCompiledEnsemble(EnsembleTest):
+    def setup(self):
+        self.logger = logging.getLogger('openpathsampling.ensemble')
+        self.log_level = self.logger.level
+        self.logger.setLevel(logging.INFO)
+        self.ensembles = {
+            'tis': paths.TISEnsemble(vol1, vol3, vol2),
+            'minus': paths.MinusInterfaceEnsemble(vol1, vol2),
+            'combination': ((AllInXEnsemble(vol1 | vol3)
+                             | PartOutXEnsemble(vol2 & ~vol1))
+                            & LengthEnsemble(slice(1, 5))),
+            'negated': (NegatedEnsemble(AllOutXEnsemble(vol1 - vol3))
+                        & PartInXEnsemble(vol2 ^ vol1)),
+            'sliced': (SlicedTrajectoryEnsemble(AllInXEnsemble(vol1), 0)
+                       & PartOutXEnsemble(vol1)),
+            'sequential': SequentialEnsemble([
+                AllInXEnsemble(vol1),
+                OptionalEnsemble(AllOutXEnsemble(vol1)),
+                AllInXEnsemble(vol1) & LengthEnsemble(1)
+            ])
+        }
+
+    def teardown(self):
+        self.logger.setLevel(self.log_level)
+
+    def test_matches_ensemble(self):
+        functions = ['__call__', 'can_append', 'strict_can_append',
+                     'can_prepend', 'strict_can_prepend']
+        for (name, ensemble) in self.ensembles.items():
+            compiled = compile_ensemble(ensemble)
+            for test in ttraj.keys():
+                for fname in functions:
+                    failmsg = ("Failure in " + name + "." + fname + "("
+                               + test + "): ")
+                    self._single_test(getattr(compiled, fname), ttraj[test],
+                                      getattr(ensemble, fname)(ttraj[test]),
+                                      failmsg)
+
+    def test_iter_valid_slices(self):
+        traj = make_1d_traj([0.0, 0.3, 0.6, 0.3, 0.0, 0.6, 0.8, 0.3, 2.2,
+                             0.3, 0.05, 0.3, 0.0])
+        options = [{}, {'reverse': True},
+                   {'min_length': 2, 'max_length': 6, 'overlap': 0},
+                   {'min_length': 3, 'reverse': True}]
+        for (name, ensemble) in self.ensembles.items():
+            compiled = compile_ensemble(ensemble)
+            for kwargs in options:
+                assert_equal(
+                    list(compiled.iter_valid_slices(traj, **kwargs)),
+                    list(ensemble.iter_valid_slices(traj, **kwargs))
+                )
+
+    def test_volumes_evaluated_once(self):
+        in_vol = CountingVolume(vol1)
+        out_vol = CountingVolume(vol3)
+        ensemble = paths.TISEnsemble(in_vol, out_vol, vol2)
+        compiled = compile_ensemble(ensemble)
+        assert_equal(set(compiled.volumes), set([in_vol, out_vol, vol2]))
+        traj = make_1d_traj([0.3] + [0.8] * 20 + [2.2] + [0.8] * 5 + [0.3]
+                            + [0.8] * 10 + [0.3])
+        slices = list(compiled.iter_valid_slices(traj))
+        assert_equal(slices, [slice(0, 22), slice(27, 39)])
+        assert_equal(in_vol.n_calls, len(traj))
+        assert_equal(out_vol.n_calls, len(traj))
+
+    def test_uncompiled_parts(self):
+        sliced = SlicedTrajectoryEnsemble(AllInXEnsemble(vol1), 0)
+        compiled = compile_ensemble(sliced & PartOutXEnsemble(vol1))
+        assert_equal(compiled.volumes, [vol1])
+        assert_equal(compiled._root.node1.ensemble, sliced)
+
+
 class TestSlicedTrajectoryEnsemble(EnsembleTest):
     def test_sliced_ensemble_init(self):
         init_as_int = SlicedTrajectoryEnsemble(AllInXEnsemble(vol1), 3)
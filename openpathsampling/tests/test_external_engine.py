@@ -1,5 +1,5 @@
 from nose.tools import (assert_equal, assert_not_equal, assert_almost_equal,
-                        raises, assert_true)
+                        raises, assert_true, assert_raises)
 from nose.plugins.skip import Skip, SkipTest
 from .test_helpers import assert_items_equal
 
@@ -14,12 +14,14 @@ import shlex
 
 import time
 import os
+import sys
 import glob
 import linecache
 
 import logging
 
 from openpathsampling.engines.snapshot import SnapshotDescriptor
+from openpathsampling.engines import file_watch
 
 logging.getLogger('openpathsampling.ensemble').setLevel(logging.CRITICAL)
 logging.getLogger('openpathsampling.netcdfplus').setLevel(logging.CRITICAL)
@@ -76,6 +78,31 @@ class ExampleExternalEngine(peng.ExternalEngine):
         return (engine_path + " " + str(self.engine_sleep)
                 + " " + str(self.output_file) + " " + str(self.input_file))
 
+class ExampleStreamingEngine(ExampleExternalEngine):
+    """Trivial external engine that parses its output incrementally.
+    """
+    def parse_frame(self, data):
+        end = data.find(b"\n")
+        if end < 0:
+            return None, 0
+        (coords, vels) = map(float, data[:end].split())
+        snap = ToySnapshot(coordinates=np.array([[coords]]),
+                           velocities=np.array([[vels]]))
+        return snap, end + 1
+
+
+class ExampleFIFOEngine(ExampleStreamingEngine):
+    """Trivial external engine that writes its output to a FIFO.
+    """
+    def prepare(self):
+        if os.path.exists(self.output_file):
+            os.remove(self.output_file)
+        os.mkfifo(self.output_file)
+
+    def cleanup(self):
+        os.remove(self.output_file)
+
+
 def setup_module():
     proc = psutil.Popen("make", cwd=engine_dir)
     proc.wait()
@@ -218,3 +245,167 @@ class TestExternalEngine(object):
         for testfile in glob.glob("test*out") + glob.glob("test*inp"):
             os.remove(testfile)
 
+
+
+class TestFrameWatchers(object):
+    def setup(self):
+        self.descriptor = SnapshotDescriptor.construct(
+            snapshot_class=ToySnapshot,
+            snapshot_dimensions={'n_spatial': 1,
+                                 'n_atoms': 1}
+        )
+        self.options = {
+            'n_frames_max' : 10000,
+            'engine_sleep' : 20,
+            'name_prefix' : "test",
+            'engine_directory' : engine_dir
+        }
+        self.template = peng.toy.Snapshot(coordinates=np.array([[0.0]]),
+                                          velocities=np.array([[1.0]]))
+        self.ensemble = paths.LengthEnsemble(5)
+
+    def teardown(self):
+        for testfile in glob.glob("test*out") + glob.glob("test*inp"):
+            os.remove(testfile)
+
+    def _run(self, engine_class, watcher):
+        options = dict(self.options, frame_watcher=watcher)
+        engine = engine_class(options, self.descriptor, self.template)
+        traj = engine.generate(self.template, [self.ensemble.can_append])
+        assert_items_equal(traj.xyz[:, 0, 0], [0.0, 1.0, 2.0, 3.0, 4.0])
+        assert_equal(engine._reader, None)
+        assert_equal(engine._watcher, None)
+        return engine
+
+    def test_watchers(self):
+        watchers = ['sleep', 'auto']
+        if file_watch.inotify_available():
+            watchers.append('inotify')
+        for watcher in watchers:
+            self._run(ExampleExternalEngine, watcher)
+            self._run(ExampleStreamingEngine, watcher)
+
+    def test_fifo(self):
+        for watcher in ['auto', 'select']:
+            self._run(ExampleFIFOEngine, watcher)
+
+    def test_bad_watcher(self):
+        # select needs an existing file to block on; otherwise we fall
+        # back to sleeping
+        options = dict(self.options, frame_watcher='select')
+        for engine_class in [ExampleExternalEngine, ExampleStreamingEngine]:
+            engine = engine_class(options, self.descriptor, self.template)
+            engine.set_filenames(0)
+            engine._open_output()
+            assert_equal(engine._watcher, None)
+            engine._close_output()
+        assert_raises(ValueError, file_watch.make_watcher, "testf.out",
+                      "foo")
+
+    def test_incremental_reader(self):
+        reader = file_watch.IncrementalFileReader("testf4.out")
+        assert_equal(reader.read(), 0)
+        with open("testf4.out", "w") as f:
+            f.write("1.0 1.0\n2.0")
+            f.flush()
+            assert_equal(reader.read(), 11)
+            reader.consume(8)
+            assert_equal(reader.buffer, b"2.0")
+            f.write(" 1.0\n")
+            f.flush()
+            assert_equal(reader.read(), 5)
+            assert_equal(reader.buffer, b"2.0 1.0\n")
+            assert_equal(reader.offset, 8)
+        reader.close()
+
+    def test_inotify_watcher(self):
+        if not file_watch.inotify_available():
+            raise SkipTest("inotify not available")
+        watcher = file_watch.InotifyWatcher("testf5.out")
+        assert_equal(watcher.wait(0.01), False)
+        with open("testf5.out", "w") as f:
+            f.write("1.0 1.0\n")
+        assert_equal(watcher.wait(1.0), True)
+        # changes to other files are ignored
+        with open("testf6.out", "w") as f:
+            f.write("1.0 1.0\n")
+        assert_equal(watcher.wait(0.01), False)
+        watcher.close()
+
+
+class ExamplePersistentEngine(peng.PersistentExternalEngine):
+    """Trivial persistent engine for persistent_engine.py in the tests.
+    """
+    read_frame_from_file = ExampleExternalEngine.read_frame_from_file
+    write_frame_to_file = ExampleExternalEngine.write_frame_to_file
+    set_filenames = ExampleExternalEngine.set_filenames
+
+    def worker_command(self):
+        script = os.path.join(self.engine_directory, "persistent_engine.py")
+        return " ".join([sys.executable, script, str(self.engine_sleep)])
+
+
+class TestPersistentExternalEngine(object):
+    def setup(self):
+        self.descriptor = SnapshotDescriptor.construct(
+            snapshot_class=ToySnapshot,
+            snapshot_dimensions={'n_spatial': 1,
+                                 'n_atoms': 1}
+        )
+        options = {
+            'n_frames_max' : 10000,
+            'engine_sleep' : 0,
+            'name_prefix' : "test",
+            'engine_directory' : engine_dir
+        }
+        self.template = peng.toy.Snapshot(coordinates=np.array([[0.0]]),
+                                          velocities=np.array([[1.0]]))
+        self.engine = ExamplePersistentEngine(options, self.descriptor,
+                                              self.template)
+        self.ensemble = paths.LengthEnsemble(5)
+
+    def teardown(self):
+        self.engine.close()
+        for testfile in glob.glob("test*out") + glob.glob("test*inp"):
+            os.remove(testfile)
+
+    def test_process_is_reused(self):
+        traj1 = self.engine.generate(self.template,
+                                     [self.ensemble.can_append])
+        proc = self.engine.proc
+        assert_equal(proc.is_running(), True)
+        assert_equal(len(self.engine.pool), 1)
+
+        start = traj1[-1]
+        traj2 = self.engine.generate(start, [self.ensemble.can_append])
+        assert_equal(self.engine.proc.pid, proc.pid)
+        assert_equal(len(self.engine.pool), 1)
+        assert_items_equal(traj1.xyz[:, 0, 0], [0.0, 1.0, 2.0, 3.0, 4.0])
+        assert_items_equal(traj2.xyz[:, 0, 0], [4.0, 5.0, 6.0, 7.0, 8.0])
+
+        self.engine.close()
+        assert_equal(len(self.engine.pool), 0)
+        assert_equal(proc.is_running(), False)
+
+    def test_shared_pool(self):
+        other = ExamplePersistentEngine(dict(self.engine.options),
+                                        self.descriptor, self.template,
+                                        pool=self.engine.pool)
+        other.name_prefix = "test_other"
+        self.engine.start(self.template)
+        # the only worker is busy
+        assert_raises(RuntimeError, other.start, self.template)
+        self.engine.stop(None)
+        traj = other.generate(self.template, [self.ensemble.can_append])
+        assert_equal(len(traj), 5)
+        assert_equal(other.proc.pid, self.engine.proc.pid)
+
+    def test_dead_worker_is_replaced(self):
+        self.engine.generate(self.template, [self.ensemble.can_append])
+        old_proc = self.engine.proc
+        old_proc.kill()
+        old_proc.wait()
+        traj = self.engine.generate(self.template,
+                                    [self.ensemble.can_append])
+        assert_equal(len(traj), 5)
+        assert_not_equal(self.engine.proc.pid, old_proc.pid)
@@ -17,6 +17,7 @@ else:
 
 
 from openpathsampling.engines.gromacs import *
+from openpathsampling.engines.gromacs.trr import TRRFrameReader
 
 import logging
 import numpy as np
@@ -181,6 +182,7 @@ class TestGromacsEngine(object):
         ens = paths.LengthEnsemble(3)
         traj = self.engine.generate(snap, running=[ens.can_append])
         assert_equal(self.engine.proc.is_running(), False)
+        assert_equal(len(self.engine._trr_readers), 0)
         assert_equal(len(traj), 3)
         ttraj = md.load(self.engine.trajectory_filename(1),
                         top=self.engine.gro)
@@ -207,6 +209,27 @@ class TestGromacsEngine(object):
         for f in files:
             os.remove(f)
 
+    def test_stop_closes_trr_readers(self):
+        traj_0 = self.engine.trajectory_filename(0)
+        self.engine.set_filenames(0)
+        snaps = [self.engine.read_frame_from_file(traj_0, frame)
+                 for frame in range(4)]
+        assert_equal(len(self.engine._trr_readers), 1)
+        reader = self.engine._trr_readers[traj_0]
+
+        # no Gromacs process to halt here
+        self.engine.halt_engine = lambda: None
+        self.engine.start_time = 0.0
+        self.engine.stop(paths.Trajectory(snaps))
+        assert_equal(len(self.engine._trr_readers), 0)
+        assert_equal(reader._file, None)
+
+        # the frames are still readable; their file is opened again
+        reader = TRRFrameReader(traj_0)
+        npt.assert_array_equal(snaps[3].xyz, reader.read_frame(3)[0])
+        reader.close()
+        self.engine.close_trr_readers()
+
     def test_open_file_caching(self):
         # read several frames from one file, then switch to another file
         # first read from 0000000, then 0000099
@@ -302,3 +325,92 @@ class TestGromacsExternalMDSnapshot(object):
         self._check_none_empty()
         self.snapshot.clear_cache()
         self._check_all_empty()
+
+
+class TestTRRFrameReader(object):
+    def setup(self):
+        if not HAS_MDTRAJ:
+            pytest.skip("MDTraj not installed.")
+        self.test_dir = data_filename("gromacs_engine")
+        self.full = os.path.join(self.test_dir, "project_trr", "0000000.trr")
+        self.growing = "growing_test.trr"
+
+    def teardown(self):
+        if os.path.isfile(self.growing):
+            os.remove(self.growing)
+
+    def test_read_frame_matches_mdtraj(self):
+        reader = TRRFrameReader(self.full)
+        with md.formats.TRRTrajectoryFile(self.full) as trr:
+            data = trr._read(n_frames=4, atom_indices=None,
+                             get_velocities=True)
+        for frame in [2, 0, 3, 1]:
+            xyz, vel, box = reader.read_frame(frame)
+            npt.assert_array_equal(xyz, data[0][frame])
+            npt.assert_array_equal(vel, data[5][frame])
+            npt.assert_array_equal(box, data[3][frame])
+        assert_equal(len(reader), 4)
+        assert_equal(reader.frame_status(4), None)
+        with pytest.raises(IndexError):
+            reader.read_frame(4)
+        reader.close()
+
+    def test_read_into_preallocated(self):
+        reader = TRRFrameReader(self.full)
+        xyz = np.zeros((1651, 3), dtype=np.float32)
+        vel = np.zeros((1651, 3), dtype=np.float32)
+        box = np.zeros((3, 3), dtype=np.float32)
+        result = reader.read_frame(1, xyz, vel, box)
+        assert result[0] is xyz
+        assert result[1] is vel
+        assert result[2] is box
+        npt.assert_array_equal(xyz, reader.read_frame(1)[0])
+        reader.close()
+
+    def test_growing_file(self):
+        with open(self.full, 'rb') as f:
+            contents = f.read()
+        frame_size = len(contents) // 4
+        with open(self.growing, 'wb') as out:
+            reader = TRRFrameReader(self.growing)
+            assert_equal(reader.frame_status(0), None)
+            out.write(contents[:frame_size + 100])
+            out.flush()
+            assert_equal(reader.frame_status(0), 'complete')
+            assert_equal(reader.frame_status(1), 'partial')
+            assert_equal(reader.frame_status(2), None)
+            with pytest.raises(RuntimeError):
+                reader.read_frame(1)
+            out.write(contents[frame_size + 100:])
+            out.flush()
+            assert_equal(reader.frame_status(3), 'complete')
+            xyz, _, _ = reader.read_frame(3)
+        full_reader = TRRFrameReader(self.full)
+        npt.assert_array_equal(xyz, full_reader.read_frame(3)[0])
+        reader.close()
+        full_reader.close()
+
+    def test_engine_reuses_reader(self):
+        engine = Engine(gro="conf.gro", mdp="md.mdp", top="topol.top",
+                        options={}, base_dir=self.test_dir,
+                        prefix="project")
+        reader = engine.trr_reader(self.full)
+        snap = engine.read_frame_from_file(self.full, 3)
+        assert engine.trr_reader(self.full) is reader
+        npt.assert_array_equal(snap.xyz, reader.read_frame(3)[0])
+
+        # replacing the file makes us reopen it
+        shutil.copy(self.full, self.growing)
+        reader2 = engine.trr_reader(self.growing)
+        shutil.copy(self.full, self.growing + ".new")
+        os.rename(self.growing + ".new", self.growing)
+        assert not reader2.is_current()
+        assert engine.trr_reader(self.growing) is not reader2
+
+        engine.options['max_open_trr'] = 1
+        engine.trr_reader(self.full)
+        assert_equal(len(engine._trr_readers), 1)
+        engine.close_trr_readers()
+        assert_equal(len(engine._trr_readers), 0)
+        shutil.rmtree(engine.prefix + "_log")
+        shutil.rmtree(engine.prefix + "_edr")
@@ -8,10 +8,14 @@ from .test_helpers import (raises_with_message_like, data_filename,
                            CalvinistDynamics, make_1d_traj,
                            assert_items_equal)
 from nose.tools import (assert_equal, assert_not_equal, raises,
-                        assert_almost_equal, assert_true)
-# from nose.plugins.skip import SkipTest
+                        assert_almost_equal, assert_true, assert_false,
+                        assert_raises)
+from nose.plugins.skip import SkipTest
 
 from openpathsampling.pathsimulators import *
+from openpathsampling.pathsimulators.parallel import (
+    fork_available, dumps_result, loads_result
+)
 import openpathsampling as paths
 import openpathsampling.engines.toy as toys
 import numpy as np
@@ -422,6 +426,85 @@ class TestCommittorSimulation(object):
         assert_true(counts['None-Right'] > 0)
         assert_equal(sum(counts.values()), 50)
 
+    def test_parallel_shots(self):
+        if not fork_available():
+            raise SkipTest("fork not available")
+        snap1 = toys.Snapshot(coordinates=np.array([[0.1]]),
+                              velocities=np.array([[-1.0]]),
+                              engine=self.engine)
+        sim = CommittorSimulation(storage=None,
+                                  engine=self.engine,
+                                  states=[self.left, self.right],
+                                  randomizer=paths.NoModification(),
+                                  initial_snapshots=[self.snap0, snap1],
+                                  direction=1)
+        serial = list(sim._serial_shots(3, as_chain=False))
+        parallel = list(sim._parallel_shots(3, as_chain=False,
+                                            n_workers=2, engines=None))
+        assert_equal(len(parallel), 6)
+        assert_equal([shot[:2] for shot in parallel],
+                     [shot[:2] for shot in serial])
+        uuids = set()
+        for (ser, par) in zip(serial, parallel):
+            (_, _, sample_set, change) = par
+            # objects that existed before the run are not copied
+            assert_true(change.canonical.mover is sim.forward_mover)
+            assert_true(sample_set[0].ensemble is sim.starting_ensemble)
+            sample = change.results[0]
+            assert_true(sample.ensemble is sim.forward_ensemble)
+            assert_equal(sample.trajectory.xyz.tolist(),
+                         ser[3].results[0].trajectory.xyz.tolist())
+            uuids.update(snap.__uuid__ for snap in sample.trajectory[1:])
+        n_new = sum(len(shot[3].results[0].trajectory) - 1
+                    for shot in parallel)
+        assert_equal(len(uuids), n_new)
+
+    def test_result_new_object_as_key(self):
+        snap = toys.Snapshot(coordinates=np.array([[0.5]]),
+                             velocities=np.array([[1.0]]),
+                             engine=self.engine)
+        known = {self.engine.__uuid__: self.engine}
+        result = loads_result(dumps_result({snap: 1}, known), known)
+        (new_snap, value), = result.items()
+        assert_equal(value, 1)
+        assert_true(new_snap is not snap)
+        assert_equal(new_snap.__uuid__, snap.__uuid__)
+        assert_true(new_snap.engine is self.engine)
+        assert_equal(new_snap.coordinates.tolist(), [[0.5]])
+
+    def test_parallel_engines(self):
+        if not fork_available():
+            raise SkipTest("fork not available")
+        engines = [toys.Engine(options=self.engine.options,
+                               topology=self.engine.topology)
+                   for _ in range(2)]
+        sim = CommittorSimulation(storage=None,
+                                  engine=self.engine,
+                                  states=[self.left, self.right],
+                                  randomizer=paths.NoModification(),
+                                  initial_snapshots=self.snap0,
+                                  direction=1)
+        shots = list(sim._parallel_shots(4, as_chain=True, n_workers=2,
+                                         engines=engines))
+        assert_equal([shot[:2] for shot in shots],
+                     [(0, 0), (0, 1), (0, 2), (0, 3)])
+        for shot in shots:
+            traj = shot[3].results[0].trajectory
+            assert_true(traj[-1].engine in engines)
+
+    def test_parallel_run(self):
+        if not fork_available():
+            raise SkipTest("fork not available")
+        sim = CommittorSimulation(storage=None,
+                                  engine=self.engine,
+                                  states=[self.left, self.right],
+                                  randomizer=paths.RandomVelocities(beta=1.0),
+                                  initial_snapshots=self.snap0,
+                                  direction=1)
+        sim.output_stream = open(os.devnull, 'w')
+        sim.run(10, n_workers=2)
+        assert_equal(sim.step, 10)
+
 class TestDirectSimulation(object):
     def setup(self):
         pes = toys.HarmonicOscillator(A=[1.0], omega=[1.0], x0=[0.0])
@@ -607,6 +690,18 @@ class TestDirectSimulation(object):
         assert_equal(sim.flux_events[(state, beta)],
                      expected_flux_events[(state, beta)])
 
+        for chunk_size in [1, 4, 100]:
+            engine = CalvinistDynamics(predetermined)
+            chunked = DirectSimulation(storage=None,
+                                       engine=engine,
+                                       states=[state, other_state],
+                                       flux_pairs=[(state, alpha),
+                                                   (state, beta)],
+                                       initial_snapshot=init[0])
+            chunked.run(len(predetermined)-1, chunk_size=chunk_size)
+            assert_equal(chunked.flux_events, expected_flux_events)
+            assert_equal(chunked.transition_count, sim.transition_count)
+
     def test_simple_flux(self):
         state = self.center
         interface = self.interface
@@ -629,6 +724,20 @@ class TestDirectSimulation(object):
         assert_equal(sim.flux_events[(state, interface)],
                      expected_flux_events[(state, interface)])
 
+    def test_chunked_run(self):
+        # frames are generated by the same deterministic dynamics, so the
+        # chunked run must find exactly the same events
+        self.sim.run(200)
+        for chunk_size in [1, 7, 64, 500]:
+            sim = DirectSimulation(storage=None,
+                                   engine=self.engine,
+                                   states=[self.center, self.outside],
+                                   flux_pairs=self.flux_pairs,
+                                   initial_snapshot=self.snap0)
+            sim.run(200, chunk_size=chunk_size)
+            assert_equal(sim.transition_count, self.sim.transition_count)
+            assert_equal(sim.flux_events, self.sim.flux_events)
+
     def test_sim_with_storage(self):
         tmpfile = data_filename("direct_sim_test.nc")
         if os.path.isfile(tmpfile):
@@ -693,3 +802,123 @@ class TestPathSampling(object):
         init_xyz = set(s.xyz.tostring() for s in initial_snaps)
         final_xyz = set(s.xyz.tostring() for s in final_snaps)
         assert init_xyz & final_xyz == set([])
+
+
+class TestPathSamplingWriteBehind(object):
+    def setup(self):
+        self.filename = data_filename("write_behind_test.nc")
+        self.storage = paths.Storage(self.filename, 'w')
+        ensemble = paths.LengthEnsemble(5)
+        mover = paths.PathReversalMover(ensemble)
+        init_cond = paths.SampleSet([
+            paths.Sample(replica=0, ensemble=ensemble,
+                         trajectory=make_1d_traj([0.1, 0.2, 0.3, 0.4, 0.5]))
+        ])
+        self.sim = PathSampling(storage=self.storage,
+                                move_scheme=paths.LockedMoveScheme(mover),
+                                sample_set=init_cond)
+        self.sim.output_stream = open(os.devnull, 'w')
+
+    def teardown(self):
+        self.sim.set_write_behind(None)
+        self.storage.close()
+        if os.path.isfile(self.filename):
+            os.remove(self.filename)
+
+    def test_run(self):
+        self.sim.set_write_behind(max_queued=2)
+        self.sim.save_frequency = 3
+        self.sim.run(10)
+        # all steps are saved when run returns
+        assert_equal(len(self.storage.steps), 11)
+        assert_equal([step.mccycle for step in self.storage.steps],
+                     list(range(11)))
+
+    def test_failing_run(self):
+        self.sim.set_write_behind()
+        # the progress output is written at the start of each step
+        refresh_output = paths.tools.refresh_output
+        n_calls = [0]
+
+        def failing_output(*args, **kwargs):
+            n_calls[0] += 1
+            if n_calls[0] > 4:
+                raise RuntimeError("failing step")
+            return refresh_output(*args, **kwargs)
+
+        paths.tools.refresh_output = failing_output
+        try:
+            assert_raises(RuntimeError, self.sim.run, 10)
+        finally:
+            paths.tools.refresh_output = refresh_output
+        # the steps before the failure are saved
+        assert_equal(len(self.storage.steps), 5)
+
+    def test_failing_run_and_writer(self):
+        self.sim.set_write_behind()
+        self.sim.save_frequency = 100
+
+        storage_save = paths.Storage.save
+
+        def failing_save(storage, obj):
+            raise IOError("failing save")
+
+        paths.Storage.save = failing_save
+        refresh_output = paths.tools.refresh_output
+        n_calls = [0]
+
+        def failing_output(*args, **kwargs):
+            n_calls[0] += 1
+            if n_calls[0] > 1:
+                raise RuntimeError("failing step")
+            return refresh_output(*args, **kwargs)
+
+        paths.tools.refresh_output = failing_output
+        try:
+            # the error of the simulation is raised, not the one of saving
+            assert_raises(RuntimeError, self.sim.run, 10)
+        finally:
+            paths.tools.refresh_output = refresh_output
+            paths.Storage.save = storage_save
+        assert_equal(self.sim._storage_writer, None)
+
+    def test_interrupted_run(self):
+        self.sim.set_write_behind()
+        writers = []
+        storage_writer = paths.storage.StorageWriter
+
+        def recording_writer(*args, **kwargs):
+            writers.append(storage_writer(*args, **kwargs))
+            return writers[-1]
+
+        refresh_output = paths.tools.refresh_output
+        n_calls = [0]
+
+        def interrupting_output(*args, **kwargs):
+            n_calls[0] += 1
+            if n_calls[0] > 4:
+                raise KeyboardInterrupt()
+            return refresh_output(*args, **kwargs)
+
+        paths.storage.StorageWriter = recording_writer
+        paths.tools.refresh_output = interrupting_output
+        try:
+            assert_raises(KeyboardInterrupt, self.sim.run, 10)
+        finally:
+            paths.tools.refresh_output = refresh_output
+            paths.storage.StorageWriter = storage_writer
+        # the steps before the interrupt are saved and the writer is closed
+        assert_equal(len(self.storage.steps), 5)
+        assert_equal(len(writers), 1)
+        assert_false(writers[0].running)
+        assert_equal(self.sim._storage_writer, None)
+
+    def test_switch_off(self):
+        self.sim.set_write_behind()
+        self.sim.run(2)
+        # the writer is only used during a run
+        assert_equal(self.sim._storage_writer, None)
+        self.sim.set_write_behind(None)
+        self.sim.run(2)
+        assert_equal(self.sim._storage_writer, None)
+        assert_equal(len(self.storage.steps), 5)
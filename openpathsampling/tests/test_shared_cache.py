@@ -0,0 +1,224 @@
+from __future__ import absolute_import
+
+import os
+import tempfile
+
+from nose.tools import (assert_equal, assert_true, assert_false,
+                        assert_raises, raises)
+from nose.plugins.skip import SkipTest
+
+import numpy as np
+
+import openpathsampling as paths
+from openpathsampling.netcdfplus import SharedValueCache
+from openpathsampling.pathsimulators.parallel import fork_available
+from .test_helpers import make_1d_traj
+
+
+class CountingFunction(object):
+    """Function for a CV that counts how often it is evaluated"""
+    def __init__(self):
+        self.n_calls = 0
+
+    def __call__(self, snapshot):
+        self.n_calls += 1
+        return snapshot.coordinates[0][0]
+
+
+def _evaluate_in_child(cv, snapshots):
+    # returns the number of CV evaluations in a forked child process
+    import multiprocessing
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+
+    def child():
+        cv.cv_callable.n_calls = 0
+        values = cv(snapshots)
+        queue.put((cv.cv_callable.n_calls, [float(v) for v in values]))
+
+    process = context.Process(target=child)
+    process.start()
+    result = queue.get(timeout=30)
+    process.join()
+    return result
+
+
+class TestSharedValueCache(object):
+    def setup(self):
+        self.traj = make_1d_traj([float(i) for i in range(40)])
+        self.tempdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tempdir, "cv_cache.bin")
+
+    def teardown(self):
+        if os.path.isfile(self.filename):
+            os.remove(self.filename)
+        os.rmdir(self.tempdir)
+
+    def test_set_get(self):
+        cache = SharedValueCache(100)
+        cache[self.traj[0]] = 1.5
+        cache.set_many(self.traj[1:3], [2.5, None])
+        assert_equal(cache[self.traj[0]], 1.5)
+        assert_equal(cache.get(self.traj[1]), 2.5)
+        assert_true(self.traj[1] in cache)
+        assert_false(self.traj[2] in cache)
+        assert_equal(cache.get(self.traj[2]), None)
+        assert_equal(len(cache), 2)
+        assert_equal((cache.n_hits, cache.n_misses), (2, 1))
+        cache.clear()
+        assert_equal(len(cache), 0)
+
+    def test_array_values(self):
+        cache = SharedValueCache(100, value_shape=(2, 3), dtype=np.float32)
+        value = np.arange(6).reshape(2, 3)
+        cache[self.traj[0]] = value
+        result = cache[self.traj[0]]
+        assert_equal(result.dtype, np.float32)
+        np.testing.assert_array_equal(result, value)
+
+    @raises(ValueError)
+    def test_wrong_shape(self):
+        cache = SharedValueCache(100, value_shape=(3,))
+        cache[self.traj[0]] = [1.0, 2.0]
+
+    def test_reversible(self):
+        cache = SharedValueCache(100, reversible=True)
+        cache[self.traj[0]] = 3.0
+        assert_equal(cache[self.traj[0].reversed], 3.0)
+        irreversible = SharedValueCache(100)
+        irreversible[self.traj[0]] = 3.0
+        assert_false(self.traj[0].reversed in irreversible)
+
+    def test_eviction(self):
+        cache = SharedValueCache(16, n_probe=4)
+        for (i, snap) in enumerate(self.traj):
+            cache[snap] = float(i)
+        assert_equal(len(cache), 16)
+        # the latest entry is always kept; all found values are correct
+        assert_equal(cache[self.traj[-1]], 39.0)
+        for (i, snap) in enumerate(self.traj):
+            assert_true(cache.get(snap) in [None, float(i)])
+
+    def test_file(self):
+        cache = SharedValueCache(100, (3,), filename=self.filename)
+        cache[self.traj[0]] = [1.0, 2.0, 3.0]
+        attached = SharedValueCache(100, (3,), filename=self.filename)
+        np.testing.assert_array_equal(attached[self.traj[0]],
+                                      [1.0, 2.0, 3.0])
+        attached[self.traj[1]] = [4.0, 5.0, 6.0]
+        np.testing.assert_array_equal(cache[self.traj[1]], [4.0, 5.0, 6.0])
+        cache.close()
+        attached.close()
+
+    @raises(RuntimeError)
+    def test_file_wrong_parameters(self):
+        cache = SharedValueCache(100, filename=self.filename)
+        cache.close()
+        SharedValueCache(50, filename=self.filename)
+
+    @raises(RuntimeError)
+    def test_file_too_short(self):
+        with open(self.filename, 'wb') as f:
+            f.write(b'\0' * 10)
+        SharedValueCache(100, filename=self.filename)
+
+    def test_file_without_fcntl(self):
+        from openpathsampling.netcdfplus import shared_cache
+        fcntl = shared_cache.fcntl
+        shared_cache.fcntl = None
+        try:
+            assert_raises(RuntimeError, SharedValueCache, 100,
+                          filename=self.filename)
+            # anonymous maps don't need file locks
+            cache = SharedValueCache(100)
+            cache[self.traj[0]] = 1.0
+            assert_equal(cache[self.traj[0]], 1.0)
+        finally:
+            shared_cache.fcntl = fcntl
+        assert_false(os.path.exists(self.filename))
+
+    def test_owners(self):
+        cache = SharedValueCache(100, reversible=True)
+        (owner, other) = self.traj[-2:]
+        cache.set_many(self.traj[:2], [1.0, 2.0], owner)
+        cache.set_many(self.traj[:1], [3.0], other)
+        assert_equal(cache.get_value(self.traj[0], owner), 1.0)
+        assert_equal(cache.get_value(self.traj[0].reversed, owner), 1.0)
+        assert_equal(cache.get_value(self.traj[0], other), 3.0)
+        assert_true(cache.has_value(self.traj[1], owner))
+        assert_false(cache.has_value(self.traj[1], other))
+        assert_false(self.traj[0] in cache)
+
+    def test_owner_keys_spread(self):
+        # uuids of the keys and the owner are close: all entries are kept
+        cache = SharedValueCache(1000)
+        cache.set_many(self.traj[:-1], list(range(39)), self.traj[-1])
+        assert_equal(len(cache), 39)
+
+    def test_cv_shared_cache(self):
+        function = CountingFunction()
+        cv = paths.FunctionCV("x", function)
+        cache = SharedValueCache(100)
+        cv.set_shared_cache(cache)
+        assert_equal(cv._single_dict.str_chain(),
+                     "ExpandSingle > ReversibleCacheChainDict > "
+                     "SharedCacheChainDict > Function")
+        values = cv(self.traj[:10])
+        assert_equal(function.n_calls, 10)
+        assert_equal(len(cache), 10)
+
+        # a second CV computes its own values
+        other = paths.FunctionCV("y", lambda s: -s.coordinates[0][0])
+        other.set_shared_cache(cache)
+        assert_equal(list(other(self.traj[:10])), [-v for v in values])
+        assert_equal(len(cache), 20)
+        assert_equal(list(cv(self.traj[:10])), list(values))
+        assert_equal(function.n_calls, 10)
+
+        cv.set_shared_cache(None)
+        assert_equal(cv._single_dict.str_chain(),
+                     "ExpandSingle > ReversibleCacheChainDict > Function")
+
+    def test_cv_reversibility(self):
+        cache = SharedValueCache(100, reversible=True)
+        forward = self.traj[:5]
+        backward = [snap.reversed for snap in forward]
+
+        reversible = paths.FunctionCV("x", CountingFunction(),
+                                      cv_time_reversible=True)
+        reversible.set_shared_cache(cache)
+        reversible(forward)
+        reversible._cache_dict.cache.clear()
+        reversible(backward)
+        assert_equal(reversible.cv_callable.n_calls, 5)
+
+        # a CV that is not time-reversible computes its own values for the
+        # reversed snapshots, even with a reversible table
+        velocity = paths.FunctionCV("v", lambda s: s.velocities[0][0])
+        velocity.set_shared_cache(cache)
+        assert_equal(list(velocity(forward)), [1.0] * 5)
+        velocity._cache_dict.cache.clear()
+        assert_equal(list(velocity(backward)), [-1.0] * 5)
+
+        # the table setting is the default for lookups
+        owner = self.traj[-1]
+        cache.set_many(self.traj[5:6], [1.0], owner)
+        reversed_snap = self.traj[5].reversed
+        assert_true(cache.has_value(reversed_snap, owner))
+        assert_true(cache.has_value(reversed_snap, owner, reversible=True))
+        assert_false(cache.has_value(reversed_snap, owner, reversible=False))
+
+    def test_shared_between_processes(self):
+        if not fork_available():
+            raise SkipTest("fork not available")
+        cv = paths.FunctionCV("x", CountingFunction())
+        cv.set_shared_cache(SharedValueCache(100))
+        cv(self.traj[:10])
+        # the child computes the values that are not yet shared ...
+        n_calls, values = _evaluate_in_child(cv, self.traj)
+        assert_equal(n_calls, 30)
+        assert_equal(values, [float(i) for i in range(40)])
+        # ... and these are available to another child
+        n_calls, values = _evaluate_in_child(cv, self.traj)
+        assert_equal(n_calls, 0)
+        assert_equal(values, [float(i) for i in range(40)])
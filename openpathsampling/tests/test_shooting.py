@@ -1,5 +1,6 @@
 from builtins import object
 import collections
+import math
 from nose.tools import assert_equal, assert_almost_equal, raises
 from nose.plugins.skip import Skip, SkipTest
 from openpathsampling.tests.test_helpers import (
@@ -7,6 +8,7 @@ from openpathsampling.tests.test_helpers import (
     assert_items_equal, CalvinistDynamics
 )
 import pytest
+import numpy as np
 
 from openpathsampling.shooting import *
 from openpathsampling.pathmover import ForwardShootMover, BackwardShootMover
@@ -78,6 +80,55 @@ class TestGaussianBiasSelector(SelectorTest):
         assert self.sel.probability(traj[frame], traj) == expected
 
 
+    def test_sum_bias(self):
+        assert self.sel.sum_bias(self.mytraj) == pytest.approx(sum(self.f))
+        assert self.sel.sum_bias(paths.Trajectory([])) == 0.0
+
+    def test_pick_matches_linear_search(self):
+        biases = self.f
+        np.random.seed(42)
+        randoms = np.random.random(50)
+        np.random.seed(42)
+        for rand in randoms:
+            expected = 0
+            total = biases[0]
+            while total <= rand * sum(biases):
+                expected += 1
+                total += biases[expected]
+            assert self.sel.pick(self.mytraj) == expected
+
+    def test_biases_reused(self):
+        n_calls = []
+        biases = self.sel._biases
+
+        def counting_biases(trajectory):
+            n_calls.append(len(trajectory))
+            return biases(trajectory)
+
+        self.sel._biases = counting_biases
+        other = make_1d_traj(coordinates=[0.0, 0.25])
+        self.sel.pick(self.mytraj)
+        self.sel.probability_ratio(self.mytraj[2], self.mytraj, other)
+        self.sel.sum_bias(self.mytraj)
+        assert n_calls == [5, 2]
+        expected = sum(self.f) / (1.0 + math.exp(-2.0 * 0.25 ** 2))
+        assert (self.sel.probability_ratio(self.mytraj[2], self.mytraj,
+                                           other)
+                == pytest.approx(expected))
+
+
+    def test_parameters_change_biases(self):
+        self.sel.sum_bias(self.mytraj)
+        self.sel.alpha = 1.0
+        expected = sum(math.exp(-(x - 0.25) ** 2)
+                       for x in [-0.5, 0.1, 0.2, 0.3, 0.5])
+        assert self.sel.sum_bias(self.mytraj) == pytest.approx(expected)
+        self.sel.l_0 = 0.0
+        self.sel.collectivevariable = paths.FunctionCV(
+            "Neg", lambda x: -x.xyz[0][0])
+        expected = sum(math.exp(-x ** 2) for x in [-0.5, 0.1, 0.2, 0.3, 0.5])
+        assert self.sel.sum_bias(self.mytraj) == pytest.approx(expected)
+
 class TestFirstFrameSelector(SelectorTest):
     def test_pick(self):
         sel = FirstFrameSelector()
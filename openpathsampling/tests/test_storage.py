@@ -10,7 +10,8 @@ import os
 
 import pytest
 
-from nose.tools import (assert_equal)
+from nose.tools import (assert_equal, assert_not_equal, assert_false,
+                        assert_true, assert_raises, raises)
 
 import openpathsampling as paths
 
@@ -18,8 +19,10 @@ import openpathsampling.engines.openmm as peng
 import openpathsampling.engines.toy as toys
 
 from openpathsampling.netcdfplus import ObjectJSON
-from openpathsampling.storage import Storage
-from .test_helpers import (data_filename, md, compare_snapshot)
+from openpathsampling.storage import Storage, StorageWriter
+from openpathsampling.storage.stores import TrajectoryStore
+from .test_helpers import (data_filename, md, compare_snapshot,
+                           make_1d_traj)
 
 import numpy as np
 from nose.plugins.skip import SkipTest
@@ -405,3 +408,359 @@ class TestStorage(object):
 
         assert(os.path.isfile(self.filename))
         assert(store.storage_version == paths.version.version)
+
+
+class TestSnapshotSaveMany(object):
+    def setup(self):
+        self.filename = data_filename("snapshot_save_many_test.nc")
+        self.filename_single = data_filename("snapshot_save_single_test.nc")
+        self.traj = make_1d_traj([float(x) for x in range(10)])
+        self.storage = Storage(self.filename, 'w')
+
+    def teardown(self):
+        self.storage.close()
+        for filename in [self.filename, self.filename_single]:
+            if os.path.isfile(filename):
+                os.remove(filename)
+
+    def _loaded(self, idx):
+        snapshots = self.storage.snapshots
+        snapshots.cache.clear()
+        for store in snapshots.store_snapshot_list:
+            store.cache.clear()
+        self.storage.trajectories.cache.clear()
+        return self.storage.trajectories[idx]
+
+    def test_save_trajectory(self):
+        # includes snapshots that are stored already and a reversed copy
+        self.storage.save(paths.Trajectory(self.traj[3:5]))
+        traj = paths.Trajectory(
+            list(self.traj) + [self.traj[6].reversed, self.traj[2]])
+        self.storage.save(traj)
+
+        snapshots = self.storage.snapshots
+        assert_equal(len(snapshots), 20)
+        assert_equal(snapshots.vars['store'][:], [0] * 10)
+
+        loaded = self._loaded(1)
+        assert_equal([s.__uuid__ for s in loaded],
+                     [s.__uuid__ for s in traj])
+        assert_equal([s.coordinates[0][0] for s in loaded],
+                     [s.coordinates[0][0] for s in traj])
+        assert_equal(snapshots.idx(self.traj[6].reversed),
+                     snapshots.idx(self.traj[6]) ^ 1)
+
+    def test_same_as_single_saves(self):
+        self.storage.save(self.traj[0].reversed)
+        self.storage.snapshots.save_many(self.traj)
+
+        single = Storage(self.filename_single, 'w')
+        single.save(self.traj[0].reversed)
+        for snapshot in self.traj:
+            single.snapshots.save(snapshot)
+
+        for (batched, store, names) in [
+            (self.storage.snapshots, single.snapshots, ['store', 'uuid']),
+            (self.storage.snapshots.store_snapshot_list[0],
+             single.snapshots.store_snapshot_list[0],
+             ['index', 'uuid', 'coordinates', 'velocities', 'engine'])
+        ]:
+            for name in names:
+                np.testing.assert_array_equal(
+                    batched.variables[name][:], store.variables[name][:])
+
+        single.close()
+
+    def test_mentioned_snapshots(self):
+        self.storage.trajectories.mention(paths.Trajectory(self.traj[:5]))
+        assert_equal(self.storage.snapshots.vars['store'][:], [None] * 5)
+        self.storage.save(self.traj)
+        assert_equal(self.storage.snapshots.vars['store'][:], [0] * 10)
+        loaded = self._loaded(1)
+        assert_equal([s.coordinates[0][0] for s in loaded],
+                     [float(x) for x in range(10)])
+
+    def test_save_step(self):
+        ensemble = paths.LengthEnsemble(10)
+        sample = paths.Sample(replica=0, trajectory=self.traj,
+                              ensemble=ensemble)
+        step = paths.MCStep(mccycle=0, active=paths.SampleSet([sample]),
+                            change=paths.EmptyMoveChange())
+        self.storage.steps.save(step)
+        assert_equal(len(self.storage.snapshots), 20)
+        loaded = self._loaded(0)
+        assert_equal([s.__uuid__ for s in loaded],
+                     [s.__uuid__ for s in self.traj])
+
+
+    def test_save_array_trajectory(self):
+        self.storage.save(self.traj[0])
+        store = self.storage.snapshots.store_snapshot_list[0]
+        var = store.vars['coordinates']
+        set_many = var.set_many
+        written = []
+
+        def record(idx, values):
+            written.append(values)
+            set_many(idx, values)
+
+        var.set_many = record
+        traj = paths.ArrayTrajectory(self.traj)
+        traj.buffers  # e.g., gathered by a CV before
+        self.storage.save(traj)
+
+        # the new frames are written as a view of the buffer
+        assert_true(len(written) > 0)
+        for values in written:
+            assert_equal(len(values), 9)
+            assert_true(np.shares_memory(values, traj.coordinates))
+        loaded = self._loaded(0)
+        assert_equal([s.coordinates[0][0] for s in loaded],
+                     [float(x) for x in range(10)])
+
+    def test_complete_cv(self):
+        n_calls = []
+
+        def x_values(snapshots):
+            n_calls.append(len(snapshots))
+            return [snap.coordinates[0][0] for snap in snapshots]
+
+        cv = paths.FunctionCV(
+            'x', x_values, cv_time_reversible=True, cv_requires_lists=True
+        ).with_diskcache(allow_incomplete=False)
+        self.storage.save(self.traj[0])
+        self.storage.save(cv)
+        del n_calls[:]
+
+        # the values of all new snapshots are computed in one call
+        self.storage.save(self.traj)
+        assert_equal(n_calls, [9])
+        store = self.storage.snapshots.attribute_list[cv]
+        assert_equal(list(store.vars['value'][:]),
+                     [float(x) for x in range(10)])
+
+class TestTrajectoryDeltaEncoding(object):
+    def setup(self):
+        self.filename = data_filename("trajectory_delta_test.nc")
+        self.storage = Storage(self.filename, 'w')
+        self.storage.trajectories.delta_encoding = True
+
+        parent = make_1d_traj([float(x) for x in range(20)])
+        self.trajs = [
+            parent,
+            # forward and backward shot
+            paths.Trajectory(parent[:8] + make_1d_traj([0.5] * 5)),
+            paths.Trajectory(make_1d_traj([0.25] * 4) + parent[12:]),
+            parent.reversed,
+            make_1d_traj([3.0] * 5)
+        ]
+        for traj in self.trajs:
+            self.storage.save(traj)
+
+    def teardown(self):
+        self.storage.close()
+        if os.path.isfile(self.filename):
+            os.remove(self.filename)
+
+    def _check_loaded(self):
+        trajectories = self.storage.trajectories
+        trajectories.cache.clear()
+        trajectories._references.clear()
+        for idx, traj in enumerate(self.trajs):
+            assert_equal([s.__uuid__ for s in trajectories[idx]],
+                         [s.__uuid__ for s in traj])
+
+    def _n_frames_written(self):
+        return [len(frames) // 36 for frames in
+                self.storage.trajectories.variables['snapshots'][:]]
+
+    def test_segments(self):
+        parent = [0, 2, 4, 6, 8]
+        references = [2, 4, 11, 13, 7, 5]
+        segments, frames = TrajectoryStore.segments(parent, references)
+        assert_equal(segments, [1, 2, -1, 2, 3, -2])
+        assert_equal(frames, [11, 13])
+        assert_equal(
+            TrajectoryStore.apply_segments(parent, segments, frames),
+            references)
+
+    def test_parent_with_missing_snapshots(self):
+        trajectories = self.storage.trajectories
+        references, depth = trajectories.snapshot_uuids(0)
+        missing = list(references)
+        missing[10] = None
+        trajectories._references[0] = (missing, depth)
+        traj = paths.Trajectory(self.trajs[0][:15] + make_1d_traj([0.5]))
+        # the trajectory with a missing snapshot is not used as parent
+        self.storage.save(traj)
+        self.trajs.append(traj)
+        assert_not_equal(trajectories.vars['parent'][len(self.trajs) - 1], 0)
+        self._check_loaded()
+
+    def test_references_recently_used(self):
+        trajectories = self.storage.trajectories
+        trajectories._references.clear()
+        trajectories._references_size = 2
+        trajectories.snapshot_uuids(0)
+        trajectories.snapshot_uuids(4)
+        # using a trajectory keeps it, the least recently used is dropped
+        trajectories.snapshot_uuids(0)
+        trajectories.snapshot_uuids(1)
+        assert_equal(list(trajectories._references), [0, 1])
+
+    def test_save_load(self):
+        trajectories = self.storage.trajectories
+        assert_equal(trajectories.vars['parent'][:],
+                     [None, 0, 0, 0, None])
+        assert_equal(self._n_frames_written(), [20, 5, 4, 0, 5])
+        self._check_loaded()
+
+        snapshot = trajectories[2][6]
+        assert_equal(snapshot.coordinates[0][0], 14.0)
+
+    def test_max_depth(self):
+        trajectories = self.storage.trajectories
+        trajectories.max_delta_depth = 1
+        child = paths.Trajectory(make_1d_traj([1.5]) + self.trajs[1][5:])
+        self.storage.save(child)
+        self.trajs.append(child)
+        assert_equal(trajectories.vars['parent'][5], None)
+        self._check_loaded()
+
+    def test_convert(self):
+        trajectories = self.storage.trajectories
+        trajectories.convert(False)
+        assert_equal(trajectories.vars['parent'][:], [None] * 5)
+        assert_equal(self._n_frames_written(), [20, 13, 12, 20, 5])
+        self._check_loaded()
+
+        trajectories.convert(True)
+        assert_equal(self._n_frames_written(), [20, 5, 4, 0, 5])
+        self._check_loaded()
+
+    def test_cache_all(self):
+        trajectories = self.storage.trajectories
+        trajectories.cache.clear()
+        trajectories.cache_all()
+        for idx, traj in enumerate(self.trajs):
+            assert_equal([s.__uuid__ for s in trajectories.cache[idx]],
+                         [s.__uuid__ for s in traj])
+
+
+class TestLazyRestore(object):
+    def setup(self):
+        self.filename = data_filename("lazy_restore_test.nc")
+        storage = Storage(self.filename, 'w')
+        self.trajs = [make_1d_traj([float(i), float(i) + 0.5])
+                      for i in range(5)]
+        for traj in self.trajs:
+            storage.save(traj)
+
+        self.ensemble = paths.LengthEnsemble(2).named('length 2')
+        storage.save(self.ensemble)
+        # a complete store of values for all snapshots
+        self.cv = paths.FunctionCV(
+            'size', np.size, cv_time_reversible=True).with_diskcache()
+        storage.save(self.cv)
+        storage.sync_all()
+        storage.close()
+
+        self.storage = Storage(self.filename, 'r', lazy=True)
+
+    def teardown(self):
+        self.storage.close()
+        if os.path.isfile(self.filename):
+            os.remove(self.filename)
+
+    def test_index(self):
+        trajectories = self.storage.trajectories
+        assert_true(trajectories._restore_pending)
+        assert_true(self.trajs[3] in trajectories)
+        assert_false(trajectories._restore_pending)
+        assert_equal(trajectories.idx(self.trajs[3]), 3)
+
+        loaded = trajectories[self.trajs[2].__uuid__]
+        assert_equal([s.__uuid__ for s in loaded],
+                     [s.__uuid__ for s in self.trajs[2]])
+
+    def test_names(self):
+        ensembles = self.storage.ensembles
+        assert_equal(ensembles.find_indices('length 2'),
+                     [ensembles.idx(self.ensemble)])
+
+    def test_snapshots(self):
+        snapshots = self.storage.snapshots
+        assert_equal(len(snapshots), 20)
+        assert_equal(snapshots[2].__uuid__, self.trajs[0][1].__uuid__)
+        assert_equal(snapshots[3].__uuid__,
+                     self.trajs[0][1].reversed.__uuid__)
+
+    def test_attributes(self):
+        cv = self.storage.cvs[0]
+        assert_true(self.storage._attributes_pending)
+        store = self.storage.snapshots.attribute_list[cv]
+        assert_false(self.storage._attributes_pending)
+
+        # the values are loaded from the file
+        assert_equal(len(store), 10)
+        assert_equal(store[self.storage.snapshots[4]], 1)
+
+
+class TestStorageWriter(object):
+    def setup(self):
+        self.filename = data_filename("storage_writer_test.nc")
+        self.storage = Storage(self.filename, 'w')
+        self.trajs = [make_1d_traj([float(i), float(i) + 0.5])
+                      for i in range(10)]
+
+    def teardown(self):
+        self.storage.close()
+        if os.path.isfile(self.filename):
+            os.remove(self.filename)
+
+    def test_save(self):
+        writer = StorageWriter(self.storage, max_queued=2)
+        for traj in self.trajs:
+            writer.save(traj)
+        writer.sync()
+        writer.flush()
+        assert_equal(writer.n_saved, 10)
+        assert_equal(len(self.storage.trajectories), 10)
+        assert_equal(len(self.storage.snapshots), 40)
+        writer.close()
+        assert_false(writer.running)
+
+    def test_close_saves_all(self):
+        writer = StorageWriter(self.storage)
+        for traj in self.trajs:
+            writer.save(traj)
+        writer.close()
+        assert_equal(len(self.storage.trajectories), 10)
+
+    def test_storage_close(self):
+        writer = StorageWriter(self.storage)
+        for traj in self.trajs:
+            writer.save(traj)
+        # closing the storage saves the queued objects first
+        self.storage.close()
+        assert_false(writer.running)
+        assert_equal(self.storage.writers, [])
+        self.storage = Storage(self.filename, 'r')
+        assert_equal(len(self.storage.trajectories), 10)
+
+    @raises(ValueError)
+    def test_max_queued(self):
+        StorageWriter(self.storage, max_queued=0)
+
+    def test_error(self):
+        writer = StorageWriter(self.storage)
+        writer.save(self.trajs[0])
+        writer.save(object())
+        writer.save(self.trajs[1])
+        # objects of unknown type cannot be stored
+        assert_raises(RuntimeWarning, writer.flush)
+        assert_false(writer.running)
+        # nothing is written after the failure
+        assert_equal(len(self.storage.trajectories), 1)
+        assert_raises(RuntimeWarning, writer.save, self.trajs[2])
+        assert_raises(RuntimeWarning, writer.close)
@@ -9,7 +9,8 @@ from past.utils import old_div
 from builtins import object
 import os
 
-from nose.tools import (assert_equal, assert_not_equal, assert_almost_equal)
+from nose.tools import (assert_equal, assert_not_equal, assert_almost_equal,
+                        assert_true, assert_false, assert_raises)
 
 from nose.plugins.skip import SkipTest
 
@@ -130,6 +131,64 @@ class TestCombinations(object):
         assert_almost_equal(self.simpletest.kinetic_energy(self), 0.4575)
 
 
+class TestArrayEvaluation(object):
+    def setup(self):
+        self.mass = sys_mass
+        self.pes = gaussian + outer - linear + harmonic
+        # each frame is one configuration
+        self.configurations = np.array([[0.7, 0.65], [0.1, -0.2],
+                                        [0.8, 0.5], [-0.3, 0.45]])
+
+    def _per_configuration(self, fcn):
+        results = []
+        for config in self.configurations:
+            self.positions = config
+            results.append(np.copy(fcn(self)))
+        return np.array(results)
+
+    def test_V_array(self):
+        expected = self._per_configuration(self.pes.V)
+        np.testing.assert_allclose(
+            self.pes.V_array(self.configurations, self.mass), expected
+        )
+
+    def test_dVdx_array(self):
+        expected = self._per_configuration(self.pes.dVdx)
+        np.testing.assert_allclose(
+            self.pes.dVdx_array(self.configurations, self.mass), expected
+        )
+        # constant gradients are broadcast to one row per configuration
+        np.testing.assert_allclose(
+            linear.dVdx_array(self.configurations),
+            [[1.5, 0.75]] * len(self.configurations)
+        )
+
+    def test_flatten(self):
+        flat = self.pes.flatten()
+        np.testing.assert_allclose(
+            flat.V_array(self.configurations, self.mass),
+            self.pes.V_array(self.configurations, self.mass)
+        )
+        np.testing.assert_allclose(
+            flat.dVdx_array(self.configurations, self.mass),
+            self.pes.dVdx_array(self.configurations, self.mass)
+        )
+        self.positions = init_pos
+        (V, dVdx) = flat.V_and_dVdx(self)
+        assert_almost_equal(V, self.pes.V(self))
+        np.testing.assert_allclose(dVdx, self.pes.dVdx(self))
+
+    def test_flatten_shared_centers(self):
+        shared = toy.Gaussian(2.0, [1.0, 1.0], [0.25, 0.75])
+        pes = harmonic - shared + shared
+        flat = pes.flatten()
+        assert_equal(len(flat._centers), 1)
+        np.testing.assert_allclose(
+            flat.V_array(self.configurations, self.mass),
+            harmonic.V_array(self.configurations, self.mass)
+        )
+
+
 # === TESTS FOR TOY ENGINE OBJECT =========================================
 
 class Test_convert_fcn(object):
@@ -233,6 +292,133 @@ class TestToyEngine(object):
             assert_items_equal(s1.coordinates[0], s2.coordinates[0])
             assert_items_equal(s1.velocities[0], s2.velocities[0])
 
+    def test_generate_batch(self):
+        # walkers starting closer to the edges stop earlier
+        def running(traj, trusted=False):
+            return all(0.65 < snap.coordinates[0][0] < 0.75
+                       for snap in [traj[0], traj[-1]])
+
+        starts = []
+        for x in [0.7, 0.72, 0.74, 0.8]:
+            self.sim.positions = np.array([x, 0.65])
+            self.sim.velocities = init_vel.copy()
+            starts.append(self.sim.current_snapshot)
+
+        self.sim.options['n_frames_max'] = 20
+        for direction in [+1, -1]:
+            batch = self.sim.generate_batch(starts, running, direction)
+            assert_equal(len(batch), len(starts))
+            for (start, traj) in zip(starts, batch):
+                serial = self.sim.generate(start, running, direction)
+                assert_equal(len(traj), len(serial))
+                for (s1, s2) in zip(traj, serial):
+                    np.testing.assert_allclose(s1.coordinates,
+                                               s2.coordinates)
+                    np.testing.assert_allclose(s1.velocities,
+                                               s2.velocities)
+
+        assert_equal([len(t) for t in batch], [5, 7, 8, 1])
+
+    def test_generate_batch_max_length(self):
+        snap = self.sim.current_snapshot
+        try:
+            self.sim.generate_batch([snap, snap], [true_func])
+        except paths.engines.EngineMaxLengthError as e:
+            assert_equal(len(e.last_trajectory), self.sim.n_frames_max)
+        else:
+            raise RuntimeError('Did not raise MaxLength Error')
+
+    def test_generate_batch_rejects_retry(self):
+        snap = self.sim.current_snapshot
+        for option in ['on_nan', 'on_max_length']:
+            old = self.sim.options[option]
+            self.sim.options[option] = 'retry'
+            assert_raises(ValueError, self.sim.generate_batch,
+                          [snap, snap], [true_func])
+            self.sim.options[option] = old
+
+    def test_generate_batch_nan(self):
+        snap = self.sim.current_snapshot
+        # the third new frame is not valid
+        n_checked = [0]
+
+        def is_valid_snapshot(snapshot):
+            n_checked[0] += 1
+            return n_checked[0] % 3 != 0
+
+        self.sim.is_valid_snapshot = is_valid_snapshot
+        self.sim.initialized = True
+        try:
+            self.sim.generate(snap, [true_func])
+        except paths.engines.EngineNaNError as e:
+            serial = e.last_trajectory
+        else:
+            raise RuntimeError('Did not raise NaN Error')
+
+        n_checked[0] = 0
+        try:
+            self.sim.generate_batch([snap], [true_func])
+        except paths.engines.EngineNaNError as e:
+            batch = e.last_trajectory
+        else:
+            raise RuntimeError('Did not raise NaN Error')
+
+        # neither contains the invalid snapshot
+        assert_equal(len(serial), 3)
+        assert_equal(len(batch), len(serial))
+        for (s1, s2) in zip(batch, serial):
+            np.testing.assert_allclose(s1.coordinates, s2.coordinates)
+
+    def test_flattened_pes_dynamics(self):
+        self.sim._pes = (gaussian + outer - linear).flatten()
+        snap = self.sim.generate_next_frame()
+        self.sim._pes = gaussian + outer - linear
+        self.sim.current_snapshot = toy.Snapshot(
+            coordinates=np.array([init_pos]),
+            velocities=np.array([init_vel])
+        )
+        np.testing.assert_allclose(self.sim.generate_next_frame().coordinates,
+                                   snap.coordinates)
+
+    def test_snapshots_share_frame_blocks(self):
+        self.sim._frames = toy.engine.ToyFrameBuffer(block_size=3)
+        snaps = [self.sim.generate_next_frame() for _ in range(4)]
+        # frames are views of the engine's blocks and can't be changed
+        assert_true(snaps[0].coordinates.base is snaps[2].coordinates.base)
+        assert_true(snaps[2].coordinates.base
+                    is not snaps[3].coordinates.base)
+        assert_false(snaps[0].coordinates.flags.writeable)
+        assert_false(snaps[0].velocities.flags.writeable)
+        # later frames don't change earlier ones
+        assert_equal(len(set(snap.coordinates[0][0] for snap in snaps)), 4)
+        np.testing.assert_allclose(snaps[-1].coordinates[0],
+                                   self.sim.positions)
+
+    def test_snapshot_set_reuses_state(self):
+        snap = self.sim.generate_next_frame()
+        self.sim.current_snapshot = snap
+        positions = self.sim.positions
+        self.sim.generate_next_frame()
+        self.sim.current_snapshot = snap
+        # the engine's own array is reused, ...
+        assert_true(self.sim.positions is positions)
+        np.testing.assert_allclose(self.sim.positions, snap.coordinates[0])
+        # ... but arrays set from outside are not overwritten
+        outside = init_pos.copy()
+        self.sim.positions = outside
+        self.sim.current_snapshot = snap
+        assert_true(self.sim.positions is not outside)
+        np.testing.assert_allclose(outside, init_pos)
+
+    def test_set_state_from_snapshot_arrays(self):
+        snap = self.sim.generate_next_frame()
+        self.sim.positions = snap.coordinates[0]
+        self.sim.velocities = snap.velocities[0]
+        # the read-only arrays of the snapshot are copied
+        assert_true(self.sim.positions.flags.writeable)
+        self.sim.generate_next_frame()
+        assert_not_equal(self.sim.positions[0], snap.coordinates[0][0])
+
     def test_start_with_snapshot(self):
         snap = toy.Snapshot(coordinates=np.array([1,2]),
                         velocities=np.array([3,4]))
@@ -339,3 +525,12 @@ class TestLangevinBAOABIntegrator(object):
 
     def test_step(self):
         self.sim.generate_next_frame()
+
+    def test_generate_batch(self):
+        ens = paths.LengthEnsemble(4)
+        snap = self.sim.current_snapshot
+        trajs = self.sim.generate_batch([snap] * 3, [ens.can_append])
+        assert_equal([len(t) for t in trajs], [4, 4, 4])
+        # the noise is drawn independently for each walker
+        assert_not_equal(trajs[0][-1].coordinates[0][0],
+                         trajs[1][-1].coordinates[0][0])
@@ -2,8 +2,10 @@ from __future__ import absolute_import
 from builtins import object
 import logging
 
+import numpy as np
+
 from nose.tools import (
-    assert_equal, assert_not_equal, raises
+    assert_equal, assert_not_equal, assert_true, raises
 )
 from nose.plugins.skip import SkipTest
 from .test_helpers import (CallIdentity, prepend_exception_message,
@@ -138,3 +140,108 @@ class TestSubtrajectoryIndices(object):
         assert_equal(indicesA, [[0, 1], [3], [11, 12]])
         assert_equal(indicesB, [[5, 6], [8]])
         assert_equal(indicesABA, [[3, 4, 5, 6, 7, 8, 9, 10, 11]])
+
+
+class TestArrayTrajectory(object):
+    def setup(self):
+        self.traj = make_1d_traj(coordinates=[0.1, 0.2, 0.3, 0.4, 0.5],
+                                 velocities=[1.0, 2.0, 3.0, 4.0, 5.0])
+        self.array_traj = paths.ArrayTrajectory(self.traj)
+
+    def test_from_snapshots(self):
+        assert_equal(len(self.array_traj), 5)
+        assert_equal(self.array_traj[2], self.traj[2])
+        assert_equal(set(self.array_traj.buffers.keys()),
+                     set(['coordinates', 'velocities']))
+        np.testing.assert_array_equal(self.array_traj.coordinates,
+                                      self.traj.coordinates)
+        np.testing.assert_array_equal(self.array_traj.xyz, self.traj.xyz)
+        np.testing.assert_array_equal(self.array_traj.velocities,
+                                      self.traj.velocities)
+        # the buffer itself is returned, not a new stacked array
+        assert_true(self.array_traj.coordinates is
+                    self.array_traj.coordinates)
+
+    def test_from_arrays(self):
+        coords = np.arange(12.0).reshape(4, 1, 3)
+        vels = np.ones((4, 1, 3))
+        traj = paths.ArrayTrajectory.from_arrays(self.traj[0], coords, vels)
+        assert_equal(len(traj), 4)
+        assert_true(traj.coordinates is coords)
+        # snapshots are views of the buffers
+        assert_true(np.shares_memory(traj[1].coordinates, coords))
+        np.testing.assert_array_equal(traj[1].coordinates, coords[1])
+        assert_equal(traj[3].engine, self.traj[0].engine)
+
+    def test_slicing(self):
+        coords = self.array_traj.coordinates
+        for sliced in [self.array_traj[1:4], self.array_traj[::2]]:
+            assert_true(isinstance(sliced, paths.ArrayTrajectory))
+            assert_true(np.shares_memory(sliced.coordinates, coords))
+            np.testing.assert_array_equal(
+                sliced.coordinates,
+                np.array([snap.coordinates for snap in sliced])
+            )
+        fancy = self.array_traj[[0, 3]]
+        assert_equal(list(fancy), [self.traj[0], self.traj[3]])
+        np.testing.assert_array_equal(fancy.xyz[:, 0, 0], [0.1, 0.4])
+
+    def test_reversed(self):
+        self.array_traj.buffers  # gather buffers before reversing
+        rev = self.array_traj.reversed
+        assert_true(isinstance(rev, paths.ArrayTrajectory))
+        assert_equal(list(rev), list(self.traj.reversed))
+        assert_true(np.shares_memory(rev.coordinates,
+                                     self.array_traj.coordinates))
+        np.testing.assert_array_equal(rev.coordinates,
+                                      self.traj.reversed.coordinates)
+        np.testing.assert_array_equal(rev.velocities,
+                                      self.traj.reversed.velocities)
+
+    def test_add(self):
+        self.array_traj.buffers
+        first = self.array_traj[:2]
+        second = self.array_traj[2:]
+        joined = first + second
+        assert_equal(list(joined), list(self.traj))
+        # adjacent views are joined without copying
+        assert_true(np.shares_memory(joined.coordinates,
+                                     self.array_traj.coordinates))
+        other = second + first
+        np.testing.assert_array_equal(other.xyz[:, 0, 0],
+                                      [0.3, 0.4, 0.5, 0.1, 0.2])
+        mixed = first + self.traj[2:]
+        assert_true(isinstance(mixed, paths.ArrayTrajectory))
+        np.testing.assert_array_equal(mixed.xyz, self.traj.xyz)
+
+    def test_cv_uses_buffers(self):
+        calls = []
+
+        def x_values(traj):
+            calls.append(traj)
+            return traj.xyz[:, 0, 0]
+
+        cv = paths.CoordinateFunctionCV('x', x_values,
+                                        cv_requires_lists=True)
+        np.testing.assert_array_equal(cv(self.array_traj[:2]), [0.1, 0.2])
+        np.testing.assert_array_equal(cv(self.array_traj),
+                                      [0.1, 0.2, 0.3, 0.4, 0.5])
+        # only the missing frames are evaluated, using the buffers
+        for traj in calls:
+            assert_true(isinstance(traj, paths.ArrayTrajectory))
+        assert_equal(list(calls[1]), list(self.traj[2:]))
+        all_frames = paths.ArrayTrajectory.from_arrays(
+            self.traj[0], np.arange(3.0).reshape(3, 1, 1))
+        cv(all_frames)
+        assert_true(calls[2].coordinates is all_frames.coordinates)
+
+    def test_changes_invalidate_buffers(self):
+        traj = paths.ArrayTrajectory(self.traj)
+        assert_equal(len(traj.coordinates), 5)
+        traj.append(self.traj[0])
+        assert_equal(len(traj.coordinates), 6)
+        traj += self.traj[:2]
+        assert_equal(len(traj.coordinates), 8)
+        traj.pop()
+        np.testing.assert_array_equal(traj.xyz[:, 0, 0],
+                                      [0.1, 0.2, 0.3, 0.4, 0.5, 0.1, 0.1])
@@ -0,0 +1,178 @@
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+
+from nose.tools import (assert_equal, assert_true, assert_false, raises)
+
+import openpathsampling as paths
+from openpathsampling.netcdfplus.uuid_index import (IndexFile,
+                                                    IndexFileHashedList)
+from openpathsampling.storage.stores.snapshot_wrapper import \
+    IndexFileReversalHashedList
+from .test_helpers import data_filename, make_1d_traj
+
+
+class TestIndexFile(object):
+    def setup(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tempdir, "index.npy")
+        # keys like uuids: a common upper part and a counter
+        self.keys = [(0x1234 << 80) + 2 * i for i in range(100)]
+
+    def teardown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_set_get(self):
+        table = IndexFile(self.filename, capacity=16)
+        for value, key in enumerate(self.keys):
+            table.set(key, value)
+
+        assert_true(table.capacity >= 200)
+        assert_equal(table.count, 100)
+        assert_equal([table.get(key) for key in self.keys], list(range(100)))
+        assert_false(self.keys[0] + 1 in table)
+        assert_equal(table.get(self.keys[0] + 1, -1), -1)
+
+        table.set(self.keys[3], 42)
+        assert_equal(table.get(self.keys[3]), 42)
+        assert_equal(table.count, 100)
+
+    def test_delete(self):
+        table = IndexFile(self.filename, capacity=16)
+        for value, key in enumerate(self.keys):
+            table.set(key, value)
+
+        for key in self.keys[:50]:
+            table.delete(key)
+
+        assert_equal(table.count, 50)
+        assert_false(self.keys[0] in table)
+        assert_equal([table.get(key) for key in self.keys[50:]],
+                     list(range(50, 100)))
+
+        # slots of deleted keys are reused
+        for key in self.keys[:50]:
+            table.set(key + 1, 0)
+        assert_equal(table.count, 100)
+
+        table.clear()
+        assert_equal(table.count, 0)
+        assert_false(self.keys[60] in table)
+
+    @raises(KeyError)
+    def test_delete_missing(self):
+        IndexFile(self.filename).delete(1)
+
+    def test_reopen(self):
+        table = IndexFile(self.filename, capacity=16)
+        for value, key in enumerate(self.keys):
+            table.set(key, value)
+        table.extent = 100
+        table.flush()
+
+        reopened = IndexFile(self.filename, readonly=True)
+        assert_equal(reopened.extent, 100)
+        assert_equal([reopened.get(key) for key in self.keys],
+                     list(range(100)))
+
+        # changes to a read-only table are not written
+        for key in self.keys:
+            reopened.set(key + 1, 1)
+        assert_equal(reopened.get(self.keys[0] + 1), 1)
+        assert_equal(IndexFile(self.filename).get(self.keys[0] + 1), None)
+
+
+    def test_readonly_missing(self):
+        # a read-only table without a file is kept in memory only
+        table = IndexFile(self.filename, readonly=True, capacity=16)
+        for value, key in enumerate(self.keys):
+            table.set(key, value)
+        table.flush()
+
+        assert_true(table.capacity >= 200)
+        assert_equal([table.get(key) for key in self.keys], list(range(100)))
+        assert_equal(os.listdir(self.tempdir), [])
+
+class TestIndexFileStorage(object):
+    def setup(self):
+        self.filename = data_filename("uuid_index_test.nc")
+        self.index_dir = self.filename + '.index'
+        self.storage = paths.Storage(self.filename, 'w', index_files=True)
+        self.trajs = [make_1d_traj([float(i), float(i) + 0.5])
+                      for i in range(10)]
+        for traj in self.trajs:
+            self.storage.save(traj)
+
+    def teardown(self):
+        if self.storage.isopen():
+            self.storage.close()
+        if os.path.isfile(self.filename):
+            os.remove(self.filename)
+        if os.path.isdir(self.index_dir):
+            shutil.rmtree(self.index_dir)
+
+    def test_index_types(self):
+        assert_true(isinstance(self.storage.trajectories.index,
+                               IndexFileHashedList))
+        assert_true(isinstance(self.storage.snapshots.index,
+                               IndexFileReversalHashedList))
+        assert_false(isinstance(self.storage.ensembles.index,
+                                IndexFileHashedList))
+        assert_true(os.path.isfile(
+            os.path.join(self.index_dir, 'trajectories.npy')))
+
+    def test_lookup(self):
+        trajectories = self.storage.trajectories
+        assert_equal(len(trajectories.index), 10)
+        for idx, traj in enumerate(self.trajs):
+            assert_true(traj in trajectories)
+            assert_equal(trajectories.idx(traj), idx)
+
+        assert_false(make_1d_traj([1.0]) in trajectories)
+        assert_equal(trajectories.index.list,
+                     [traj.__uuid__ for traj in self.trajs])
+
+        trajectories.cache.clear()
+        loaded = trajectories[self.trajs[4].__uuid__]
+        assert_equal(loaded.__uuid__, self.trajs[4].__uuid__)
+        assert_equal([traj.__uuid__ for traj in trajectories],
+                     [traj.__uuid__ for traj in self.trajs])
+
+    def test_snapshots(self):
+        snapshots = self.storage.snapshots
+        assert_equal(len(snapshots.index), 40)
+        snapshot = self.trajs[3][1]
+        assert_equal(snapshots.idx(snapshot), 14)
+        assert_equal(snapshots.idx(snapshot.reversed), 15)
+        assert_equal(snapshots.index.index(15), snapshot.reversed.__uuid__)
+        assert_true(snapshot.reversed in snapshots)
+
+    def test_restore(self):
+        self.storage.sync()
+        trajectories = self.storage.trajectories
+        snapshots = self.storage.snapshots
+
+        # the table is up to date and not changed
+        trajectories.restore()
+        assert_equal(trajectories.idx(self.trajs[2]), 2)
+
+        # a table that does not match the file is built again
+        trajectories.index.clear()
+        snapshots.index._file.delete(self.trajs[9][1].__uuid__)
+        for store in [trajectories, snapshots]:
+            store.restore()
+
+        for idx, traj in enumerate(self.trajs):
+            assert_equal(trajectories.idx(traj), idx)
+            assert_equal(snapshots.idx(traj[1]), 4 * idx + 2)
+
+    def test_stale_index_files_removed(self):
+        self.storage.close()
+        storage = paths.Storage(self.filename, 'w')
+        assert_false(storage.index_files)
+        assert_false(os.path.isdir(self.index_dir))
+        assert_false(isinstance(storage.trajectories.index,
+                                IndexFileHashedList))
+        storage.close()
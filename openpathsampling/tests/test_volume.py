@@ -11,6 +11,8 @@ from .test_helpers import CallIdentity, raises_with_message_like
 
 import unittest
 
+import numpy as np
+
 import openpathsampling.volume as volume
 
 import openpathsampling as paths
@@ -362,6 +364,165 @@ class TestCVRangeVolumePeriodic(object):
                      volume.PeriodicCVDefinedVolume(op_id, -100, 75))
 
 
+class CountingCV(CallIdentity):
+    '''Identity CV that counts how often it is called'''
+    def __init__(self):
+        super(CountingCV, self).__init__()
+        self.n_calls = 0
+
+    def __call__(self, value):
+        self.n_calls += 1
+        return value
+
+
+class TestVolumeMask(object):
+    def setup(self):
+        self.values = [-200.0, -180.0, -100.0, -0.75, -0.5, -0.25, 0.0, 0.25,
+                       0.5, 0.75, 1.0, 75.0, 100.0, 180.0, 359.0]
+
+    def _check_mask(self, vol):
+        expected = [bool(vol(value)) for value in self.values]
+        mask = vol.mask(self.values)
+        assert_equal(mask.dtype, bool)
+        assert_equal(list(mask), expected)
+
+    def test_cv_defined_volume(self):
+        for vol in [volA, volB, volC, volD,
+                    volume.CVDefinedVolume(op_id, float('-inf'), 0.0),
+                    volume.CVDefinedVolume(op_id, 0.0, float('inf'))]:
+            self._check_mask(vol)
+
+    def test_periodic_cv_defined_volume(self):
+        for (lmin, lmax) in [(-150, 70), (70, -150), (100, 200), (-200, 0),
+                             (-180, 180)]:
+            self._check_mask(volume.PeriodicCVDefinedVolume(
+                op_id, lmin, lmax, -180, 180
+            ))
+        self._check_mask(volume.PeriodicCVDefinedVolume(op_id, 75, -100))
+
+    def test_combinations(self):
+        for vol in [volA | volC, volA & volB, volA ^ volB, volA - volB,
+                    ~volA, volume.UnionVolume(volA, volA2),
+                    volume.IntersectionVolume(volA, volA2),
+                    volume.SymmetricDifferenceVolume(volA, volA2),
+                    volume.RelativeComplementVolume(volA, volA2),
+                    volume.EmptyVolume(), volume.FullVolume()]:
+            self._check_mask(vol)
+
+    def test_single_cv_call(self):
+        cv = CountingCV()
+        vol = (volume.CVDefinedVolume(cv, -0.5, 0.5)
+               | volume.CVDefinedVolume(cv, 50, 100))
+        self._check_mask(vol)
+        # one call per volume for the mask, one per frame and volume for the
+        # per-frame check in _check_mask
+        assert_equal(cv.n_calls, 2 + 2 * len(self.values)
+                     - sum(1 for v in self.values if -0.5 <= v < 0.5))
+
+    def test_empty_frames(self):
+        assert_equal(len(volA.mask([])), 0)
+        assert_equal(len((volA | volC).mask([])), 0)
+
+    def test_default_mask(self):
+        class PositiveVolume(volume.Volume):
+            def __call__(self, snapshot):
+                return snapshot > 0
+
+        frames = [-1.0, 0.5, 0.0, 2.0]
+        assert_equal(list(PositiveVolume().mask(frames)),
+                     [False, True, False, True])
+
+
+class Frame(object):
+    '''Stub for a snapshot with features'''
+    def __init__(self, features):
+        self.features = features
+
+
+class FeaturesCV(CountingCV):
+    '''Stub CV returning the features of frames; counts frames evaluated'''
+    def __init__(self):
+        super(FeaturesCV, self).__init__()
+        self.n_frames = 0
+
+    def __call__(self, frames):
+        self.n_calls += 1
+        self.n_frames += len(frames)
+        return [frame.features for frame in frames]
+
+
+class TestVoronoiVolume(object):
+    def setup(self):
+        random = np.random.RandomState(42)
+        self.centers = random.uniform(size=(100, 2))
+        self.features = random.uniform(size=(50, 2))
+        self.distances = np.sqrt(((self.features[:, None, :]
+                                   - self.centers[None, :, :])**2).sum(-1))
+        self.expected = [int(np.argmin(d)) for d in self.distances]
+
+    def test_distance_cv(self):
+        vols = [volume.VoronoiVolume(CallIdentity(), state)
+                for state in range(len(self.centers))]
+        frames = [list(d) for d in self.distances]
+        assert_equal(list(vols[0].cells(frames)), self.expected)
+        assert_equal([vols[0].cell(frame) for frame in frames],
+                     self.expected)
+        for vol in vols[:10]:
+            assert_equal(list(vol.mask(frames)),
+                         [vol(frame) for frame in frames])
+            assert_equal(list(vol.mask(frames)),
+                         [cell == vol.state for cell in self.expected])
+
+    def test_centers(self):
+        vol = volume.VoronoiVolume(FeaturesCV(), 3, self.centers)
+        frames = [Frame(f) for f in self.features]
+        assert_equal(list(vol.cells(frames)), self.expected)
+
+    def test_centers_kdtree(self):
+        cells = volume.VoronoiCells(FeaturesCV(), self.centers)
+        cells.kdtree_min_centers = 10
+        frames = [Frame(f) for f in self.features]
+        assert_equal(list(cells.cells(frames)), self.expected)
+        assert_true(cells._kdtree is not None)
+
+    def test_shared_assignment(self):
+        cv = FeaturesCV()
+        vols = [volume.VoronoiVolume(cv, state, self.centers)
+                for state in range(5)]
+        other = volume.VoronoiVolume(cv, 0, self.centers[:50])
+        assert_is(vols[0]._cells, vols[1]._cells)
+        assert_is(vols[0]._cells,
+                  volume.VoronoiCells.for_cv(cv, self.centers.copy()))
+        assert_not_equal(vols[0]._cells, other._cells)
+
+        frames = [Frame(f) for f in self.features]
+        masks = [vol.mask(frames) for vol in vols]
+        assert_equal(cv.n_calls, 1)
+        assert_equal(cv.n_frames, len(frames))
+        # the cells are cached per frame
+        more_frames = frames[:10] + [Frame(f) for f in self.features[:5]]
+        vols[3].mask(more_frames)
+        assert_equal(cv.n_calls, 2)
+        assert_equal(cv.n_frames, len(frames) + 5)
+        for (vol, mask) in zip(vols, masks):
+            assert_equal([vol(frame) for frame in frames], list(mask))
+        assert_equal(cv.n_calls, 2)
+
+    def test_to_dict(self):
+        vol = volume.VoronoiVolume(FeaturesCV(), 2, self.centers)
+        dct = vol.to_dict()
+        assert_equal(set(dct.keys()),
+                     set(['collectivevariable', 'state', 'centers']))
+        # the centers can be stored as JSON
+        assert_equal(dct['centers'], self.centers.tolist())
+        restored = volume.VoronoiVolume.from_dict(dct)
+        assert_true(isinstance(restored.centers, np.ndarray))
+        np.testing.assert_array_equal(restored.centers, self.centers)
+        assert_is(restored._cells, vol._cells)
+        no_centers = volume.VoronoiVolume(FeaturesCV(), 0)
+        assert_equal(no_centers.to_dict()['centers'], None)
+
+
 class TestAbstract(object):
     @raises_with_message_like(TypeError, "Can't instantiate abstract class")
     def test_abstract_volume(self):
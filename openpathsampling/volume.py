@@ -6,6 +6,9 @@ Created on 03.09.2014
 
 from . import range_logic
 import abc
+import weakref
+import numpy as np
+import scipy.spatial
 from openpathsampling.netcdfplus import StorableNamedObject
 
 # TODO: Make Full and Empty be Singletons to avoid storing them several times!
@@ -58,6 +61,27 @@ class Volume(StorableNamedObject):
         '''
         return False # pragma: no cover
 
+    def mask(self, frames):
+        '''
+        Boolean array: whether each of the frames is in the volume.
+
+        Subclasses that can evaluate many snapshots at once (e.g., with one
+        call to a collective variable) override this; the default calls the
+        volume on each frame.
+
+        Parameters
+        ----------
+        frames : :class:`.Trajectory` or list of :class:`.BaseSnapshot`
+            the frames to check
+
+        Returns
+        -------
+        np.ndarray of bool
+            ``mask[i]`` is `True` if ``frames[i]`` is in the volume
+        '''
+        return np.fromiter((bool(self(frame)) for frame in frames),
+                           dtype=bool, count=len(frames))
+
     def __str__(self):
         '''
         Returns a string representation of the volume
@@ -123,6 +147,9 @@ class VolumeCombination(Volume):
     This should be treated as an abstract class. For storage purposes, use
     specific subclasses in practice.
     """
+    # elementwise version of fnc, used by mask; None evaluates frame by frame
+    _mask_fnc = None
+
     def __init__(self, volume1, volume2, fnc, str_fnc):
         super(VolumeCombination, self).__init__()
         self.volume1 = volume1
@@ -143,6 +170,12 @@ class VolumeCombination(Volume):
         #return self.fnc(self.volume1.__call__(snapshot),
                         #self.volume2.__call__(snapshot))
 
+    def mask(self, frames):
+        if self._mask_fnc is None:
+            return super(VolumeCombination, self).mask(frames)
+        return self._mask_fnc(self.volume1.mask(frames),
+                              self.volume2.mask(frames))
+
     def __str__(self):
         return '(' + self.sfnc.format(str(self.volume1), str(self.volume2)) + ')'
 
@@ -152,6 +185,8 @@ class VolumeCombination(Volume):
 
 class UnionVolume(VolumeCombination):
     """ "Or" combination (union) of two volumes."""
+    _mask_fnc = staticmethod(np.logical_or)
+
     def __init__(self, volume1, volume2):
         super(UnionVolume, self).__init__(
             volume1=volume1,
@@ -163,6 +198,8 @@ class UnionVolume(VolumeCombination):
 
 class IntersectionVolume(VolumeCombination):
     """ "And" combination (intersection) of two volumes."""
+    _mask_fnc = staticmethod(np.logical_and)
+
     def __init__(self, volume1, volume2):
         super(IntersectionVolume, self).__init__(
             volume1=volume1,
@@ -174,6 +211,8 @@ class IntersectionVolume(VolumeCombination):
 
 class SymmetricDifferenceVolume(VolumeCombination):
     """ "Xor" combination of two volumes."""
+    _mask_fnc = staticmethod(np.logical_xor)
+
     def __init__(self, volume1, volume2):
         super(SymmetricDifferenceVolume, self).__init__(
             volume1=volume1,
@@ -185,6 +224,8 @@ class SymmetricDifferenceVolume(VolumeCombination):
 
 class RelativeComplementVolume(VolumeCombination):
     """ "Subtraction" combination (relative complement) of two volumes."""
+    _mask_fnc = staticmethod(lambda a, b: a & ~b)
+
     def __init__(self, volume1, volume2):
         super(RelativeComplementVolume, self).__init__(
             volume1=volume1,
@@ -203,6 +244,9 @@ class NegatedVolume(Volume):
     def __call__(self, snapshot):
         return not self.volume(snapshot)
 
+    def mask(self, frames):
+        return ~self.volume.mask(frames)
+
     def __str__(self):
         return '(not ' + str(self.volume) + ')'
 
@@ -215,6 +259,9 @@ class EmptyVolume(Volume):
     def __call__(self, snapshot):
         return False
 
+    def mask(self, frames):
+        return np.zeros(len(frames), dtype=bool)
+
     def __and__(self, other):
         return self
 
@@ -242,6 +289,9 @@ class FullVolume(Volume):
     def __call__(self, snapshot):
         return True
 
+    def mask(self, frames):
+        return np.ones(len(frames), dtype=bool)
+
     def __invert__(self):
         return EmptyVolume()
 
@@ -411,6 +461,27 @@ class CVDefinedVolume(Volume):
 
         return True
 
+    def _cv_values(self, frames):
+        """Values of the CV for all frames (one CV call), as float array"""
+        if len(frames) == 0:
+            return np.zeros(0)
+        values = self.collectivevariable(frames)
+        try:
+            values = np.asarray(values, dtype=float)
+        except TypeError:
+            values = np.array([value.__float__() for value in values])
+        return values.reshape(len(frames))
+
+    def mask(self, frames):
+        values = self._cv_values(frames)
+        # same comparisons as __call__
+        mask = np.ones(len(values), dtype=bool)
+        if self.lambda_min != float('-inf'):
+            mask &= values >= self.lambda_min
+        if self.lambda_min != float('inf'):
+            mask &= values < self.lambda_max
+        return mask
+
     def __str__(self):
         return '{{x|{2}(x) in [{0:g}, {1:g}]}}'.format(
             self.lambda_min, self.lambda_max, self.collectivevariable.name)
@@ -454,6 +525,9 @@ class PeriodicCVDefinedVolume(CVDefinedVolume):
                 class MonkeyPatch(type(self)):
                     def __call__(self, *arg, **kwarg):
                         return True
+
+                    def mask(self, frames):
+                        return np.ones(len(frames), dtype=bool)
                 self.__class__ = MonkeyPatch
             else:
                 self.lambda_min = self.do_wrap(lambda_min)
@@ -483,6 +557,16 @@ class PeriodicCVDefinedVolume(CVDefinedVolume):
 
             return wrapped
 
+    def _wrap_values(self, values):
+        """Elementwise :meth:`.do_wrap` for an array of floats"""
+        val = values - self._period_shift
+        positive = values - np.trunc(val / self._period_len) * self._period_len
+        wrapped = (values + np.trunc((self._period_len - val)
+                                     / self._period_len) * self._period_len)
+        wrapped = np.where(wrapped >= self._period_len,
+                           wrapped - self._period_len, wrapped)
+        return np.where(val > 0, positive, wrapped)
+
     # next few functions add support for range logic
     def _copy_with_new_range(self, lmin, lmax):
         return PeriodicCVDefinedVolume(self.collectivevariable, lmin, lmax,
@@ -516,6 +600,15 @@ class PeriodicCVDefinedVolume(CVDefinedVolume):
         else:
             return self.lambda_min <= l < self.lambda_max
 
+    def mask(self, frames):
+        values = self._cv_values(frames)
+        if self.wrap:
+            values = self._wrap_values(values)
+        if self.lambda_min > self.lambda_max:
+            return (values >= self.lambda_min) | (values < self.lambda_max)
+        else:
+            return (self.lambda_min <= values) & (values < self.lambda_max)
+
     def __str__(self):
         if self.wrap:
             fcn = 'x|({0}(x) - {2:g}) % {1:g} + {2:g}'.format(
@@ -535,6 +628,123 @@ class PeriodicCVDefinedVolume(CVDefinedVolume):
                         self.collectivevariable.name)
 
 
+class VoronoiCells(object):
+    '''
+    Assignment of snapshots to Voronoi cells, shared by Voronoi volumes
+
+    Cells are assigned for many snapshots at once, and the cell of each
+    snapshot is cached (weakly, like the values of collective variables), so
+    that all :class:`.VoronoiVolume` objects for the same cells only compute
+    the assignment once. Use :meth:`.for_cv` to get the shared instance.
+
+    Parameters
+    ----------
+    collectivevariable : :class:`.CollectiveVariable`
+        if ``centers`` is None, the CV returns the distances of a snapshot to
+        all centers; otherwise, it returns the features of a snapshot
+    centers : np.ndarray (n_centers, n_features) or None
+        the positions of the centers in feature space; the cell of a snapshot
+        is the center closest to its features (Euclidean distance)
+
+    Attributes
+    ----------
+    kdtree_min_centers : int
+        with at least this many centers, the closest center is found with a
+        KD-tree instead of computing the distances to all centers
+    '''
+    kdtree_min_centers = 64
+    _shared = weakref.WeakKeyDictionary()
+
+    def __init__(self, collectivevariable, centers=None):
+        self.collectivevariable = collectivevariable
+        if centers is not None:
+            centers = np.asarray(centers, dtype=float)
+            centers = centers.reshape(len(centers), -1)
+        self.centers = centers
+        self._kdtree = None
+        self._cache = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def for_cv(cls, collectivevariable, centers=None):
+        '''
+        Shared cell assignment for this CV and these centers
+
+        Parameters
+        ----------
+        collectivevariable : :class:`.CollectiveVariable`
+            the CV (see :class:`.VoronoiCells`)
+        centers : np.ndarray (n_centers, n_features) or None
+            positions of the centers in feature space
+
+        Returns
+        -------
+        :class:`.VoronoiCells`
+            the assignment used by all volumes with the same CV and centers
+        '''
+        if centers is None:
+            key = None
+        else:
+            centers = np.asarray(centers, dtype=float)
+            key = (centers.shape, centers.tobytes())
+        try:
+            by_centers = cls._shared.setdefault(collectivevariable, {})
+        except TypeError:
+            # CV can't be weakly referenced: no sharing
+            return cls(collectivevariable, centers)
+        try:
+            return by_centers[key]
+        except KeyError:
+            cells = cls(collectivevariable, centers)
+            by_centers[key] = cells
+            return cells
+
+    def _assign(self, frames):
+        values = np.asarray(self.collectivevariable(frames), dtype=float)
+        values = values.reshape(len(frames), -1)
+        if self.centers is None:
+            return np.argmin(values, axis=1)
+        elif len(self.centers) >= self.kdtree_min_centers:
+            if self._kdtree is None:
+                self._kdtree = scipy.spatial.cKDTree(self.centers)
+            return self._kdtree.query(values)[1]
+        else:
+            distances = scipy.spatial.distance.cdist(values, self.centers,
+                                                     'sqeuclidean')
+            return np.argmin(distances, axis=1)
+
+    def cells(self, frames):
+        '''
+        Indices of the Voronoi cells of the frames
+
+        Parameters
+        ----------
+        frames : :class:`.Trajectory` or list of :class:`.BaseSnapshot`
+            the frames to assign
+
+        Returns
+        -------
+        np.ndarray of int
+            the index of the cell of each frame
+        '''
+        cells = np.empty(len(frames), dtype=int)
+        missing = []
+        for (i, frame) in enumerate(frames):
+            try:
+                cells[i] = self._cache[frame]
+            except (KeyError, TypeError):
+                missing.append(i)
+        if missing:
+            new_cells = self._assign([frames[i] for i in missing])
+            cells[missing] = new_cells
+            for (i, cell) in zip(missing, new_cells):
+                try:
+                    self._cache[frames[i]] = cell
+                except TypeError:
+                    # frame can't be weakly referenced: not cached
+                    pass
+        return cells
+
+
 class VoronoiVolume(Volume):
     '''
     Volume given by a Voronoi cell specified by a set of centers
@@ -543,8 +753,13 @@ class VoronoiVolume(Volume):
     ----------
     collectivevariable : MultiRMSDCV
         must be an MultiRMSDCV collectivevariable that returns several RMSDs
+        (the distances to all centers), or, if ``centers`` is given, a CV
+        that returns the features of a snapshot
     state : int
         the index of the center for the chosen voronoi cell
+    centers : np.ndarray (n_centers, n_features) or None
+        positions of the centers in the space of the features returned by
+        the collectivevariable
 
     Attributes
     ----------
@@ -552,13 +767,33 @@ class VoronoiVolume(Volume):
         the collectivevariable object
     state : int
         the index of the center for the chosen voronoi cell
-
+    centers : np.ndarray or None
+        positions of the centers in feature space
+
+    Notes
+    -----
+    All VoronoiVolumes with the same collectivevariable and centers share a
+    :class:`.VoronoiCells`, so the cell of a snapshot is only determined
+    once for all of them.
     '''
 
-    def __init__(self, collectivevariable, state):
+    def __init__(self, collectivevariable, state, centers=None):
         super(VoronoiVolume, self).__init__()
         self.collectivevariable = collectivevariable
         self.state = state
+        if centers is not None:
+            # the centers are stored as a list
+            centers = np.asarray(centers, dtype=float)
+        self.centers = centers
+        self._cells = VoronoiCells.for_cv(collectivevariable, centers)
+
+    def to_dict(self):
+        return {
+            'collectivevariable': self.collectivevariable,
+            'state': self.state,
+            'centers': (None if self.centers is None
+                        else self.centers.tolist())
+        }
 
     def cell(self, snapshot):
         '''
@@ -574,15 +809,23 @@ class VoronoiVolume(Volume):
         int
             index of the voronoi cell
         '''
-        distances = self.collectivevariable(snapshot)
-        min_val = 1000000000.0
-        min_idx = -1
-        for idx, d in enumerate(distances):
-            if d < min_val:
-                min_val = d
-                min_idx = idx
+        return int(self._cells.cells([snapshot])[0])
 
-        return min_idx
+    def cells(self, frames):
+        '''
+        Returns the indices of the voronoi cells of many snapshots
+
+        Parameters
+        ----------
+        frames : :class:`.Trajectory` or list of :class:`.BaseSnapshot`
+            the snapshots to be tested
+
+        Returns
+        -------
+        np.ndarray of int
+            index of the voronoi cell of each snapshot
+        '''
+        return self._cells.cells(frames)
 
     def __call__(self, snapshot, state=None):
         '''
@@ -607,6 +850,9 @@ class VoronoiVolume(Volume):
 
         return self.cell(snapshot) == state
 
+    def mask(self, frames):
+        return self.cells(frames) == self.state
+
 
 # class VolumeFactory(object):
     # @staticmethod